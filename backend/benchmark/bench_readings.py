@@ -0,0 +1,113 @@
+"""
+読み方の辞書の置き換えのマイクロベンチマーク
+項目ごとに re.sub でテキスト全体を走査する従来の方法と、全項目を1つの正規表現にまとめて1回だけ走査する方法で、
+辞書の件数とテキストの長さを変えながら1文字あたりの時間を比較する（まとめた方法は件数によらずほぼ一定になる）
+
+使い方（リポジトリのルートで実行）:
+    python backend/benchmark/bench_readings.py --entries 10 100 1000 5000 --chars 100 1000 10000
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BACKEND_DIR)
+
+from src.TTS.readings import ReadingDictionary  # noqa: E402
+
+KANJI = "桜夜星空月花雪風海山川森光影音色夢心時"
+KATAKANA = "アイウエオカキクケコサシスセソタチツテト"
+
+
+def make_readings(entries: int, rng: random.Random) -> dict:
+    """2〜6文字の表記（接頭辞を共有するものを含む）と読み"""
+    readings = {}
+    while len(readings) < entries:
+        surface = "".join(rng.choice(KANJI) for _ in range(rng.randint(2, 6)))
+        readings[surface] = "".join(rng.choice(KATAKANA) for _ in range(len(surface) * 2))
+    return readings
+
+
+def make_text(chars: int, readings: dict, rng: random.Random) -> str:
+    """表記が1割ほど混ざったテキスト"""
+    surfaces = list(readings)
+    parts, length = [], 0
+    while length < chars:
+        part = rng.choice(surfaces) if rng.random() < 0.1 else "".join(rng.choice("あいうえおかきくけこ、。") for _ in range(8))
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:chars]
+
+
+def chained_sub(readings: dict, text: str) -> str:
+    """変更前の方法（項目ごとに re.sub。長い表記から順に置き換える）"""
+    for surface in sorted(readings, key=len, reverse=True):
+        text = re.sub(re.escape(surface), readings[surface], text)
+    return text
+
+
+def leftmost_longest(readings: dict, text: str) -> str:
+    """結果の確認用（先頭から順に、その位置で最も長く一致する表記を置き換える）"""
+    longest = max(map(len, readings))
+    result, i = [], 0
+    while i < len(text):
+        for length in range(min(longest, len(text) - i), 0, -1):
+            if text[i:i + length] in readings:
+                result.append(readings[text[i:i + length]])
+                i += length
+                break
+        else:
+            result.append(text[i])
+            i += 1
+    return "".join(result)
+
+
+def measure(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="読み方の辞書の置き換えのマイクロベンチマーク")
+    parser.add_argument("--entries", type=int, nargs="+", default=[10, 100, 1000, 5000], help="比較する辞書の件数")
+    parser.add_argument("--chars", type=int, nargs="+", default=[100, 1000, 10000], help="比較するテキストの文字数")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    directory = tempfile.mkdtemp()
+    print(f"{'entries':>8} {'chars':>7} {'compile[ms]':>12} {'chained[us/char]':>17} {'single-pass[us/char]':>21} {'speedup':>8}")
+    for entries in args.entries:
+        readings = make_readings(entries, rng)
+        path = os.path.join(directory, f"readings_{entries}.tsv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{surface}\t{reading}\n" for surface, reading in readings.items())
+        dictionary = ReadingDictionary(path)
+        start = time.perf_counter()
+        dictionary.configure(path)
+        compile_time = time.perf_counter() - start
+        for chars in args.chars:
+            text = make_text(chars, readings, rng)
+            # 表記が重なる箇所は従来の方法と結果が変わりうるので、先頭から最長一致で置き換えた結果と比べる
+            if dictionary.apply(text) != leftmost_longest(readings, text):
+                print(f"{entries:>8} {chars:>7} 置き換えの結果が最長一致と一致しません")
+            chained = measure(lambda: chained_sub(readings, text), args.repeat)
+            single = measure(lambda: dictionary.apply(text), args.repeat)
+            print(f"{entries:>8} {chars:>7} {compile_time * 1000:>12.1f} {chained / chars * 1e6:>17.3f} "
+                  f"{single / chars * 1e6:>21.3f} {chained / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
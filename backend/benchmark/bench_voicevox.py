@@ -0,0 +1,87 @@
+"""
+VOICEVOXの文ごとの並行合成のベンチマーク
+代役のVOICEVOX（fake_services）に対して、同時実行数を変えながら長い応答を合成し、
+全体の合成時間が「全文の合計」から「最も遅い文」に近づくかを確認する。
+--query-cache-size を指定すると audio_query の結果をメモし、繰り返し合成したときの往復の回数を比べる
+
+使い方（リポジトリのルートで実行）:
+    python backend/benchmark/bench_voicevox.py --workers 1 2 3 4 --repeat 5
+    python backend/benchmark/bench_voicevox.py --workers 3 --query-cache-size 512
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_services import FakeTTSEngine, ServiceThread  # noqa: E402
+
+DEFAULT_TEXT = (
+    "今日はとってもいい天気だね。"
+    "お散歩に行くのもいいかもしれないよ！"
+    "でも、午後から少し雲が出てくるみたい。"
+    "傘を持っていくと安心かな？"
+    "帰ってきたら、一緒にお茶でも飲もうね。"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VOICEVOXの並行合成のベンチマーク")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 3, 4], help="比較する同時実行数")
+    parser.add_argument("--repeat", type=int, default=5, help="1設定あたりの繰り返し回数")
+    parser.add_argument("--text", default=DEFAULT_TEXT, help="合成するテキスト")
+    parser.add_argument("--synthesis-median", type=float, default=0.3, help="代役の /synthesis の遅延の中央値（秒）")
+    parser.add_argument("--query-cache-size", type=int, default=0, help="audio_query の結果をメモする件数（0でメモしない）")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    from src.TTS.VOICEVOX import VoicevoxEngine, split_sentences
+    from src.TTS.audio_cache import tts_cache
+    from src.TTS.query_cache import query_cache
+
+    # 毎回エンジンで合成した時間を測るため、音声キャッシュは使わない
+    tts_cache.configure(tts_cache.directory, 0)
+
+    fake = FakeTTSEngine(
+        "voicevox",
+        audio_query_latency={"median": 0.04, "p99": 0.12},
+        synthesis_latency={"median": args.synthesis_median, "p99": args.synthesis_median * 3, "per_char": 0.008},
+    )
+    service = ServiceThread("fake-voicevox", fake.app, "127.0.0.1", 0).start()
+    output = os.path.join(tempfile.mkdtemp(), "voice.wav")
+    print(f"{len(split_sentences(args.text))}文 / {len(args.text)}文字")
+    print(f"{'workers':>8} {'p50[s]':>8} {'max[s]':>8} {'sum of sentences[s]':>20} {'slowest[s]':>11} {'round trips':>12}")
+    try:
+        for workers in args.workers:
+            # 同時実行数ごとに空のメモから始める
+            query_cache.configure(args.query_cache_size)
+            fake.calls = {key: 0 for key in fake.calls}
+            engine = VoicevoxEngine(url=service.url, max_workers=workers)
+            totals, sums, slowest = [], [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                sentences = engine.synthesize(args.text)
+                totals.append(time.perf_counter() - start)
+                sums.append(sum(sentence.seconds for sentence in sentences))
+                slowest.append(max(sentence.seconds for sentence in sentences))
+            duration = engine.save_wavefile(args.text, filename=output)
+            engine.close()
+            round_trips = fake.calls["audio_query"] + fake.calls["synthesis"]
+            print(f"{workers:>8} {statistics.median(totals):>8.3f} {max(totals):>8.3f} "
+                  f"{statistics.median(sums):>20.3f} {statistics.median(slowest):>11.3f} {round_trips:>12}")
+        print(f"\n再生時間: {duration:.2f}秒（{output}）")
+    finally:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
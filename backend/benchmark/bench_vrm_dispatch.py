@@ -0,0 +1,98 @@
+"""
+VRMサーバーへの状態の送信のマイクロベンチマーク
+応答が遅いVRMサーバーの代役に対して、1ターン分の更新（表情・モーション・ご機嫌度・字幕・音声再生）を
+その場で送る従来の方法と、裏の送信スレッドに渡す方法で、会話のスレッドが待たされる時間・送ったリクエスト数・
+すべて届くまでの時間（flush）を比較する
+
+使い方（リポジトリのルートで実行）:
+    python backend/benchmark/bench_vrm_dispatch.py --delays 0 0.05 0.2 --turns 20
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+from flask import Flask, jsonify
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_services import ServiceThread  # noqa: E402
+from src.vrm_control.vrm_controller import VRMController  # noqa: E402
+
+
+class SlowVRMServer:
+    """すべてのPOSTに delay 秒かけて応答するVRMサーバーの代役"""
+
+    def __init__(self):
+        self.delay = 0.0
+        self.requests = 0
+        self.app = Flask("slow-vrm")
+        self.app.add_url_rule("/", "health", lambda: jsonify({"status": "ok"}))
+        self.app.add_url_rule("/<path:path>", "post", self.post, methods=["POST"])
+
+    def post(self, path):
+        self.requests += 1
+        time.sleep(self.delay)
+        return jsonify({"status": "ok"})
+
+
+def run_turn(controller: VRMController, turn: int) -> None:
+    """1ターンで会話のスレッドから送る更新（思考中の表情 → 応答の反映 → 音声再生）"""
+    controller.set_expression("thinking")
+    controller.set_mood_value(50 + turn % 10)
+    controller.send_subtitle("考え中です", "Thinking")
+    controller.apply_state(expression="happy", emotion="happy", mood_value=60, subtitle=("こんにちは", "Hello"))
+    controller.play_voice(f"utterance-{turn}")
+
+
+def measure(url: str, server: SlowVRMServer, background: bool, turns: int) -> dict:
+    controller = VRMController(url, background=background)
+    server.requests = 0
+    blocked = []
+    start = time.perf_counter()
+    for turn in range(turns):
+        turn_start = time.perf_counter()
+        run_turn(controller, turn)
+        blocked.append(time.perf_counter() - turn_start)
+    issued = time.perf_counter() - start
+    controller.flush()
+    delivered = time.perf_counter() - start
+    controller.close()
+    return {
+        "blocked": statistics.median(blocked),
+        "requests": server.requests / turns,
+        "delivered": delivered - issued,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VRMサーバーへの状態の送信のマイクロベンチマーク")
+    parser.add_argument("--delays", type=float, nargs="+", default=[0.0, 0.05, 0.2], help="VRMサーバーの応答時間（秒）")
+    parser.add_argument("--turns", type=int, default=20, help="送るターン数")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = SlowVRMServer()
+    service = ServiceThread("slow-vrm", server.app, "127.0.0.1", 0).start()
+    print(f"{'delay[s]':>9} {'mode':>11} {'blocked/turn[ms]':>17} {'requests/turn':>14} {'flush[ms]':>10}")
+    try:
+        for delay in args.delays:
+            server.delay = delay
+            for background in (False, True):
+                result = measure(service.url, server, background, args.turns)
+                mode = "background" if background else "inline"
+                print(f"{delay:>9.3f} {mode:>11} {result['blocked'] * 1000:>17.2f} "
+                      f"{result['requests']:>14.1f} {result['delivered'] * 1000:>10.1f}")
+    finally:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+VRMコントロールサーバーの状態の並行更新とポーリングの負荷テスト
+複数のスレッドから /vrm/state・/mood・/subtitle を同時に更新し、更新が失われていないか
+（応答の連番が重複・欠番なく揃い、最後の連番の値が状態に残っているか）を確かめる。
+あわせて /api/vrm/status を ETag なしでポーリングする従来の方法と、If-None-Match を付けて
+変更がなければ 304 を受け取る方法で、1回のポーリングあたりの転送量とサーバーのCPU時間を比較する
+
+使い方（リポジトリのルートで実行）:
+    python backend/benchmark/bench_vrm_state.py --writers 8 --updates 200 --pollers 4 --seconds 3
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+import requests
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_services import ServiceThread  # noqa: E402
+from src.vrm_control.vrm_flask_server import app  # noqa: E402
+
+# ポーリング中の字幕（応答1回分くらいの長さ）
+SUBTITLE = {
+    "japanese": "今日はいい天気だね！お散歩に行くのもいいかも。" * 4,
+    "english": "It's nice weather today! Maybe it's a good day for a walk. " * 4,
+}
+
+
+class CPUMeter:
+    """リクエストの処理（本文の書き出しまで）にかかったサーバーのスレッドのCPU時間を合計する"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.lock = threading.Lock()
+        self.seconds = 0.0
+
+    def __call__(self, environ, start_response):
+        start = time.thread_time()
+        try:
+            return list(self.wsgi_app(environ, start_response))
+        finally:
+            with self.lock:
+                self.seconds += time.thread_time() - start
+
+
+def stress_updates(url: str, writers: int, updates: int) -> dict:
+    """複数のスレッドから同時に状態を更新し、応答の連番と最後の状態を確かめる"""
+    results = []
+    lock = threading.Lock()
+
+    def write(writer: int) -> None:
+        session = requests.Session()
+        for i in range(updates):
+            mood = (writer * updates + i) % 101
+            kind = i % 3
+            if kind == 0:
+                response = session.post(f"{url}/vrm/state", json={"mood": mood, "subtitle": {"japanese": f"{writer}-{i}"}})
+            elif kind == 1:
+                response = session.post(f"{url}/mood", json={"mood": mood})
+            else:
+                response = session.post(f"{url}/subtitle", json={"japanese": f"{writer}-{i}", "english": ""})
+            with lock:
+                results.append((response.json()["seq"], kind, mood, f"{writer}-{i}"))
+
+    start_version = requests.get(f"{url}/api/vrm/status").json()["last_event_id"].rsplit("-", 1)[1]
+    threads = [threading.Thread(target=write, args=(writer,)) for writer in range(writers)]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    seqs = sorted(seq for seq, _, _, _ in results)
+    expected = list(range(int(start_version) + 1, int(start_version) + len(results) + 1))
+    # 最後に反映されたはずの値（種類ごとに連番が最大の更新）
+    last_mood = max((r for r in results if r[1] in (0, 1)), key=lambda r: r[0])[2]
+    last_subtitle = max((r for r in results if r[1] in (0, 2)), key=lambda r: r[0])[3]
+    status = requests.get(f"{url}/api/vrm/status").json()
+    return {
+        "updates": len(results),
+        "seconds": elapsed,
+        "sequence_ok": seqs == expected,
+        "mood_ok": status["mood_value"] == last_mood,
+        "subtitle_ok": status["subtitle"]["japanese"] == last_subtitle,
+    }
+
+
+def poll(url: str, meter: CPUMeter, pollers: int, seconds: float, conditional: bool, update_interval: float) -> dict:
+    """update_interval 秒ごとに状態が変わる間、/api/vrm/status をポーリングする"""
+    stop = threading.Event()
+    totals = {"polls": 0, "bytes": 0, "not_modified": 0}
+    lock = threading.Lock()
+
+    def poller() -> None:
+        session = requests.Session()
+        etag = None
+        polls = size = not_modified = 0
+        while not stop.is_set():
+            headers = {"If-None-Match": etag} if conditional and etag else {}
+            response = session.get(f"{url}/api/vrm/status", headers=headers)
+            polls += 1
+            size += len(response.content)
+            if response.status_code == 304:
+                not_modified += 1
+            else:
+                etag = response.headers.get("ETag")
+        with lock:
+            totals["polls"] += polls
+            totals["bytes"] += size
+            totals["not_modified"] += not_modified
+
+    def updater() -> None:
+        session = requests.Session()
+        mood = 0
+        while not stop.wait(update_interval):
+            mood = (mood + 1) % 101
+            session.post(f"{url}/mood", json={"mood": mood})
+
+    requests.post(f"{url}/subtitle", json=SUBTITLE)
+    threads = [threading.Thread(target=poller) for _ in range(pollers)] + [threading.Thread(target=updater)]
+    meter.seconds = 0.0
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    # 状態の更新のリクエストの分も含む（どちらの方法でも同じ回数）
+    cpu = meter.seconds
+    polls = max(totals["polls"], 1)
+    return {
+        "polls": totals["polls"],
+        "bytes_per_poll": totals["bytes"] / polls,
+        "cpu_ms_per_poll": cpu / polls * 1000,
+        "not_modified": totals["not_modified"] / polls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VRMコントロールサーバーの状態の並行更新とポーリングの負荷テスト")
+    parser.add_argument("--writers", type=int, default=8, help="同時に更新するスレッド数")
+    parser.add_argument("--updates", type=int, default=200, help="スレッドごとの更新回数")
+    parser.add_argument("--pollers", type=int, default=4, help="同時にポーリングするクライアント数")
+    parser.add_argument("--seconds", type=float, default=3.0, help="ポーリングを計測する時間（秒）")
+    parser.add_argument("--update-interval", type=float, default=0.1, help="ポーリング中に状態を変える間隔（秒）")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    meter = CPUMeter(app.wsgi_app)
+    app.wsgi_app = meter
+    service = ServiceThread("vrm-flask", app, "127.0.0.1", 0).start()
+    try:
+        # サーバーのログ出力を計測に含めない
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                stress = stress_updates(service.url, args.writers, args.updates)
+                plain = poll(service.url, meter, args.pollers, args.seconds, False, args.update_interval)
+                conditional = poll(service.url, meter, args.pollers, args.seconds, True, args.update_interval)
+            finally:
+                sys.stdout = stdout
+    finally:
+        service.stop()
+
+    print(f"並行更新: {stress['updates']}件 / {stress['seconds']:.2f}秒  "
+          f"連番の重複・欠番なし={stress['sequence_ok']}  ご機嫌度={stress['mood_ok']}  字幕={stress['subtitle_ok']}")
+    print(f"{'polling':>14} {'polls':>7} {'bytes/poll':>11} {'server cpu[ms]/poll':>20} {'304':>6}")
+    for name, result in (("full body", plain), ("If-None-Match", conditional)):
+        print(f"{name:>14} {result['polls']:>7} {result['bytes_per_poll']:>11.1f} "
+              f"{result['cpu_ms_per_poll']:>20.3f} {result['not_modified']:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
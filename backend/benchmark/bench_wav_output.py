@@ -0,0 +1,80 @@
+"""
+AivisAdapter の音声ファイル書き出しのマイクロベンチマーク
+従来の soundfile.read → soundfile.write（float64へのデコードと再エンコード）と、
+エンジンのWAVをそのまま書き出す方法（音量変更はint16のその場書き換え）のCPU時間とピークメモリを比較する
+
+使い方（リポジトリのルートで実行）:
+    python backend/benchmark/bench_wav_output.py --seconds 10 30 60 --repeat 5
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import soundfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_services import make_wav  # noqa: E402
+from src.TTS.AivisSpeech import AivisAdapter  # noqa: E402
+
+
+def decode_and_rewrite(content: bytes, output_filename: str) -> float:
+    """変更前の書き出し方法"""
+    with io.BytesIO(content) as audio_stream:
+        data, rate = soundfile.read(audio_stream)
+        soundfile.write(output_filename, data, rate)
+    return len(data) / rate
+
+
+def measure(func, repeat: int):
+    """CPU時間の中央値（秒）とピークメモリ（バイト）"""
+    cpu_times = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.process_time()
+        func()
+        cpu_times.append(time.process_time() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(cpu_times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音声ファイル書き出しのマイクロベンチマーク")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 30, 60], help="比較する音声の長さ（秒）")
+    parser.add_argument("--sample-rate", type=int, default=44100, help="サンプリング周波数（AivisSpeechの既定値）")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    args = parser.parse_args()
+
+    output = os.path.join(tempfile.mkdtemp(), "voice.wav")
+    adapter = AivisAdapter()
+    gained = AivisAdapter()
+    gained.volume_gain = 2.0
+
+    print(f"{'seconds':>8} {'method':<26} {'cpu[ms]':>9} {'peak[MB]':>9}")
+    for seconds in args.seconds:
+        content = make_wav(seconds, args.sample_rate)
+        methods = [
+            ("soundfile read/write", lambda: decode_and_rewrite(content, output)),
+            ("pass-through", lambda: adapter._write_wav(content, output)),
+            ("pass-through + gain x2", lambda: gained._write_wav(content, output)),
+        ]
+        for name, func in methods:
+            cpu, peak = measure(func, args.repeat)
+            print(f"{seconds:>8.0f} {name:<26} {cpu * 1000:>9.2f} {peak / 1024 / 1024:>9.2f}")
+        print(f"{'':>8} WAVのサイズ: {len(content) / 1024 / 1024:.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
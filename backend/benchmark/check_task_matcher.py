@@ -0,0 +1,120 @@
+"""
+ローカルのタスク判定器のラベル付きチェック
+task_definitions.json の conditions（プレースホルダに値を入れたもの）と言い換えを、タスクの依頼としてラベル付けして判定し、
+タスクの依頼が明確な不一致（no_match）になったり、別のタスクに一致したりしないかを確かめる。
+あわせて雑談がどれだけAPIを呼ばずに no_match と判定されるかを表示する。取りこぼしがあれば終了コード1で終わる
+
+使い方（リポジトリのルートで実行）:
+    python backend/benchmark/check_task_matcher.py
+"""
+
+import json
+import os
+import re
+import sys
+from typing import List, Optional, Tuple
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BACKEND_DIR)
+
+from src.LLM.task_matcher import TaskMatcher  # noqa: E402
+
+TASK_DEFINITIONS = os.path.join(BACKEND_DIR, "src", "LLM", "task_definitions.json")
+
+# conditions のプレースホルダに入れる値
+PLACEHOLDER_VALUES = {
+    "⚪︎": "3",
+    "（曲名）": "夜に駆ける",
+    "（プレイリスト名）": "作業用BGM",
+    "（単語）": "量子コンピュータ",
+    "（国）": "日本",
+    "（分野）": "スポーツ",
+}
+
+# 言い換え（タスクの依頼）
+PARAPHRASES: List[Tuple[str, str]] = [
+    ("3分計って", "set_timer"),
+    ("アラームを10分で", "set_timer"),
+    ("5分たったら呼んで", "set_timer"),
+    ("三十秒数えて", "set_timer"),
+    ("タイマーお願い", "set_timer"),
+    ("鬼滅の刃って何？", "wikipedia_search"),
+    ("相対性理論とは", "wikipedia_search"),
+    ("ブラックホールについて知りたい", "wikipedia_search"),
+    ("YOASOBIのアイドル聴きたい", "spotify_play_music"),
+    ("ミセスの曲流して", "spotify_play_music"),
+    ("lemon聞かせて", "spotify_play_music"),
+    ("曲とめて", "spotify_pause_music"),
+    ("次いって", "spotify_next_track"),
+    ("いま何時", "check_time"),
+    ("今日って何曜日？", "check_date"),
+    ("明日雨降る？", "check_wether"),
+    ("東京の気温は", "check_wether"),
+    ("最近のニュースある？", "get_news"),
+    ("大規模言語モデルの論文探して", "paper_search"),
+]
+
+# 雑談（タスクではない）
+CHITCHAT = [
+    "こんにちは",
+    "おはよう",
+    "疲れたなあ",
+    "ありがとう",
+    "おやすみ",
+    "眠いよ",
+    "お腹すいた",
+    "すごいね",
+    "かわいいね",
+    "元気だよ",
+    "今日は楽しかった",
+    "ゲームしてる",
+]
+
+
+def condition_cases(task_definitions: List[dict]) -> List[Tuple[str, str]]:
+    """conditions のプレースホルダに値を入れて、タスクの依頼のラベル付きの入力にする"""
+    pattern = re.compile("|".join(re.escape(placeholder) for placeholder in PLACEHOLDER_VALUES))
+    cases = []
+    for task in task_definitions:
+        for condition in task.get("conditions", []):
+            if condition:
+                cases.append((pattern.sub(lambda m: PLACEHOLDER_VALUES[m.group(0)], condition), task["task_name"]))
+    return cases
+
+
+def main():
+    with open(TASK_DEFINITIONS, encoding="utf-8") as f:
+        task_definitions = json.load(f)
+    matcher = TaskMatcher(task_definitions)
+
+    failures = []
+    labelled: List[Tuple[str, Optional[str]]] = condition_cases(task_definitions) + PARAPHRASES
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results = [(text, label, matcher.match(text)) for text, label in labelled]
+            chitchat = [(text, matcher.match(text)) for text in CHITCHAT]
+        finally:
+            sys.stdout = stdout
+
+    print(f"{'input':<28} {'label':<22} {'result':<10} {'task':<22} {'score':>6}")
+    for text, label, result in results:
+        # 一致した場合は同じタスクであること（条件文が複数のタスクに共通するものは曖昧になる）
+        ok = result.status == "ambiguous" or (result.status == "matched" and result.task_name == label)
+        if not ok:
+            failures.append(text)
+        print(f"{text:<28} {label:<22} {result.status:<10} {result.task_name or '':<22} {result.score:>6.2f}{'' if ok else '  NG'}")
+
+    no_match = sum(1 for _, result in chitchat if result.status == "no_match")
+    print(f"\nタスクの依頼: {len(results)}件  取りこぼし・誤判定: {len(failures)}件")
+    print(f"雑談: {len(chitchat)}件  APIを呼ばずに no_match: {no_match}件 "
+          f"（{', '.join(text for text, result in chitchat if result.status != 'no_match') or 'なし'} はLLMに任せる）")
+    if failures:
+        print(f"NG: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+ベンチマーク用の外部サービスの代役
+Gemini（REST）・VOICEVOX・AivisSpeech と互換のエンドポイントをローカルに立て、
+設定した遅延分布で応答する。ネットワークやAPIキーがなくてもパイプライン全体を計測できる
+"""
+
+import io
+import json
+import math
+import random
+import threading
+import time
+import wave
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+
+@dataclass
+class LatencyModel:
+    """
+    遅延分布（対数正規分布）
+    median と p99 から分布の形を決め、per_char を出力の文字数に、per_prompt_token を送信トークン数に比例して加算する
+    """
+    median: float = 0.0
+    p99: float = 0.0
+    per_char: float = 0.0
+    per_prompt_token: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "LatencyModel":
+        if not data:
+            return cls()
+        if "fixed" in data:
+            return cls(
+                median=data["fixed"],
+                p99=data["fixed"],
+                per_char=data.get("per_char", 0.0),
+                per_prompt_token=data.get("per_prompt_token", 0.0),
+            )
+        return cls(
+            median=data.get("median", 0.0),
+            p99=data.get("p99", data.get("median", 0.0)),
+            per_char=data.get("per_char", 0.0),
+            per_prompt_token=data.get("per_prompt_token", 0.0),
+        )
+
+    def sample(self, rng: random.Random, chars: int = 0, prompt_tokens: int = 0) -> float:
+        """1回分の遅延（秒）を返す"""
+        base = self.median
+        if self.median > 0 and self.p99 > self.median:
+            # p99 = median * exp(2.326 * sigma)
+            sigma = math.log(self.p99 / self.median) / 2.326
+            base = rng.lognormvariate(math.log(self.median), sigma)
+        return base + self.per_char * chars + self.per_prompt_token * prompt_tokens
+
+
+class ServiceThread:
+    """Flaskアプリを別スレッドのWSGIサーバーで動かす"""
+
+    def __init__(self, name: str, app: Flask, host: str, port: int):
+        self.name = name
+        self.server = make_server(host, port, app, threaded=True)
+        self.host = host
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, name=name, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "ServiceThread":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self._thread.join()
+
+
+# --- Gemini ---
+
+# 各モジュールの指示文に含まれる目印 → コンポーネント名（上から順に照合）
+GEMINI_COMPONENTS = [
+    ("入力分析器", "turn_input"),
+    ("応答分析器", "turn_output"),
+    ("タスク判定器", "task_classifier"),
+    ("画像の必要性を判断するAI", "image_requirement"),
+    ("感情分析をするAI", "emotion_analyzer"),
+    ("ご機嫌度", "mood_analyzer"),
+    ("あなたは翻訳機です", "translator"),
+    ("会話を要約するAI", "history_summary"),
+]
+
+DEFAULT_REPLIES = [
+    "こんにちは！今日も来てくれてうれしいな。何のお話をしようか？",
+    "なるほどね。それってすごく面白そう！もっと詳しく聞かせてほしいな。",
+    "うーん、ちょっと考えちゃうね。でも、きっと大丈夫だと思うよ！",
+    "わかった！じゃあ一緒にやってみよう。困ったらいつでも言ってね。",
+]
+
+
+def _request_text(body: dict) -> str:
+    """リクエストに含まれるテキストをすべて連結（コンポーネントの判別用）"""
+    texts = []
+    instruction = body.get("systemInstruction") or body.get("system_instruction")
+    if instruction:
+        texts.extend(part.get("text", "") for part in instruction.get("parts", []))
+    for content in body.get("contents", []):
+        texts.extend(part.get("text", "") for part in content.get("parts", []))
+    return "\n".join(texts)
+
+
+def _last_user_text(body: dict) -> str:
+    for content in reversed(body.get("contents", [])):
+        if content.get("role", "user") == "user":
+            return "".join(part.get("text", "") for part in content.get("parts", []))
+    return ""
+
+
+def _split_chunks(text: str, size: int) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class FakeGemini:
+    """generateContent / streamGenerateContent 互換のスタブ"""
+
+    def __init__(self, latencies: Dict[str, dict], replies: Optional[List[str]] = None, seed: int = 0, stream_chunk_chars: int = 12):
+        """
+        Args:
+            latencies: コンポーネント名 → 遅延分布の設定（"default" は未指定のコンポーネント用）
+            replies: 会話の応答として順番に返す文
+            seed: 遅延の乱数シード
+            stream_chunk_chars: ストリーミング時の1チャンクあたりの文字数
+        """
+        self.latencies = {name: LatencyModel.from_dict(value) for name, value in latencies.items()}
+        self.replies = replies or DEFAULT_REPLIES
+        self.stream_chunk_chars = stream_chunk_chars
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._reply_index = 0
+        self.calls: Dict[str, int] = {}
+
+        self.app = Flask("fake_gemini")
+        self.app.add_url_rule("/v1beta/models/<model>:generateContent", "generate", self._generate, methods=["POST"])
+        self.app.add_url_rule("/v1beta/models/<model>:streamGenerateContent", "stream", self._stream, methods=["POST"])
+
+    def _component(self, body: dict) -> str:
+        text = _request_text(body)
+        for marker, name in GEMINI_COMPONENTS:
+            if marker in text:
+                return name
+        return "conversation"
+
+    def _latency(self, component: str) -> LatencyModel:
+        return self.latencies.get(component) or self.latencies.get("default") or LatencyModel()
+
+    def _reply_text(self, component: str, body: dict) -> str:
+        if component == "turn_input":
+            return json.dumps({"task": {"status": "no_match"}, "image_required": False})
+        if component == "turn_output":
+            return json.dumps({"emotion": "happy", "mood": 70, "translation": "This is a benchmark reply."})
+        if component == "task_classifier":
+            return json.dumps({"status": "no_match"})
+        if component == "image_requirement":
+            return "不要"
+        if component == "emotion_analyzer":
+            return "happy"
+        if component == "mood_analyzer":
+            return "70"
+        if component == "history_summary":
+            return "ユーザーとAITuberは日常の出来事や趣味について楽しく話している。"
+        if component == "translator":
+            return "This is a benchmark reply. " * max(1, len(_last_user_text(body)) // 40)
+        with self._lock:
+            reply = self.replies[self._reply_index % len(self.replies)]
+            self._reply_index += 1
+        return reply
+
+    def _prepare(self) -> Tuple[str, str, float, int]:
+        body = request.get_json(force=True, silent=True) or {}
+        component = self._component(body)
+        text = self._reply_text(component, body)
+        # 送信トークン数の概算（日本語は1文字1トークン程度）
+        prompt_tokens = len(_request_text(body))
+        with self._lock:
+            self.calls[component] = self.calls.get(component, 0) + 1
+            delay = self._latency(component).sample(self._rng, len(text), prompt_tokens)
+        return component, text, delay, prompt_tokens
+
+    @staticmethod
+    def _candidate(text: str, finish: bool, prompt_tokens: int = 0) -> dict:
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        result = {"candidates": [candidate]}
+        if finish:
+            candidate["finishReason"] = "STOP"
+            result["usageMetadata"] = {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": len(text),
+                "totalTokenCount": prompt_tokens + len(text),
+            }
+        return result
+
+    def _generate(self, model: str):
+        _, text, delay, prompt_tokens = self._prepare()
+        time.sleep(delay)
+        return jsonify(self._candidate(text, finish=True, prompt_tokens=prompt_tokens))
+
+    def _stream(self, model: str):
+        _, text, delay, prompt_tokens = self._prepare()
+        chunks = _split_chunks(text, self.stream_chunk_chars)
+        # 合計の遅延のうち半分を最初のチャンクまで、残りをチャンク間に割り振る
+        first_delay = delay / 2
+        gap = (delay - first_delay) / max(1, len(chunks) - 1)
+
+        def generate():
+            time.sleep(first_delay)
+            yield "["
+            for i, chunk in enumerate(chunks):
+                if i:
+                    time.sleep(gap)
+                    yield ",\n"
+                yield json.dumps(self._candidate(chunk, finish=i == len(chunks) - 1, prompt_tokens=prompt_tokens))
+            yield "]"
+
+        return Response(generate(), mimetype="application/json")
+
+
+# --- 音声合成エンジン ---
+
+def make_wav(seconds: float, sample_rate: int, frequency: float = 220.0) -> bytes:
+    """指定した長さの正弦波のWAV（16bitモノラル）"""
+    frames = max(1, int(seconds * sample_rate))
+    t = np.arange(frames) / sample_rate
+    samples = (np.sin(2 * np.pi * frequency * t) * 3000).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class FakeTTSEngine:
+    """VOICEVOX / AivisSpeech 互換の /audio_query と /synthesis"""
+
+    def __init__(
+        self,
+        name: str,
+        audio_query_latency: Optional[dict] = None,
+        synthesis_latency: Optional[dict] = None,
+        sample_rate: int = 24000,
+        seconds_per_char: float = 0.12,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            name: エンジン名（ログ用）
+            audio_query_latency: /audio_query の遅延分布
+            synthesis_latency: /synthesis の遅延分布（per_char は読み上げる文字数に比例）
+            sample_rate: 出力WAVのサンプリング周波数
+            seconds_per_char: 1文字あたりの再生時間（speedScale=1.0のとき）
+            seed: 遅延の乱数シード
+        """
+        self.name = name
+        self.audio_query_latency = LatencyModel.from_dict(audio_query_latency)
+        self.synthesis_latency = LatencyModel.from_dict(synthesis_latency)
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {"audio_query": 0, "synthesis": 0}
+
+        self.app = Flask(f"fake_{name}")
+        self.app.add_url_rule("/audio_query", "audio_query", self._audio_query, methods=["POST"])
+        self.app.add_url_rule("/synthesis", "synthesis", self._synthesis, methods=["POST"])
+        self.app.add_url_rule("/version", "version", lambda: jsonify(f"fake-{name}"), methods=["GET"])
+        self.app.add_url_rule("/speakers", "speakers", lambda: jsonify([]), methods=["GET"])
+
+    def _sleep(self, model: LatencyModel, chars: int) -> None:
+        with self._lock:
+            delay = model.sample(self._rng, chars)
+        time.sleep(delay)
+
+    def _audio_query(self):
+        text = request.args.get("text", "")
+        with self._lock:
+            self.calls["audio_query"] += 1
+        self._sleep(self.audio_query_latency, len(text))
+        return jsonify({
+            "accent_phrases": [],
+            "speedScale": 1.0,
+            "pitchScale": 0.0,
+            "intonationScale": 1.0,
+            "volumeScale": 1.0,
+            "prePhonemeLength": 0.1,
+            "postPhonemeLength": 0.1,
+            "outputSamplingRate": self.sample_rate,
+            "outputStereo": False,
+            "kana": text,
+        })
+
+    def _synthesis(self):
+        query = request.get_json(force=True, silent=True) or {}
+        text = query.get("kana", "")
+        speed = query.get("speedScale") or 1.0
+        with self._lock:
+            self.calls["synthesis"] += 1
+        self._sleep(self.synthesis_latency, len(text))
+        seconds = len(text) * self.seconds_per_char / speed + query.get("prePhonemeLength", 0.1) + query.get("postPhonemeLength", 0.1)
+        return Response(make_wav(seconds, self.sample_rate), mimetype="audio/wav")
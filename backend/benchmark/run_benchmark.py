@@ -0,0 +1,244 @@
+"""
+オフラインのエンドツーエンドベンチマーク
+Gemini・AivisSpeech・VOICEVOX の代役（fake_services）と本物のVRM Flaskサーバーをローカルに立て、
+台本の会話で VRMAITuberSystem.process_conversation を実行して、
+全体・ステージごとの p50/p99、スループット、最初の音声再生までの時間を出力する
+
+使い方（リポジトリのルートで実行）:
+    python backend/benchmark/run_benchmark.py --repeat 3 --output bench.json
+    AITUBER_STREAMING=1 python backend/benchmark/run_benchmark.py --baseline bench.json
+
+パイプラインの設定は本番と同じく環境変数（AITUBER_*）で切り替える。
+ポート 10101（AivisSpeech）・50021（VOICEVOX）・5000（VRMサーバー）を使うため、本物のサービスは止めておくこと
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_services import FakeGemini, FakeTTSEngine, ServiceThread  # noqa: E402
+
+AIVIS_PORT = 10101
+VOICEVOX_PORT = 50021
+VRM_SERVER_PORT = 5000
+
+# 結果の表で先頭に並べるステージ
+HEADLINE_STAGES = ("total", "time_to_first_audio", "response_generation", "voice_synthesis")
+
+
+def load_json(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def start_services(profile: dict) -> dict:
+    """代役サービスと本物のVRM Flaskサーバーを起動"""
+    seed = profile.get("seed", 0)
+    gemini_profile = profile.get("gemini", {})
+    gemini = FakeGemini(
+        gemini_profile.get("latency", {}),
+        replies=gemini_profile.get("replies"),
+        seed=seed,
+        stream_chunk_chars=gemini_profile.get("stream_chunk_chars", 12),
+    )
+
+    engines = {}
+    for name, port in (("aivis", AIVIS_PORT), ("voicevox", VOICEVOX_PORT)):
+        engine_profile = profile.get(name, {})
+        engines[name] = FakeTTSEngine(
+            name,
+            audio_query_latency=engine_profile.get("audio_query"),
+            synthesis_latency=engine_profile.get("synthesis"),
+            sample_rate=engine_profile.get("sample_rate", 24000),
+            seed=seed,
+        )
+
+    from src.vrm_control.vrm_flask_server import app as vrm_app
+
+    services = {
+        "gemini": (gemini, ServiceThread("fake-gemini", gemini.app, "127.0.0.1", 0)),
+        "aivis": (engines["aivis"], ServiceThread("fake-aivis", engines["aivis"].app, "127.0.0.1", AIVIS_PORT)),
+        "voicevox": (engines["voicevox"], ServiceThread("fake-voicevox", engines["voicevox"].app, "127.0.0.1", VOICEVOX_PORT)),
+        "vrm": (vrm_app, ServiceThread("vrm-flask", vrm_app, "127.0.0.1", VRM_SERVER_PORT)),
+    }
+    for _, thread in services.values():
+        thread.start()
+    return services
+
+
+def percentile_row(name: str, stats: dict, baseline: Optional[dict]) -> str:
+    row = f"{name:<28} {stats['count']:>6} {stats['p50']:>8.3f} {stats['p99']:>8.3f}"
+    if baseline:
+        base = baseline.get("stages", {}).get(name)
+        if base:
+            row += f"   p50 {stats['p50'] - base['p50']:+.3f}  p99 {stats['p99'] - base['p99']:+.3f}"
+    return row
+
+
+def print_report(result: dict, baseline: Optional[dict]) -> None:
+    stages = result["stages"]
+    print("\n=== ベンチマーク結果 ===")
+    print(f"ターン数: {result['turns']}  経過時間: {result['wall_time']:.2f}秒  スループット: {result['throughput_per_min']:.2f}ターン/分")
+    if baseline:
+        print(f"（比較対象: {baseline['meta'].get('label') or baseline['meta'].get('started_at')} / "
+              f"スループット {result['throughput_per_min'] - baseline['throughput_per_min']:+.2f}ターン/分）")
+    print(f"{'stage':<28} {'count':>6} {'p50[s]':>8} {'p99[s]':>8}")
+    ordered = [s for s in HEADLINE_STAGES if s in stages] + sorted(s for s in stages if s not in HEADLINE_STAGES)
+    for name in ordered:
+        print(percentile_row(name, stages[name], baseline))
+
+    if result["counters"]:
+        print("\nカウンタ:")
+        for name, value in sorted(result["counters"].items()):
+            print(f"  {name}: {value:g}")
+    if result.get("request_tokens"):
+        # p50とp99がほぼ同じなら、会話が進んでもリクエストが伸びていない
+        print(f"\n{'request_tokens':<28} {'count':>6} {'p50':>8} {'p99':>8}")
+        for name, stats in sorted(result["request_tokens"].items()):
+            print(f"{name:<28} {stats['count']:>6} {stats['p50']:>8.0f} {stats['p99']:>8.0f}")
+    if result.get("gauges"):
+        print("\n終了時点の値:")
+        for name, value in sorted(result["gauges"].items()):
+            print(f"  {name}: {value:g}")
+    if result.get("components"):
+        print("\nコンポーネントの読み込み時間:")
+        for name, status in sorted(result["components"].items(), key=lambda item: -item[1]["seconds"]):
+            print(f"  {name}: {status['seconds']:.3f}秒 ({status['state']})")
+    print("\n外部サービスへの呼び出し:")
+    for name, calls in result["service_calls"].items():
+        print(f"  {name}: {calls}")
+
+
+def run(args: argparse.Namespace) -> dict:
+    os.chdir(REPO_ROOT)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    profile = load_json(args.profile)
+    conversations: List[dict] = load_json(args.conversations)["conversations"]
+
+    # ターンごとの記録はベンチマーク用のファイルに分ける
+    os.environ["AITUBER_METRICS_FILE"] = args.metrics_file or ""
+    # 代役はキーを検証しないが、各モジュールは読み込み時にキーの有無を確認する
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    # 音声キャッシュは実行ごとに空の状態から始める（前回の実行結果で合成が省かれないように）
+    os.environ.setdefault("AITUBER_TTS_CACHE_DIR", tempfile.mkdtemp(prefix="aituber-tts-cache-"))
+    os.environ.setdefault("AITUBER_QUERY_CACHE_DIR", tempfile.mkdtemp(prefix="aituber-query-cache-"))
+    # 音声ファイルの保存先（クローン直後は存在しない）
+    os.makedirs(os.path.join("backend", "src", "voice"), exist_ok=True)
+
+    services = start_services(profile)
+    quiet = open(os.devnull, "w") if args.quiet else None
+    try:
+        from main import InputMode, PipelineConfig, VRMAITuberSystem
+        from src.components.registry import components
+        from src.LLM.gemini import configure_gemini
+        from src.metrics.registry import registry
+
+        config = PipelineConfig.from_env()
+        if config.async_engine:
+            # google-generativeai の非同期クライアントはRESTトランスポートに対応していないため、代役に向けられない
+            print("[ベンチマーク] 非同期エンジンは計測対象外のため、同期パイプラインで実行します")
+            config.async_engine = False
+
+        with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+            system = VRMAITuberSystem(config=config)
+            # 起動時の設定を上書きし、Geminiの呼び出し先を代役に向ける（事前読み込みが終わってから計測を始める）
+            configure_gemini(
+                api_key="benchmark",
+                transport="rest",
+                client_options={"api_endpoint": services["gemini"][1].url},
+            )
+            components.wait_warm_up()
+
+            for i in range(args.warmup):
+                system.process_conversation(conversations[0]["turns"][i % len(conversations[0]["turns"])], InputMode.MANUAL)
+            registry.reset()
+            for fake, _ in services.values():
+                if hasattr(fake, "calls"):
+                    fake.calls = {key: 0 for key in fake.calls}
+
+            turns = 0
+            started_at = time.time()
+            for _ in range(args.repeat):
+                for conversation in conversations:
+                    for user_input in conversation["turns"]:
+                        system.process_conversation(user_input, InputMode.MANUAL)
+                        turns += 1
+            wall_time = time.time() - started_at
+
+            system.cleanup()
+
+        snapshot = registry.snapshot()
+        return {
+            "meta": {
+                "label": args.label,
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started_at)),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": asdict(config),
+                "profile": os.path.relpath(args.profile, REPO_ROOT),
+                "repeat": args.repeat,
+            },
+            "turns": turns,
+            "wall_time": wall_time,
+            "throughput_per_min": turns / wall_time * 60 if wall_time else 0.0,
+            "stages": snapshot["stages"],
+            "counters": snapshot["counters"],
+            "gauges": snapshot["gauges"],
+            "request_tokens": snapshot["request_tokens"],
+            "components": {
+                status.name: {"state": status.state, "seconds": status.seconds} for status in components.statuses()
+            },
+            "service_calls": {name: dict(fake.calls) for name, (fake, _) in services.items() if hasattr(fake, "calls")},
+        }
+    finally:
+        for _, thread in services.values():
+            thread.stop()
+        if quiet:
+            quiet.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="オフラインのエンドツーエンドベンチマーク")
+    parser.add_argument("--conversations", default=os.path.join(BENCHMARK_DIR, "conversations.json"), help="台本の会話（JSON）")
+    parser.add_argument("--profile", default=os.path.join(BENCHMARK_DIR, "latency_profile.json"), help="代役サービスの遅延分布（JSON）")
+    parser.add_argument("--repeat", type=int, default=3, help="台本を繰り返す回数")
+    parser.add_argument("--warmup", type=int, default=1, help="集計から除くウォームアップのターン数")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", help="比較対象の結果JSON（前回の --output）")
+    parser.add_argument("--label", default="", help="結果に付ける名前")
+    parser.add_argument("--metrics-file", default="", help="ターンごとの記録を追記するJSONL（省略時は記録しない）")
+    parser.add_argument("--quiet", action="store_true", help="パイプラインのログを表示しない")
+    args = parser.parse_args()
+    # 実行中はリポジトリのルートに移動するため、パスは先に絶対パスにしておく
+    for name in ("conversations", "profile", "output", "baseline", "metrics_file"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    baseline = load_json(args.baseline) if args.baseline else None
+    result = run(args)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,43 @@
+import asyncio
+import importlib
+import os
+import signal
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Tuple, Optional, Callable
-from dataclasses import dataclass
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+from typing import Tuple, Optional, Callable, List
+from dataclasses import dataclass, asdict
 from enum import Enum
 
+# 起動から最初の挨拶までの時間の計測用
+STARTUP_TIME = time.time()
+
 # インポート（VRM対応版）
-from src.LLM.conversation import send_message_with_image, send_message
-from src.TTS.AivisSpeech import save_wavefile
-from src.STT.speech_to_text import speech_to_text
-from src.screenshot.screenshot import get_window_by_app_name
-from src.screenshot.screenshot_front import get_frontmost_window_info, capture_window
+# Gemini・音声合成・スクリーンショットなどの重いモジュールは components 経由で遅延読み込みする
+from src.TTS.speech_pipeline import SentenceBuffer, SpeechPipeline
 from src.display.subtitle import update_subtitle
-from src.LLM.translator import translator
-from src.LLM.task_classifier import task_classifier
-from src.LLM.image_requirement import image_requirement_detector
-from src.LLM.emotion_analyzer import emotion_analyzer
-from src.LLM.mood_analyzer import mood_analyzer
 from src.vrm_control.vrm_controller import VRMController
+from src.components.registry import components, ComponentUnavailable
+from src.metrics.registry import registry, TurnContextExecutor
+from src.TTS.audio_cache import tts_cache
+from src.TTS.query_cache import query_cache
+from src.TTS.retry import retry_policy
+from src.TTS.readings import reading_dictionary
+from src.engine.prerender import PreRenderQueue, UtteranceBundle
+from src.LLM.gemini import configure_gemini
+
+
+# 事前生成する定型の発話のプロンプト
+TIMER_NOTICE_PROMPT = "タイマーが終了しました。終了のお知らせをしてください。"
+GOODBYE_PROMPT = "【ユーザーが配信を終了します。お別れの挨拶をしてください。】"
+# 事前生成した挨拶は時刻を含むので、古くなったら使わずにその場で生成する（秒）
+GREETING_MAX_AGE = 300
+
+
+def greeting_prompt(current_time: str) -> str:
+    """起動時の挨拶のプロンプト"""
+    return f"【現在時刻は{current_time}です。ユーザーに挨拶してください。】"
 
 
 class InputMode(Enum):
@@ -37,33 +57,218 @@ class ConversationMetrics:
     screenshot_time: float = 0.0
     task_classification_time: float = 0.0
     image_requirement_time: float = 0.0
+    time_to_first_audio: float = 0.0
+    turn_input_analysis_time: float = 0.0
+    turn_output_analysis_time: float = 0.0
+    speculation_saved_time: float = 0.0
+
+
+@dataclass
+class SpeculationStats:
+    """投機的応答生成の集計"""
+    attempts: int = 0
+    hits: int = 0
+    total_saved_time: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.attempts if self.attempts else 0.0
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """環境変数の真偽値フラグを読み込む"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    """環境変数の整数値を読み込む"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return int(value)
+
+
+@dataclass
+class PipelineConfig:
+    """会話パイプラインの動作設定"""
+    streaming: bool = False  # 応答をストリーミング受信し、文ごとに音声合成・再生する
+    async_engine: bool = False  # asyncioベースの会話エンジンで実行する
+    fused_analyzer: bool = False  # 応答前・応答後の分析をそれぞれ1回のAPI呼び出しにまとめる
+    local_task_matcher: bool = False  # 明確な一致・不一致のタスク判定をAPIを呼ばずにローカルで行う
+    speculative: bool = False  # タスク分類と同時に通常の応答生成を始め、タスク・画像が不要なら採用する
+    metrics_file: Optional[str] = "backend/logs/metrics.jsonl"  # ターンごとの計測結果を追記するJSONLファイル（空なら記録しない）
+    history_token_budget: int = 8000  # 会話履歴の推定トークン数の上限。超えた古いターンは要約する（0で無制限）
+    stateless_classifiers: bool = True  # 分類器（感情・画像・タスク・ご機嫌度・翻訳）に過去の入力を送らない
+    classifier_context_turns: int = 0  # ステートレスな分類器に例として添える直近の入出力の件数
+    tts_cache_dir: str = "backend/cache/tts"  # 音声合成結果のキャッシュの保存先
+    tts_cache_mb: int = 200  # 音声合成結果のキャッシュの上限（MB。0で無効）
+    query_cache_size: int = 512  # VOICEVOXの audio_query の結果をメモする件数（0で無効）
+    query_cache_dir: Optional[str] = "backend/cache/audio_query"  # audio_query の結果の保存先（空ならメモリだけ）
+    audio_endpoint: bool = True  # 音声をファイルに書かずにVRMサーバーへ登録し、/audio/<発話ID> から配信する
+    tts_engines: str = "aivis,voicevox"  # 使う音声合成エンジン（優先する順。失敗したら次のエンジンに切り替える）
+    aivis_url: str = "http://127.0.0.1:10101"  # AivisSpeechエンジンのURL
+    voicevox_url: str = "http://localhost:50021"  # VOICEVOXエンジンのURL
+    tts_probe_interval: int = 30  # 音声合成エンジンの死活確認の間隔（秒。0で行わない）
+    lipsync_track: bool = True  # 口パク用のトラック（フレームごとの音量と口の形）を音声と一緒に配信する
+    tts_deadline: int = 30  # 1回の発話の音声合成の締め切り（秒）。過ぎたら字幕だけで続行する（0で無制限）
+    reading_dict: Optional[str] = "assets/characters/Sample/data/Sample_readings.tsv"  # 読み方の辞書（表記<TAB>読み。更新すると次の発話から反映）
+    prerender: bool = True  # タイマー終了のお知らせ・挨拶・お別れの挨拶を裏で先に生成しておく
+    vrm_dispatch: bool = True  # VRMサーバーへの表情・字幕などの送信を裏のスレッドで行い、会話のスレッドを待たせない
+    verbose_timings: bool = False  # ステージごとの所要時間を都度表示する（ターンごとのまとめは常に表示する）
+
+    @classmethod
+    def from_env(cls) -> "PipelineConfig":
+        """環境変数（AITUBER_*）から設定を読み込む"""
+        return cls(
+            streaming=_env_flag("AITUBER_STREAMING"),
+            async_engine=_env_flag("AITUBER_ASYNC"),
+            fused_analyzer=_env_flag("AITUBER_FUSED_ANALYZER"),
+            local_task_matcher=_env_flag("AITUBER_LOCAL_MATCHER"),
+            speculative=_env_flag("AITUBER_SPECULATIVE"),
+            metrics_file=os.getenv("AITUBER_METRICS_FILE", "backend/logs/metrics.jsonl") or None,
+            history_token_budget=_env_int("AITUBER_HISTORY_BUDGET", 8000),
+            stateless_classifiers=_env_flag("AITUBER_STATELESS_CLASSIFIERS", default=True),
+            classifier_context_turns=_env_int("AITUBER_CLASSIFIER_CONTEXT", 0),
+            tts_cache_dir=os.getenv("AITUBER_TTS_CACHE_DIR", "backend/cache/tts"),
+            tts_cache_mb=_env_int("AITUBER_TTS_CACHE_MB", 200),
+            query_cache_size=_env_int("AITUBER_QUERY_CACHE_SIZE", 512),
+            query_cache_dir=os.getenv("AITUBER_QUERY_CACHE_DIR", "backend/cache/audio_query") or None,
+            audio_endpoint=_env_flag("AITUBER_AUDIO_ENDPOINT", default=True),
+            tts_engines=os.getenv("AITUBER_TTS_ENGINES", "aivis,voicevox"),
+            aivis_url=os.getenv("AITUBER_AIVIS_URL", "http://127.0.0.1:10101"),
+            voicevox_url=os.getenv("AITUBER_VOICEVOX_URL", "http://localhost:50021"),
+            tts_probe_interval=_env_int("AITUBER_TTS_PROBE_INTERVAL", 30),
+            lipsync_track=_env_flag("AITUBER_LIPSYNC_TRACK", default=True),
+            tts_deadline=_env_int("AITUBER_TTS_DEADLINE", 30),
+            reading_dict=os.getenv("AITUBER_READING_DICT", "assets/characters/Sample/data/Sample_readings.tsv") or None,
+            prerender=_env_flag("AITUBER_PRERENDER", default=True),
+            vrm_dispatch=_env_flag("AITUBER_VRM_DISPATCH", default=True),
+            verbose_timings=_env_flag("AITUBER_VERBOSE_TIMINGS"),
+        )
 
 
 class VRMAITuberSystem:
     """VRM AITuberシステムのメインクラス"""
 
-    def __init__(self, default_app_name: str = "Google Chrome"):
+    def __init__(self, default_app_name: str = "Google Chrome", config: Optional[PipelineConfig] = None):
         """
         VRM AITuberSystemの初期化
         
         Args:
             default_app_name: デフォルトでスクリーンショットを取得するアプリ名
+            config: パイプラインの動作設定（省略時は環境変数から読み込む）
         """
         self.default_app_name = default_app_name
+        self.config = config or PipelineConfig.from_env()
         self.image_path = "./backend/src/image/screenshot.png"
         self.window_info = None
-        self.executor = ThreadPoolExecutor()
+        # 応答後の4タスク（翻訳・感情・ご機嫌度・音声合成）と、破棄された投機実行1つが同時に走る分だけ確保する
+        # 裏で実行する処理の計測値は、submit したターンの記録に残す
+        self.executor = TurnContextExecutor(max_workers=5)
         self.metrics = ConversationMetrics()
+        self.speculation_stats = SpeculationStats()
+        self._turn_start = time.time()
+        self._first_audio_pending = False
+        self._sentence_synthesis_times: List[float] = []
+        self._turn_id = ""
+        self._greeted = False
+        self._cleaned_up = False
+        self._voice_utterance_id: Optional[str] = None
+        self._voice_ready = False
+        registry.configure(jsonl_path=self.config.metrics_file, verbose=self.config.verbose_timings)
+        tts_cache.configure(self.config.tts_cache_dir, self.config.tts_cache_mb * 1024 * 1024)
+        query_cache.configure(self.config.query_cache_size, self.config.query_cache_dir)
+        retry_policy.configure(deadline=self.config.tts_deadline)
+        reading_dictionary.configure(self.config.reading_dict)
+        # 定型の発話は会話のターンの合間に裏で生成しておく
+        self.prerender = PreRenderQueue() if self.config.prerender else None
+        
+        # Geminiの設定はプロセス全体で共有するため、モジュールを並行して読み込む前に1回だけ行う
+        configure_gemini()
         
-        # VRM制御システム初期化
-        self.vrm_controller = VRMController()
+        # 重いコンポーネントは裏で読み込みを始め、VRMサーバーへの接続などと重ね合わせる
+        self._register_components()
+        components.warm_up(self._warm_up_order())
+        
+        # VRM制御システム初期化（状態の更新は裏の送信スレッドが送る）
+        self.vrm_controller = VRMController(background=self.config.vrm_dispatch)
+        
+        # ストリーミング時は文ごとに音声合成し、順番に再生する
+        self.speech_pipeline = None
+        if self.config.streaming and self.config.async_engine:
+            print("[警告] 非同期エンジンでは文ごとのストリーミング再生は未対応のため無効にします")
+        elif self.config.streaming:
+            self.speech_pipeline = SpeechPipeline(
+                synthesize=self._synthesize_sentence,
+                play=self._play_sentence,
+            )
         
         # 初期化処理
         self._initialize_system()
     
+    def _register_components(self) -> None:
+        """遅延読み込みするコンポーネントの登録（スクリーンショットと音声認識は無くても起動できる）"""
+        components.register("classifier", self._load_classifier)
+        components.register("conversation", self._load_conversation)
+        components.register("tts", self._load_tts)
+        components.register("translator", self._classifier_module("src.LLM.translator"))
+        components.register("emotion_analyzer", self._classifier_module("src.LLM.emotion_analyzer"))
+        components.register("mood_analyzer", self._classifier_module("src.LLM.mood_analyzer"))
+        components.register("task_classifier", self._classifier_module("src.LLM.task_classifier"))
+        components.register("image_requirement", self._classifier_module("src.LLM.image_requirement"))
+        components.register("turn_analyzer", "src.LLM.turn_analyzer")
+        components.register("screenshot", "src.screenshot.screenshot", optional=True)
+        components.register("screenshot_front", "src.screenshot.screenshot_front", optional=True)
+        components.register("stt", "src.STT.speech_to_text", optional=True, warm=False)
+        components.register("async_engine", "src.engine.async_engine", warm=False)
+    
+    def _warm_up_order(self) -> List[str]:
+        """事前読み込みの順序（最初の挨拶に必要なものから）"""
+        order = ["conversation", "tts"]
+        order += ["turn_analyzer"] if self.config.fused_analyzer else []
+        order += ["translator", "emotion_analyzer", "mood_analyzer", "task_classifier", "image_requirement"]
+        order += ["screenshot", "screenshot_front"]
+        if self.config.async_engine:
+            order.append("async_engine")
+        return order
+    
+    def _load_conversation(self):
+        conversation = importlib.import_module("src.LLM.conversation")
+        conversation.history_manager.configure(token_budget=self.config.history_token_budget)
+        return conversation
+    
+    def _load_tts(self):
+        """使うエンジンを設定し、ダミーの合成で温めてから死活確認を始める"""
+        engines = importlib.import_module("src.TTS.engines")
+        engines.tts_router.configure(
+            [name.strip() for name in self.config.tts_engines.split(",") if name.strip()],
+            urls={"aivis": self.config.aivis_url, "voicevox": self.config.voicevox_url},
+            probe_interval=self.config.tts_probe_interval,
+        )
+        engines.tts_router.warm_up()
+        engines.tts_router.start_health_probe()
+        return engines
+    
+    def _load_classifier(self):
+        classifier = importlib.import_module("src.LLM.classifier")
+        classifier.configure_classifiers(
+            stateless=self.config.stateless_classifiers,
+            context_turns=self.config.classifier_context_turns,
+        )
+        return classifier
+    
+    def _classifier_module(self, module_path: str) -> Callable:
+        """分類器の設定を反映してからモジュールを読み込むローダー"""
+        def load():
+            components.get("classifier")
+            return importlib.import_module(module_path)
+        return load
+    
     def _initialize_system(self) -> None:
         """システムの初期化"""
-        self.window_info = get_window_by_app_name(self.default_app_name)
         update_subtitle(" ")
         
         # VRMサーバーが利用できない場合でも続行
@@ -74,15 +279,23 @@ class VRMAITuberSystem:
             
         print("VRM AITuberシステムが初期化されました")
     
-    def _update_ui_and_voice(self, response: str, en_res: str) -> None:
-        """UIと音声の更新"""
-        subtitle = f"{response} <br> {en_res}"
-        update_subtitle(subtitle)
-        save_wavefile(response)
-        time.sleep(0.1)
-        self.vrm_controller.set_expression("normal")
-        self.vrm_controller.play_motion("normal")
-        self.vrm_controller.play_voice()
+    def _update_ui_and_voice(self, response: str, en_res: str, bundle: Optional[UtteranceBundle] = None) -> None:
+        """UIと音声の更新（事前生成した束があれば、その音声と感情・ご機嫌度を使う）"""
+        voice = None
+        try:
+            voice = self._bundle_voice(bundle) if bundle else self._synthesize_voice(response)
+        except ConnectionError as e:
+            self._degrade_to_subtitles(e)
+        emotion = bundle.emotion if bundle else "normal"
+        # 字幕・表情・モーション・音声再生を1回のリクエストでまとめて送る
+        self.vrm_controller.apply_state(
+            expression=emotion,
+            emotion=emotion,
+            mood_value=bundle.mood_value if bundle else None,
+            subtitle=(response, en_res),
+            play_voice=voice is not None,
+            utterance_id=voice[1] if voice else None,
+        )
     
     def timer_done_callback(self, minutes: int) -> None:
         """
@@ -92,15 +305,64 @@ class VRMAITuberSystem:
             minutes: タイマーの分数
         """
         print(f"\n[TIMER DONE]\n")
-        prompt = "タイマーが終了しました。終了のお知らせをしてください。"
-        response = send_message(prompt)
+        bundle = self.prerender.take("timer") if self.prerender else None
+        if bundle is not None:
+            # タイマーをセットしたときに生成しておいたお知らせをすぐに再生する
+            components.get("conversation").commit_detached(bundle.prompt, bundle.response)
+            print("AI:\n", bundle.text)
+            print("Eng:\n", bundle.translation)
+            self._update_ui_and_voice(bundle.text, bundle.translation, bundle=bundle)
+            return
+        
+        response = components.get("conversation").send_message(TIMER_NOTICE_PROMPT)
         
         print("AI:\n", response)
-        en_res = translator(response)
+        en_res = components.get("translator").translator(response)
         print("Eng:\n", en_res)
         
         self._update_ui_and_voice(response, en_res)
     
+    def _prepare_timer_notice(self, minutes: float) -> None:
+        """タイマーをセットしたときに、終了のお知らせを裏で生成しておく"""
+        if self.prerender:
+            self.prerender.submit("timer", self._bundle_renderer("timer", TIMER_NOTICE_PROMPT), priority=0)
+    
+    def _bundle_renderer(self, key: str, prompt: str, analyze_mood: bool = False) -> Callable:
+        """
+        定型の発話の束（応答・英訳・感情・音声）を生成する関数を作る
+        段階ごとに checkpoint() を呼び、会話のターンの間は次の段階に進まない
+        
+        Args:
+            key: 発話の種類
+            prompt: LLMに送るプロンプト（履歴には発話するときに追加する）
+            analyze_mood: ご機嫌度も診断するか
+        """
+        def render(checkpoint: Callable[[], None]) -> UtteranceBundle:
+            checkpoint()
+            response, _ = components.get("conversation").generate_detached(prompt)
+            text = response.text
+            checkpoint()
+            translation = components.get("translator").translator(text)
+            checkpoint()
+            emotion = components.get("emotion_analyzer").emotion_analyzer(text)
+            mood_value = components.get("mood_analyzer").mood_analyzer("", text) if analyze_mood else None
+            checkpoint()
+            audio = None
+            if self.config.audio_endpoint:
+                try:
+                    audio = components.get("tts").synthesize_wav(text, lipsync=self.config.lipsync_track)
+                except (ValueError, ConnectionError) as e:
+                    # 音声は発話するときにその場で合成する
+                    print(f"[事前生成] {key} の音声を合成できませんでした: {e}")
+            return UtteranceBundle(key, prompt, response, text, translation, emotion, mood_value, audio)
+        return render
+    
+    def _bundle_voice(self, bundle: UtteranceBundle) -> Tuple[float, Optional[str]]:
+        """事前生成した束の音声をVRMサーバーに登録する（音声がなければその場で合成する）"""
+        if bundle.audio is None or not self.vrm_controller.server_available:
+            return self._synthesize_voice(bundle.text)
+        return self._publish_wav(*bundle.audio)
+    
     def _get_user_input(self, mode: InputMode) -> Tuple[str, bool]:
         """
         ユーザー入力の取得
@@ -115,93 +377,440 @@ class VRMAITuberSystem:
             user_input = input("あなた:")
             return user_input, True
         elif mode == InputMode.VOICE:
-            return speech_to_text()
+            return components.get("stt").speech_to_text()
         else:
             raise ValueError(f"Unsupported input mode: {mode}")
     
     def _detect_image_requirement(self, user_input: str) -> bool:
         """画像必要性の検出"""
         start = time.time()
-        is_image_requirement = image_requirement_detector(user_input)
+        is_image_requirement = components.get("image_requirement").image_requirement_detector(user_input)
         elapsed = time.time() - start
         self.metrics.image_requirement_time = elapsed
-        print(f"画像必要性判定にかかった時間: {elapsed:.2f}秒")
+        registry.observe("image_requirement", elapsed, label="画像必要性判定")
         return is_image_requirement
     
     def _classify_task(self, user_input: str) -> Tuple[bool, str]:
         """タスクの分類"""
         start = time.time()
-        is_task_matched, hint = task_classifier(user_input, timer_callback=self.timer_done_callback)
+        is_task_matched, hint = components.get("task_classifier").task_classifier(
+            user_input,
+            timer_callback=self.timer_done_callback,
+            use_local_matcher=self.config.local_task_matcher,
+            on_timer_set=self._prepare_timer_notice,
+        )
         elapsed = time.time() - start
         self.metrics.task_classification_time = elapsed
-        print(f"タスク判定にかかった時間: {elapsed:.2f}秒")
+        registry.observe("task_classification", elapsed, label="タスク判定")
         return is_task_matched, hint
     
     def _translate_text(self, text: str) -> str:
         """テキストの翻訳"""
         start = time.time()
-        result = translator(text)
+        result = components.get("translator").translator(text)
         elapsed = time.time() - start
         self.metrics.translation_time = elapsed
-        print(f"翻訳にかかった時間: {elapsed:.2f}秒")
+        registry.observe("translation", elapsed, label="翻訳")
         return result
     
     def _analyze_emotion(self, text: str) -> str:
         """感情分析"""
         start = time.time()
-        emotion = emotion_analyzer(text)
+        emotion = components.get("emotion_analyzer").emotion_analyzer(text)
         elapsed = time.time() - start
         self.metrics.emotion_analysis_time = elapsed
-        print(f"感情分析にかかった時間: {elapsed:.2f}秒")
+        registry.observe("emotion_analysis", elapsed, label="感情分析")
         return emotion
 
     def _analyze_mood_value(self, user_input: str, llm_output: str) -> int:
         """ご機嫌度診断"""
         start = time.time()
-        mood_value = mood_analyzer(user_input, llm_output)
+        mood_value = components.get("mood_analyzer").mood_analyzer(user_input, llm_output)
         elapsed = time.time() - start
         self.metrics.mood_value_analysis_time = elapsed
-        print(f"ご機嫌度診断にかかった時間: {elapsed:.2f}秒")
+        registry.observe("mood_value_analysis", elapsed, label="ご機嫌度診断")
         return mood_value
     
-    def _save_voice_file(self, text: str) -> None:
-        """音声ファイルの保存"""
+    def _analyze_turn_input(self, user_input: str) -> Optional[Tuple[bool, str, bool]]:
+        """
+        統合分析器による応答前分析（タスク判定・画像必要性判定を1回で）
+        
+        Returns:
+            (is_task_matched, hint, is_image_requirement)、失敗時はNone
+        """
         start = time.time()
-        save_wavefile(text)
-        elapsed = time.time() - start
-        self.metrics.voice_synthesis_time = elapsed
-        print(f"音声合成にかかった時間: {elapsed:.2f}秒")
+        try:
+            analysis = components.get("turn_analyzer").analyze_input(user_input)
+        except Exception as e:
+            print(f"[統合分析] 応答前分析に失敗したため個別判定に切り替えます: {e}")
+            registry.inc("errors", stage="turn_input_analysis")
+            return None
+        finally:
+            elapsed = time.time() - start
+            self.metrics.turn_input_analysis_time = elapsed
+            registry.observe("turn_input_analysis", elapsed, label="応答前分析")
+        
+        is_task_matched, hint = components.get("task_classifier").process_task_result(
+            analysis["task"], timer_callback=self.timer_done_callback, on_timer_set=self._prepare_timer_notice
+        )
+        return is_task_matched, hint, analysis["image_required"]
     
-    def _capture_screenshot(self, mode: InputMode) -> None:
-        """スクリーンショットの撮影"""
+    def _analyze_turn_output(self, user_input: str, response: str) -> Optional[Tuple[str, str, int]]:
+        """
+        統合分析器による応答後分析（翻訳・感情分析・ご機嫌度診断を1回で）
+        
+        Returns:
+            (en_res, emotion, mood_value)、失敗時はNone
+        """
         start = time.time()
+        try:
+            analysis = components.get("turn_analyzer").analyze_output(user_input, response)
+        except Exception as e:
+            print(f"[統合分析] 応答後分析に失敗したため個別分析に切り替えます: {e}")
+            registry.inc("errors", stage="turn_output_analysis")
+            return None
+        finally:
+            elapsed = time.time() - start
+            self.metrics.turn_output_analysis_time = elapsed
+            registry.observe("turn_output_analysis", elapsed, label="応答後分析")
+        
+        return analysis["translation"], analysis["emotion"], analysis["mood"]
+    
+    def _synthesize_voice(self, text: str, output_filename: str = "backend/src/voice/voice.wav") -> Tuple[float, Optional[str]]:
+        """
+        音声合成（VRMサーバーに登録できればファイルに書かずに配信する）
+        
+        Args:
+            text: 読み上げるテキスト
+            output_filename: VRMサーバーに登録できない場合の保存先
+            
+        Returns:
+            (duration, utterance_id): 再生時間（秒）と発話ID（ファイルに保存した場合はNone）
+        """
+        tts = components.get("tts")
+        if not (self.config.audio_endpoint and self.vrm_controller.server_available):
+            return tts.save_wavefile(text, output_filename=output_filename), None
+        try:
+            wav, info, track = tts.synthesize_wav(text, lipsync=self.config.lipsync_track)
+        except ValueError:
+            # 16bitのPCM以外はファイル経由で再生する
+            return tts.save_wavefile(text, output_filename=output_filename), None
+        return self._publish_wav(wav, info, track, output_filename)
+    
+    def _publish_wav(self, wav, info, track, output_filename: str = "backend/src/voice/voice.wav") -> Tuple[float, Optional[str]]:
+        """合成済みのWAVをVRMサーバーに登録する（登録できなければファイルに保存する）"""
+        utterance_id = self.vrm_controller.send_audio(wav, info, lipsync=track.to_dict() if track else None)
+        if utterance_id is None:
+            with open(output_filename, "wb") as f:
+                f.write(wav)
+        return info.duration, utterance_id
+    
+    def _save_voice_file(self, text: str, ready: Optional[threading.Event] = None) -> None:
+        """
+        音声ファイルの保存（VRMサーバーに登録した場合は発話IDを控える。合成できなければ字幕だけにする）
+        複数の文からなる応答は最初の文を登録した時点で ready を立て、残りの文は再生と並行して追記する
+        
+        Args:
+            text: 読み上げるテキスト
+            ready: 再生を始められるようになった（または合成に失敗した）ときに立てるイベント
+        """
+        start = time.time()
+        self._voice_ready = False
+        
+        def on_ready(utterance_id: Optional[str]) -> None:
+            self._voice_utterance_id = utterance_id
+            self._voice_ready = True
+            # 音声合成の時間は、再生を始められるまでの時間（応答を待たせる時間）として記録する
+            elapsed = time.time() - start
+            self.metrics.voice_synthesis_time = elapsed
+            registry.observe("voice_synthesis", elapsed, label="音声合成")
+            if ready:
+                ready.set()
+        
+        try:
+            self._stream_voice(text, on_ready)
+        except ConnectionError as e:
+            self._degrade_to_subtitles(e)
+        finally:
+            if ready:
+                ready.set()
+    
+    def _stream_voice(self, text: str, on_ready: Callable[[Optional[str]], None]) -> None:
+        """
+        応答を文ごとに合成してVRMサーバーに流し込む
+        最初の文を合成途中の発話（final=False）として登録した時点で発話IDを on_ready に渡し、
+        残りの文のPCMと口パク用のトラックは、フロントエンドが /audio/<発話ID> を再生している間に append_audio で追記する
+        
+        Args:
+            text: 読み上げるテキスト
+            on_ready: 再生を始められるようになったときに発話ID（ファイルに保存した場合はNone）を受け取る
+            
+        Raises:
+            ConnectionError: 最初の文を合成できなかった場合
+        """
+        buffer = SentenceBuffer()
+        sentences = buffer.feed(text)
+        rest = buffer.flush()
+        if rest:
+            sentences.append(rest)
+        if len(sentences) < 2 or not (self.config.audio_endpoint and self.vrm_controller.server_available):
+            on_ready(self._synthesize_voice(text)[1])
+            return
         
-        # 音声入力の場合、アクティブウィンドウを取得
-        if mode == InputMode.VOICE:
-            self.window_info = get_frontmost_window_info()
+        tts = components.get("tts")
+        try:
+            wav, first, track = tts.synthesize_wav(sentences[0], lipsync=self.config.lipsync_track)
+        except ValueError:
+            # 16bitのPCM以外はまとめて合成してファイル経由で再生する
+            on_ready(self._synthesize_voice(text)[1])
+            return
+        utterance_id = self.vrm_controller.send_audio(wav, first, final=False, lipsync=track.to_dict(partial=True) if track else None)
+        if utterance_id is None:
+            on_ready(self._synthesize_voice(text)[1])
+            return
+        on_ready(utterance_id)
         
-        capture_window(self.window_info, save_path=self.image_path)
+        duration = first.duration
+        finished = False
+        try:
+            for index, sentence in enumerate(sentences[1:], start=2):
+                final = index == len(sentences)
+                wav, info, sentence_track = tts.synthesize_wav(sentence, lipsync=self.config.lipsync_track)
+                if (info.sample_rate, info.channels, info.bits_per_sample) != (first.sample_rate, first.channels, first.bits_per_sample):
+                    # フェイルオーバーで別のエンジンに切り替わると形式が変わり、同じ発話には追記できない
+                    print("[警告] 音声の形式が変わったため、残りの文は字幕のみにします")
+                    break
+                if track and sentence_track:
+                    track.extend(sentence_track, duration)
+                duration += info.duration
+                pcm = memoryview(wav)[info.data_offset:info.data_offset + info.data_size]
+                lipsync = track.to_dict(partial=not final) if track else None
+                if not self.vrm_controller.append_audio(utterance_id, pcm, final=final, lipsync=lipsync):
+                    return
+                finished = final
+        except (ConnectionError, ValueError) as e:
+            # 再生は始まっているので、残りの文は字幕だけにする
+            self._degrade_to_subtitles(e)
+        finally:
+            if not finished:
+                self.vrm_controller.append_audio(utterance_id, b"", final=True, lipsync=track.to_dict() if track else None)
+    
+    def _degrade_to_subtitles(self, error: Exception) -> None:
+        """音声合成エンジンが使えないときは、会話を止めずに字幕だけで続ける"""
+        print(f"[警告] 音声合成に失敗したため字幕のみで続行します: {error}")
+        registry.inc("errors", stage="voice_synthesis")
+    
+    def _synthesize_sentence(self, sentence: str, output_filename: str) -> Tuple[float, Optional[str]]:
+        """文単位の音声合成（ストリーミング用）"""
+        start = time.time()
+        result = self._synthesize_voice(sentence, output_filename=output_filename)
+        elapsed = time.time() - start
+        self._sentence_synthesis_times.append(elapsed)
+        registry.observe("sentence_synthesis", elapsed, label="文の音声合成")
+        return result
+    
+    def _play_sentence(self, sentence: str, utterance_id: Optional[str] = None, turn_id: Optional[str] = None) -> None:
+        """合成済みの文の再生指示（ストリーミング用）"""
+        self._mark_first_audio(turn_id)
+        self.vrm_controller.play_voice(utterance_id)
+    
+    def _mark_first_audio(self, turn_id: Optional[str] = None) -> None:
+        """
+        ターン開始から最初の音声再生指示までの時間を記録
+        
+        Args:
+            turn_id: 再生する音声を生成したターンのID（前のターンの文の再生が続いている場合は記録しない）
+        """
+        if not self._first_audio_pending or (turn_id is not None and turn_id != self._turn_id):
+            return
+        self._first_audio_pending = False
+        self.metrics.time_to_first_audio = time.time() - self._turn_start
+        registry.observe("time_to_first_audio", self.metrics.time_to_first_audio)
+    
+    def _begin_turn(self, kind: str = "conversation") -> float:
+        """ターン単位の計測状態を初期化"""
+        # 非同期エンジンと同じインスタンスを共有しているため、置き換えずに値だけ初期化する
+        for name, value in asdict(ConversationMetrics()).items():
+            setattr(self.metrics, name, value)
+        self._turn_id = registry.begin_turn(kind)
+        self._turn_start = time.time()
+        self._first_audio_pending = True
+        self._sentence_synthesis_times = []
+        if self.prerender:
+            self.prerender.begin_interactive()
+        return self._turn_start
+    
+    def _end_turn(self) -> None:
+        """ターンの計測を確定し、JSONLへの記録とVRMサーバーへの集計値の送信を行う"""
+        if self.prerender:
+            self.prerender.end_interactive()
+        self.metrics.total_time = time.time() - self._turn_start
+        registry.observe("total", self.metrics.total_time)
+        registry.end_turn(**asdict(self.metrics))
+        self._print_metrics()
+        # /metrics の更新はターンの応答に影響しないよう裏で送る
+        if self.config.vrm_dispatch:
+            self.vrm_controller.send_metrics(registry.to_prometheus())
+        else:
+            self.executor.submit(self.vrm_controller.send_metrics, registry.to_prometheus())
+    
+    def _capture_screenshot(self, mode: InputMode) -> Optional[str]:
+        """
+        スクリーンショットの撮影
+        
+        Returns:
+            画像のパス。スクリーンショットが使えない環境ではNone（画像なしで応答する）
+        """
+        start = time.time()
+        try:
+            screenshot_front = components.get("screenshot_front")
+            # 音声入力の場合はアクティブウィンドウ、手入力の場合は指定アプリのウィンドウを撮影
+            if mode == InputMode.VOICE:
+                self.window_info = screenshot_front.get_frontmost_window_info()
+            elif self.window_info is None:
+                self.window_info = components.get("screenshot").get_window_by_app_name(self.default_app_name)
+        except ComponentUnavailable as e:
+            print(f"[警告] スクリーンショットを撮影できないため画像なしで応答します: {e}")
+            return None
+        
+        screenshot_front.capture_window(self.window_info, save_path=self.image_path)
         elapsed = time.time() - start
         self.metrics.screenshot_time = elapsed
-        print(f"スクリーンショットにかかった時間: {elapsed:.2f}秒")
+        registry.observe("screenshot", elapsed, label="スクリーンショット")
+        return self.image_path
     
     def _generate_response(self, prompt: str, use_image: bool, mode: InputMode) -> str:
         """AI応答の生成"""
         start = time.time()
         
-        if use_image:
-            self._capture_screenshot(mode)
-            response = send_message_with_image(prompt, self.image_path)
+        conversation = components.get("conversation")
+        image_path = self._capture_screenshot(mode) if use_image else None
+        if image_path:
+            response = conversation.send_message_with_image(prompt, image_path)
         else:
-            response = send_message(prompt)
+            response = conversation.send_message(prompt)
         
         elapsed = time.time() - start
         self.metrics.response_generation_time = elapsed
-        print(f"応答生成にかかった時間: {elapsed:.2f}秒")
+        registry.observe("response_generation", elapsed, label="応答生成")
         return response
     
+    def _speculate_response(self, user_input: str):
+        """履歴を変更せずに通常の応答を生成（投機実行用）"""
+        start = time.time()
+        response, base_length = components.get("conversation").generate_detached(user_input)
+        return response, base_length, time.time() - start
+    
+    def _start_speculation(self, user_input: str):
+        """タスク分類と同時に投機的な応答生成を開始"""
+        return self.executor.submit(self._speculate_response, user_input), time.time()
+    
+    def _resolve_speculation(self, speculation, user_input: str, usable: bool) -> Optional[str]:
+        """
+        投機的に生成した応答を採用するか破棄するかを決める
+        
+        Args:
+            speculation: _start_speculationの戻り値
+            user_input: ユーザーの入力
+            usable: タスクに該当せず画像も不要だったか
+            
+        Returns:
+            採用した応答。破棄した場合はNone（通常の応答生成に進む）
+        """
+        future, spec_start = speculation
+        classified_at = time.time()
+        self.speculation_stats.attempts += 1
+        
+        if not usable:
+            # 未開始なら取り消し、実行中なら結果を捨てる（履歴には追加されない）
+            future.cancel()
+            print("[投機実行] タスクまたは画像が必要なため投機応答を破棄しました")
+            registry.inc("speculation", result="discarded")
+            return None
+        
+        try:
+            response, base_length, generation_time = future.result()
+            text = response.text
+        except Exception as e:
+            print(f"[投機実行] 投機応答の生成に失敗しました: {e}")
+            registry.inc("errors", stage="speculation")
+            return None
+        
+        if not components.get("conversation").commit_detached(user_input, response, base_length):
+            print("[投機実行] 生成中に履歴が更新されたため投機応答を破棄しました")
+            registry.inc("speculation", result="conflict")
+            return None
+        
+        # 逐次実行なら「分類 + 生成」かかっていた時間のうち、重ね合わせで短縮できた分
+        saved = max(0.0, (classified_at - spec_start) + generation_time - (time.time() - spec_start))
+        self.speculation_stats.hits += 1
+        self.speculation_stats.total_saved_time += saved
+        self.metrics.response_generation_time = generation_time
+        self.metrics.speculation_saved_time = saved
+        registry.inc("speculation", result="hit")
+        registry.observe("response_generation", generation_time, label="応答生成（投機実行）")
+        registry.observe("speculation_saved", saved, label="投機実行で短縮した時間")
+        return text
+    
+    def _speak_text(self, text: str) -> List:
+        """生成済みの応答を文ごとに音声合成パイプラインへ渡す（ストリーミング用）"""
+        buffer = SentenceBuffer()
+        sentences = buffer.feed(text)
+        rest = buffer.flush()
+        if rest:
+            sentences.append(rest)
+        return [self.speech_pipeline.speak(sentence, self._turn_id) for sentence in sentences]
+    
+    def _generate_response_streaming(self, prompt: str, use_image: bool, mode: InputMode) -> Tuple[str, List]:
+        """
+        AI応答のストリーミング生成
+        文が確定するたびに音声合成パイプラインへ渡す
+        
+        Returns:
+            (response, speech_futures): 応答全文と各文の音声合成Future
+        """
+        start = time.time()
+        
+        conversation = components.get("conversation")
+        image_path = self._capture_screenshot(mode) if use_image else None
+        if image_path:
+            chunks = conversation.send_message_with_image_stream(prompt, image_path)
+        else:
+            chunks = conversation.send_message_stream(prompt)
+        
+        buffer = SentenceBuffer()
+        parts = []
+        speech_futures = []
+        for chunk in chunks:
+            parts.append(chunk)
+            for sentence in buffer.feed(chunk):
+                speech_futures.append(self.speech_pipeline.speak(sentence, self._turn_id))
+        rest = buffer.flush()
+        if rest:
+            speech_futures.append(self.speech_pipeline.speak(rest, self._turn_id))
+        
+        elapsed = time.time() - start
+        self.metrics.response_generation_time = elapsed
+        registry.observe("response_generation", elapsed, label="応答生成")
+        return "".join(parts), speech_futures
+    
+    def _wait_speech_synthesis(self, speech_futures: List) -> None:
+        """文ごとの音声合成の完了を待つ"""
+        for future in speech_futures:
+            try:
+                future.result()
+            except Exception:
+                pass  # 失敗した文は再生スレッド側でログ出力済み
+        self.metrics.voice_synthesis_time = sum(self._sentence_synthesis_times)
+        registry.observe("voice_synthesis", self.metrics.voice_synthesis_time, label="音声合成（文ごとの合計）")
+    
     def _process_parallel_tasks(self, user_input: str) -> Tuple[bool, str, bool]:
         """並列タスクの処理（タスク分類と画像必要性検出）"""
+        if self.config.fused_analyzer:
+            result = self._analyze_turn_input(user_input)
+            if result is not None:
+                return result
+        
         future_task = self.executor.submit(self._classify_task, user_input)
         future_detection = self.executor.submit(self._detect_image_requirement, user_input)
         
@@ -210,37 +819,95 @@ class VRMAITuberSystem:
         
         return is_task_matched, hint, is_image_requirement
     
-    def _process_response_tasks(self, user_input: str, response: str) -> Tuple[str, str, int]:
+    def _process_response_tasks(self, user_input: str, response: str, synthesize: bool = True) -> Tuple[str, str, int]:
         """応答後の並列タスク処理（翻訳、感情分析、ご機嫌度診断、音声合成）"""
-        future_translate = self.executor.submit(self._translate_text, response)
-        future_emotion = self.executor.submit(self._analyze_emotion, response)
-        future_mood_value = self.executor.submit(self._analyze_mood_value, user_input, response)
-        future_save_wave = self.executor.submit(self._save_voice_file, response)
+        voice_ready = threading.Event()
+        future_save_wave = self.executor.submit(self._save_voice_file, response, voice_ready) if synthesize else None
+        
+        result = None
+        if self.config.fused_analyzer:
+            result = self._analyze_turn_output(user_input, response)
+        
+        if result is None:
+            future_translate = self.executor.submit(self._translate_text, response)
+            future_emotion = self.executor.submit(self._analyze_emotion, response)
+            future_mood_value = self.executor.submit(self._analyze_mood_value, user_input, response)
+            
+            en_res = future_translate.result()
+            emotion = future_emotion.result()
+            mood_value = future_mood_value.result()
+            result = (en_res, emotion, mood_value)
         
-        en_res = future_translate.result()
-        emotion = future_emotion.result()
-        mood_value = future_mood_value.result()
-        future_save_wave.result()  # 完了を待つ
+        if future_save_wave:
+            # 最初の文を登録するまで待つ（残りの文は再生と並行して追記される）
+            voice_ready.wait()
+            if future_save_wave.done():
+                future_save_wave.result()
         
-        return en_res, emotion, mood_value
+        return result
     
-    def _update_vrm_and_ui(self, response: str, en_res: str, emotion: str, mood_value: int) -> None:
-        """VRMとUIの更新"""
+    def _update_vrm_and_ui(self, response: str, en_res: str, emotion: str, mood_value: int, play_voice: bool = True) -> None:
+        """VRMとUIの更新（ストリーミング時は音声再生指示を再生スレッドに任せる）"""
         print("AI:\n", response)
         print("Eng:\n", en_res)
         
-        subtitle = f"{response} <br> {en_res}"
-        update_subtitle(subtitle)
+        # 表情・モーション・ご機嫌度・字幕・音声再生を1回のリクエストでまとめて送る（フロントエンドには同時に反映される）
+        play_voice = play_voice and self._voice_ready
+        if play_voice:
+            self._mark_first_audio()
+        self.vrm_controller.apply_state(
+            expression=emotion,
+            emotion=emotion,
+            mood_value=mood_value,
+            subtitle=(response, en_res),
+            play_voice=play_voice,
+            utterance_id=self._voice_utterance_id,
+        )
+    
+    def _respond(self, prompt: str, user_input: str, use_image: bool, mode: InputMode, response: Optional[str] = None) -> Tuple[str, str]:
+        """
+        応答生成からVRM・UI更新までの処理
         
-        # VRM表情・アニメーション制御
-        self.vrm_controller.set_expression(emotion)  # 表情設定
-        self.vrm_controller.handle_emotion_from_live2d(emotion)  # アニメーション再生
-        self.vrm_controller.set_mood_value(mood_value)
-        self.vrm_controller.play_voice()
+        Args:
+            prompt: LLMに送るプロンプト
+            user_input: ご機嫌度診断に使うユーザーの発言
+            use_image: スクリーンショットを添付するか
+            mode: 入力モード
+            response: 生成済みの応答（投機実行で採用した場合）
+            
+        Returns:
+            (response, en_res): 応答と英訳
+        """
+        if self.speech_pipeline:
+            # 文ごとに音声合成・再生しながら応答を受信し、全文確定後に分析する
+            if response is None:
+                response, speech_futures = self._generate_response_streaming(prompt, use_image, mode)
+            else:
+                speech_futures = self._speak_text(response)
+            en_res, emotion, mood_value = self._process_response_tasks(user_input, response, synthesize=False)
+            self._update_vrm_and_ui(response, en_res, emotion, mood_value, play_voice=False)
+            self._wait_speech_synthesis(speech_futures)
+        else:
+            if response is None:
+                response = self._generate_response(prompt, use_image, mode)
+            en_res, emotion, mood_value = self._process_response_tasks(user_input, response)
+            self._update_vrm_and_ui(response, en_res, emotion, mood_value)
+        return response, en_res
     
     def _print_metrics(self) -> None:
         """パフォーマンス指標の出力"""
-        print(f"会話にかかった時間: {self.metrics.total_time:.2f}秒\n")
+        print(f"[{self._turn_id}] 最初の音声再生までの時間: {self.metrics.time_to_first_audio:.2f}秒")
+        if self.config.local_task_matcher:
+            stats = components.get("task_classifier").task_matcher.stats
+            print(f"ローカルタスク判定: ヒット率 {stats.hit_rate:.0%} ({stats.hits}/{stats.lookups})")
+        if self.config.speculative:
+            stats = self.speculation_stats
+            print(f"投機実行: ヒット率 {stats.hit_rate:.0%} ({stats.hits}/{stats.attempts}), 累計短縮 {stats.total_saved_time:.2f}秒")
+        if tts_cache.enabled:
+            print(f"音声キャッシュ: ヒット率 {tts_cache.hit_rate:.0%} ({tts_cache.hits}/{tts_cache.hits + tts_cache.misses})")
+        if query_cache.enabled and query_cache.hits + query_cache.disk_hits + query_cache.misses:
+            print(f"audio_query のメモ: ヒット率 {query_cache.hit_rate:.0%}（メモリ {query_cache.hits} / ディスク {query_cache.disk_hits} / 未登録 {query_cache.misses}）")
+        print(f"[{self._turn_id}] 会話にかかった時間: {self.metrics.total_time:.2f}秒\n")
 
     def greeting(self) -> None:
         """起動時の挨拶"""
@@ -248,10 +915,76 @@ class VRMAITuberSystem:
         current_time = datetime.now().strftime("%H:%M:%S")
         print("現在時刻:", current_time)
         mode = InputMode(0)
-        response = self._generate_response(f"【現在時刻は{current_time}です。ユーザーに挨拶してください。】", False, mode)
-        en_res, emotion, mood_value = self._process_response_tasks("", response)
-        self._update_vrm_and_ui(response, en_res, emotion, mood_value)
-        self.vrm_controller.send_subtitle(response, en_res)
+        self._begin_turn("greeting")
+        bundle = self.prerender.take("greeting") if self.prerender else None
+        if bundle is not None:
+            self._play_bundle(bundle)
+        else:
+            self._respond(greeting_prompt(current_time), "", False, mode)
+        self._end_turn()
+        self._report_startup()
+        self._prerender_goodbye()
+    
+    def _prerender_greeting(self) -> None:
+        """モードの選択を待つ間に、起動時の挨拶を裏で生成しておく"""
+        if self.prerender:
+            from datetime import datetime
+            prompt = greeting_prompt(datetime.now().strftime("%H:%M:%S"))
+            self.prerender.submit("greeting", self._bundle_renderer("greeting", prompt, analyze_mood=True),
+                                  priority=0, max_age=GREETING_MAX_AGE)
+    
+    def _prerender_goodbye(self) -> None:
+        """挨拶のあとに、終了時のお別れの挨拶を裏で生成しておく（タイマーのお知らせより後回し）"""
+        if self.prerender and not self.prerender.pending("goodbye"):
+            self.prerender.submit("goodbye", self._bundle_renderer("goodbye", GOODBYE_PROMPT, analyze_mood=True), priority=1)
+    
+    def _play_bundle(self, bundle: UtteranceBundle) -> Tuple[str, str]:
+        """
+        事前生成した束を履歴に追加して、VRM・UIを更新し音声を再生する
+        
+        Returns:
+            (response, en_res): 応答と英訳
+        """
+        components.get("conversation").commit_detached(bundle.prompt, bundle.response)
+        self._voice_ready = False
+        try:
+            _, self._voice_utterance_id = self._bundle_voice(bundle)
+            self._voice_ready = True
+        except ConnectionError as e:
+            self._degrade_to_subtitles(e)
+        self._update_vrm_and_ui(bundle.text, bundle.translation, bundle.emotion, bundle.mood_value)
+        return bundle.text, bundle.translation
+    
+    def say_goodbye(self) -> None:
+        """終了時のお別れの挨拶（事前生成が間に合った場合だけ。終了を待たせないようにその場では生成しない）"""
+        bundle = self.prerender.take("goodbye") if self.prerender else None
+        if bundle is None:
+            return
+        self._begin_turn("goodbye")
+        self._play_bundle(bundle)
+        self._end_turn()
+        duration = bundle.audio[1].duration if bundle.audio else 0.0
+        time.sleep(min(duration, 5.0))
+    
+    def _report_startup(self) -> None:
+        """起動から最初の挨拶までの時間と、コンポーネントの読み込み状況を表示（初回のみ）"""
+        if self._greeted:
+            return
+        self._greeted = True
+        elapsed = time.time() - STARTUP_TIME
+        registry.observe("startup_to_greeting", elapsed)
+        print(f"起動から最初の挨拶までの時間: {elapsed:.2f}秒")
+        print(components.report())
+        if components.available("tts"):
+            print(components.get("tts").tts_router.report())
+    
+    def _select_mode(self, mode_input: int) -> InputMode:
+        """入力モードを決定（音声認識が使えない環境では手入力にする）"""
+        mode = InputMode(mode_input)
+        if mode == InputMode.VOICE and not components.available("stt"):
+            print("[警告] 音声認識を利用できないため、手入力モードで開始します")
+            mode = InputMode.MANUAL
+        return mode
     
     def process_conversation(self, user_input: str, mode: InputMode) -> None:
         """
@@ -261,7 +994,10 @@ class VRMAITuberSystem:
             user_input: ユーザーの入力
             mode: 入力モード
         """
-        conv_start = time.time()
+        self._begin_turn()
+        
+        # 投機実行: タスク分類と同時に通常の応答生成を始める
+        speculation = self._start_speculation(user_input) if self.config.speculative else None
         
         # 並列タスク処理
         is_task_matched, hint, is_image_requirement = self._process_parallel_tasks(user_input)
@@ -272,28 +1008,107 @@ class VRMAITuberSystem:
         else:
             prompt = user_input
         
-        # AI応答の生成
-        response = self._generate_response(prompt, is_image_requirement, mode)
-        
-        # 応答後の並列処理
-        en_res, emotion, mood_value = self._process_response_tasks(prompt, response)
+        response = None
+        if speculation:
+            response = self._resolve_speculation(
+                speculation, user_input, usable=not is_task_matched and not is_image_requirement
+            )
         
-        # UI更新
-        self._update_vrm_and_ui(response, en_res, emotion, mood_value)
-        
-        # 字幕送信
-        self.vrm_controller.send_subtitle(response, en_res)
+        # AI応答の生成、応答後の並列処理、UI・字幕の更新
+        self._respond(prompt, prompt, is_image_requirement, mode, response=response)
         
         # メトリクス更新
-        self.metrics.total_time = time.time() - conv_start
-        self._print_metrics()
+        self._end_turn()
+    
+    async def run_async(self) -> None:
+        """メインループの実行（非同期エンジン）"""
+        engine = components.get("async_engine").AsyncConversationEngine(
+            metrics=self.metrics,
+            vrm_controller=self.vrm_controller,
+            timer_callback=self.timer_done_callback,
+            on_first_audio=self._mark_first_audio,
+            fused_analyzer=self.config.fused_analyzer,
+            local_task_matcher=self.config.local_task_matcher,
+            speculation_stats=self.speculation_stats if self.config.speculative else None,
+            audio_endpoint=self.config.audio_endpoint,
+            lipsync_track=self.config.lipsync_track,
+            on_timer_set=self._prepare_timer_notice,
+        )
+        await engine.start()
+        try:
+            # モード選択（input()はブロッキングなのでスレッドで待つ）。待つ間に挨拶を生成しておく
+            self._prerender_greeting()
+            mode_input = int(await asyncio.to_thread(input, "手入力:0 音声認識:1 "))
+            mode = await asyncio.to_thread(self._select_mode, mode_input)
+            
+            print(f"VRM AITuberシステム開始（非同期エンジン） - モード: {mode.name}")
+            
+            # 起動時の挨拶
+            from datetime import datetime
+            current_time = datetime.now().strftime("%H:%M:%S")
+            print("現在時刻:", current_time)
+            self._begin_turn("greeting")
+            bundle = self.prerender.take("greeting") if self.prerender else None
+            if bundle is not None:
+                await asyncio.to_thread(self._play_bundle, bundle)
+            else:
+                await engine.greeting(greeting_prompt(current_time))
+            self._end_turn()
+            self._report_startup()
+            self._prerender_goodbye()
+            
+            while True:
+                user_input, is_recognized = await asyncio.to_thread(self._get_user_input, mode)
+                
+                if mode == InputMode.MANUAL and user_input.lower() == 'q':
+                    await asyncio.to_thread(self.say_goodbye)
+                    break
+                
+                if is_recognized:
+                    self._begin_turn()
+                    with self._cancel_turn_on_interrupt(engine):
+                        await engine.process_conversation(user_input, lambda: self._capture_screenshot(mode))
+                    self._end_turn()
+                    if "さよなら" in user_input:
+                        await asyncio.sleep(3)
+                        break
+        finally:
+            await engine.close()
+    
+    @contextmanager
+    def _cancel_turn_on_interrupt(self, engine):
+        """ターンの処理中の Ctrl-C はそのターンだけを取り消して次の入力に戻る（入力待ちの Ctrl-C はこれまでどおり終了する）"""
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGINT, engine.cancel)
+        except (NotImplementedError, RuntimeError):
+            # シグナルハンドラーを登録できない環境（Windowsなど）では Ctrl-C で終了する
+            yield
+            return
+        try:
+            yield
+        finally:
+            loop.remove_signal_handler(signal.SIGINT)
     
     def run(self) -> None:
         """メインループの実行"""
+        if self.config.async_engine:
+            # 非同期エンジンの薄いラッパー
+            try:
+                asyncio.run(self.run_async())
+            except ValueError as e:
+                print(f"エラー: {e}")
+            except KeyboardInterrupt:
+                print("\nシステムを終了します...")
+            finally:
+                self.cleanup()
+            return
+        
         try:
-            # モード選択
+            # モード選択（待つ間に挨拶を生成しておく）
+            self._prerender_greeting()
             mode_input = int(input("手入力:0 音声認識:1 "))
-            mode = InputMode(mode_input)
+            mode = self._select_mode(mode_input)
             
             print(f"VRM AITuberシステム開始 - モード: {mode.name}")
 
@@ -306,6 +1121,7 @@ class VRMAITuberSystem:
                 
                 # 終了条件チェック
                 if mode == InputMode.MANUAL and user_input.lower() == 'q':
+                    self.say_goodbye()
                     break
                 
                 # 認識成功した場合のみ処理
@@ -324,7 +1140,10 @@ class VRMAITuberSystem:
             self.cleanup()
     
     def cleanup(self) -> None:
-        """リソースのクリーンアップ"""
+        """リソースのクリーンアップ（さよならで終了したあと finally からも呼ばれるので、2回目以降は何もしない）"""
+        if self._cleaned_up:
+            return
+        self._cleaned_up = True
         print("システムを終了しています...")
         
         # UI初期化
@@ -332,13 +1151,20 @@ class VRMAITuberSystem:
         
         # VRMサーバーが利用できない場合でもエラーにしない
         try:
-            self.vrm_controller.set_expression("normal")
-            self.vrm_controller.set_mood_value(50)
+            self.vrm_controller.apply_state(expression="normal", mood_value=50)
         except Exception as e:
             print(f"[警告] VRM終了処理でエラー: {e}")
         
         # ExecutorのShutdown
+        if self.prerender:
+            self.prerender.close()
         self.executor.shutdown(wait=True)
+        if self.speech_pipeline:
+            self.speech_pipeline.shutdown()
+        components.shutdown()
+        if components.loaded("tts"):
+            components.get("tts").tts_router.close()
+        self.vrm_controller.close()
         
         print("VRM AITuberシステムが終了しました。")
 
@@ -0,0 +1,139 @@
+"""
+単発の分類器（感情分析・画像必要性判定・タスク判定・ご機嫌度診断・翻訳）の呼び出し
+固定の指示文と今回の入力だけを送るステートレス方式で、過去の発話が積み重なって
+リクエストが伸び続けることを防ぐ。必要なら直近N件の入出力だけを例として添える
+"""
+
+import threading
+from collections import deque
+from typing import List, Optional
+
+from google.generativeai.types import content_types
+
+from .history_manager import content_tokens, estimate_tokens
+from ..metrics.registry import count_api_call, registry
+
+# 生成された分類器（configure_classifiers でまとめて設定を変える）
+CLASSIFIERS: List["InstructionClassifier"] = []
+# configure_classifiers 以降に読み込まれた分類器にも同じ設定を適用する
+DEFAULTS = {"stateless": True, "context_turns": 0}
+_config_lock = threading.Lock()
+
+
+class InstructionClassifier:
+    """固定の指示文 + 今回の入力（+ 直近N件の例）で分類するGemini呼び出し"""
+
+    def __init__(self, model, instruction: str, component: str, stateless: Optional[bool] = None, context_turns: Optional[int] = None):
+        """
+        Args:
+            model: 呼び出すGenerativeModel
+            instruction: 毎回先頭に付ける指示文
+            component: メトリクスに記録する名前
+            stateless: Falseなら従来どおりチャット履歴を積み重ねる（省略時は configure_classifiers の設定）
+            context_turns: 例として添える直近の入出力の件数（ステートレス時のみ。省略時は configure_classifiers の設定）
+        """
+        with _config_lock:
+            if stateless is None:
+                stateless = DEFAULTS["stateless"]
+            if context_turns is None:
+                context_turns = DEFAULTS["context_turns"]
+        self.model = model
+        self.instruction = instruction
+        self.component = component
+        self.stateless = stateless
+        self.context_turns = context_turns
+        # 指示文は毎回同じなので、変換済みのメッセージを使い回す
+        self._prefix = content_types.to_content({"role": "user", "parts": [instruction]})
+        self._prefix_tokens = content_tokens(self._prefix)
+        self._recent: deque = deque(maxlen=max(context_turns, 1))
+        self._lock = threading.Lock()
+        self.chat_session = model.start_chat(history=[self._prefix])
+        self.last_request_tokens = 0
+        with _config_lock:
+            CLASSIFIERS.append(self)
+
+    def configure(self, stateless: Optional[bool] = None, context_turns: Optional[int] = None) -> None:
+        if stateless is not None:
+            self.stateless = stateless
+        if context_turns is not None:
+            self.context_turns = context_turns
+            with self._lock:
+                self._recent = deque(self._recent, maxlen=max(context_turns, 1))
+
+    def build_contents(self, text: str) -> list:
+        """指示文・直近の例・今回の入力からリクエストを組み立てる"""
+        contents = [self._prefix]
+        if self.context_turns:
+            with self._lock:
+                recent = list(self._recent)[-self.context_turns:]
+            for past_input, past_output in recent:
+                contents.append({"role": "user", "parts": [past_input]})
+                contents.append({"role": "model", "parts": [past_output]})
+        contents.append({"role": "user", "parts": [text]})
+        return contents
+
+    def _request_tokens(self, contents: list) -> int:
+        """送信するリクエストの推定トークン数"""
+        tokens = self._prefix_tokens
+        for content in contents[1:]:
+            tokens += sum(estimate_tokens(part) for part in content["parts"])
+        return tokens
+
+    def _chat_request_tokens(self, text: str) -> int:
+        """チャット履歴を積み重ねる場合の推定トークン数（履歴全体 + 今回の入力）"""
+        return sum(content_tokens(content) for content in self.chat_session.history) + estimate_tokens(text)
+
+    def _record(self, text: str, request_tokens: int, response) -> str:
+        self.last_request_tokens = request_tokens
+        registry.observe_request_size(self.component, request_tokens)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and usage.prompt_token_count:
+            registry.inc("prompt_tokens", usage.prompt_token_count, component=self.component)
+        if self.stateless and self.context_turns:
+            with self._lock:
+                self._recent.append((text, response.text))
+        return response.text
+
+    def classify(self, text: str) -> str:
+        """
+        入力を分類し、モデルの出力テキストを返す
+
+        Args:
+            text: 今回の入力
+
+        Returns:
+            str: モデルの出力
+        """
+        count_api_call(self.component)
+        if self.stateless:
+            contents = self.build_contents(text)
+            request_tokens = self._request_tokens(contents)
+            response = self.model.generate_content(contents)
+        else:
+            request_tokens = self._chat_request_tokens(text)
+            response = self.chat_session.send_message(text)
+        return self._record(text, request_tokens, response)
+
+    async def classify_async(self, text: str) -> str:
+        """classify の非同期版"""
+        count_api_call(self.component)
+        if self.stateless:
+            contents = self.build_contents(text)
+            request_tokens = self._request_tokens(contents)
+            response = await self.model.generate_content_async(contents)
+        else:
+            request_tokens = self._chat_request_tokens(text)
+            response = await self.chat_session.send_message_async(text)
+        return self._record(text, request_tokens, response)
+
+
+def configure_classifiers(stateless: Optional[bool] = None, context_turns: Optional[int] = None) -> None:
+    """すべての分類器（生成済みのものと、これから生成されるもの）の設定を変更する"""
+    with _config_lock:
+        if stateless is not None:
+            DEFAULTS["stateless"] = stateless
+        if context_turns is not None:
+            DEFAULTS["context_turns"] = context_turns
+        classifiers = list(CLASSIFIERS)
+    for classifier in classifiers:
+        classifier.configure(stateless=stateless, context_turns=context_turns)
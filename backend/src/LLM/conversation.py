@@ -1,17 +1,16 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
-import os
 import PIL.Image
 import json
+import threading
+from typing import Optional
+
+from .history_manager import ChatHistoryManager
+from ..metrics.registry import count_api_call
 
 # .envファイルをロード
 load_dotenv()
 
-# 環境変数を取得
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
 generation_config = {
     "temperature": 1,
     "top_p": 0.95,
@@ -54,19 +53,103 @@ except FileNotFoundError:
     print("パスが正しいか、ファイルが存在するか確認してください。")
     exit() # ファイルが見つからない場合はプログラムを終了
 
-chat_session = model.start_chat(history=[{"role":"user","parts":base_prompt}])
+# 投機実行の結果を履歴に確定する際の排他制御
+history_lock = threading.Lock()
+# システムプロンプト + 直近のターン（トークン予算内）+ 古いターンの要約 に履歴を保つ
+history_manager = ChatHistoryManager(base_prompt, lock=history_lock)
+chat_session = model.start_chat(history=history_manager.initial_history())
 
 def send_message(user_input: str):
     """メッセージを送信し、応答を返す"""
+    count_api_call("conversation")
     response = chat_session.send_message(user_input)
+    history_manager.after_turn(chat_session, response)
     return response.text
 
 def send_message_with_image(user_input: str, image_path):
     """画像付きでメッセージを送信し、応答を返す"""
     image = PIL.Image.open(image_path)
+    count_api_call("conversation")
     response = chat_session.send_message([user_input, image])
+    history_manager.after_turn(chat_session, response)
     return response.text
 
+def send_message_stream(user_input: str):
+    """メッセージを送信し、応答テキストを受信したチャンクごとに逐次返す"""
+    count_api_call("conversation")
+    response = chat_session.send_message(user_input, stream=True)
+    for chunk in response:
+        if chunk.parts:
+            yield chunk.text
+    history_manager.after_turn(chat_session, response)
+
+def send_message_with_image_stream(user_input: str, image_path):
+    """画像付きでメッセージを送信し、応答テキストをチャンクごとに逐次返す"""
+    image = PIL.Image.open(image_path)
+    count_api_call("conversation")
+    response = chat_session.send_message([user_input, image], stream=True)
+    for chunk in response:
+        if chunk.parts:
+            yield chunk.text
+    history_manager.after_turn(chat_session, response)
+
+async def send_message_async(user_input: str):
+    """メッセージを非同期で送信し、応答を返す"""
+    count_api_call("conversation")
+    response = await chat_session.send_message_async(user_input)
+    history_manager.after_turn(chat_session, response)
+    return response.text
+
+async def send_message_with_image_async(user_input: str, image_path):
+    """画像付きでメッセージを非同期で送信し、応答を返す"""
+    image = PIL.Image.open(image_path)
+    count_api_call("conversation")
+    response = await chat_session.send_message_async([user_input, image])
+    history_manager.after_turn(chat_session, response)
+    return response.text
+
+def generate_detached(user_input: str):
+    """
+    チャット履歴を変更せずに応答を生成する（投機実行用）
+
+    Returns:
+        (response, base_length): 応答と、生成時点の履歴の長さ
+    """
+    history = chat_session.history
+    base_length = len(history)
+    count_api_call("conversation")
+    response = model.generate_content(history + [{"role": "user", "parts": [user_input]}])
+    return response, base_length
+
+async def generate_detached_async(user_input: str):
+    """チャット履歴を変更せずに応答を非同期で生成する（投機実行用）"""
+    history = chat_session.history
+    base_length = len(history)
+    count_api_call("conversation")
+    response = await model.generate_content_async(history + [{"role": "user", "parts": [user_input]}])
+    return response, base_length
+
+def commit_detached(user_input: str, response, base_length: Optional[int] = None) -> bool:
+    """
+    投機実行で得た応答を履歴に確定する
+    生成中に別のメッセージが履歴に追加されていた場合は文脈がずれるため確定しない
+
+    Args:
+        base_length: 生成時点の履歴の長さ（Noneなら確認しない。事前生成した定型の発話用）
+
+    Returns:
+        bool: 確定したかどうか
+    """
+    with history_lock:
+        if base_length is not None and len(chat_session.history) != base_length:
+            return False
+        chat_session.history = chat_session.history + [
+            {"role": "user", "parts": [user_input]},
+            response.candidates[0].content,
+        ]
+    history_manager.after_turn(chat_session, response)
+    return True
+
 if __name__ == "__main__":
     user_input = input("テキストを入力： ")
     # response = send_message_with_image(user_input, "test.png")
@@ -1,15 +1,11 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
-import os
+
+from .classifier import InstructionClassifier
 
 # .envファイルをロード
 load_dotenv()
 
-# 環境変数を取得
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
 generation_config = {
     "temperature": 0, # 安定した出力に
     "top_p": 0.95,
@@ -64,38 +60,35 @@ prompt = """あなたは感情分析をするAIです。
     - 「それじゃあ、また今度ね」→ goodbye
 """
 # print(prompt)
-chat_session = model.start_chat(history=[{"role":"user","parts":prompt}])
+# 指示文 + 今回の入力だけを送る（過去の判定結果を履歴に積み重ねない）
+classifier = InstructionClassifier(model, prompt, "emotion_analyzer")
+
+
+# 判定順に並べた感情ラベル（先に一致したものを採用）
+EMOTION_LABELS = [
+    "normal", "angry", "sad", "happy", "excited", "blush",
+    "surprised", "sleepy", "thinking", "relax", "goodbye",
+]
+
+
+def parse_emotion(response_text: str) -> str:
+    """LLMの出力から感情ラベルを取り出す（該当なしはnormal）"""
+    for label in EMOTION_LABELS:
+        if label in response_text:
+            return label
+    return "normal"
 
 
 def emotion_analyzer(text: str):
-    response = chat_session.send_message(text)
-    print(response.text)
-
-    emotion = "normal"
-    if "normal" in response.text:
-        emotion = "normal"
-    elif "angry" in response.text:
-        emotion = "angry"
-    elif "sad" in response.text:
-        emotion = "sad"
-    elif "happy" in response.text:
-        emotion = "happy"
-    elif "excited" in response.text:
-        emotion = "excited"
-    elif "blush" in response.text:
-        emotion = "blush"
-    elif "surprised" in response.text:
-        emotion = "surprised"
-    elif "sleepy" in response.text:
-        emotion = "sleepy"
-    elif "thinking" in response.text:
-        emotion = "thinking"
-    elif "relax" in response.text:
-        emotion = "relax"
-    elif "goodbye" in response.text:
-        emotion = "goodbye"
-
-    return emotion
+    response_text = classifier.classify(text)
+    print(response_text)
+    return parse_emotion(response_text)
+
+
+async def emotion_analyzer_async(text: str):
+    response_text = await classifier.classify_async(text)
+    print(response_text)
+    return parse_emotion(response_text)
 
 if __name__ == "__main__":
     while True:
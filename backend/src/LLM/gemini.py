@@ -0,0 +1,29 @@
+"""
+Gemini の接続設定
+genai.configure はプロセス全体で1つの設定を共有するため、各モジュールの読み込み時ではなく起動時に1回だけ設定する
+（重いモジュールを並行して読み込んでも、どのモジュールの読み込みが最後に終わったかで使うキーが変わらない）
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+
+def configure_gemini(**options) -> None:
+    """
+    GEMINI_API_KEY で genai を設定する（会話・分類器・翻訳・要約で共有する）
+
+    Args:
+        options: genai.configure に渡す設定（api_key を指定すれば環境変数より優先する）
+
+    Raises:
+        ValueError: APIキーが設定されていない場合
+    """
+    # google.generativeai の読み込みは重いため、設定するときに読み込む
+    import google.generativeai as genai
+
+    load_dotenv()
+    options.setdefault("api_key", os.getenv("GEMINI_API_KEY"))
+    if not options["api_key"]:
+        raise ValueError("GEMINI_API_KEY環境変数が設定されていません")
+    genai.configure(**options)
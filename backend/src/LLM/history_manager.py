@@ -0,0 +1,236 @@
+"""
+会話履歴の管理
+システムプロンプトを常に先頭に残し、直近のターンをトークン予算内のスライディングウィンドウで保持する。
+予算からあふれた古いターンは要約して先頭のメッセージに畳み込み、送信済みのスクリーンショットは履歴から外す
+"""
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import google.generativeai as genai
+from google.generativeai import protos
+from google.generativeai.types import content_types
+
+from ..metrics.registry import count_api_call, registry
+
+# 1枚の画像が消費するトークン数（Geminiの固定値）
+IMAGE_TOKENS = 258
+# 履歴に残すタスクのヒント（【…】）の最大文字数
+HINT_MAX_CHARS = 200
+# 画像を外したメッセージに残す目印
+IMAGE_PLACEHOLDER = "（スクリーンショットを添付）"
+SUMMARY_HEADER = "【これまでの会話の要約】"
+
+HINT_PATTERN = re.compile(r"【([^】]*)】")
+
+summary_model = genai.GenerativeModel(
+    model_name="gemini-2.0-flash-lite",
+    generation_config={"temperature": 0, "max_output_tokens": 1024},
+)
+
+summary_prompt = """あなたはAITuberとユーザーの会話を要約するAIです。
+これまでの要約と新しい会話ログを読み、話題・ユーザーについて分かったこと・約束や予定など、
+今後の会話に必要な情報だけを残した要約を{max_chars}文字以内の日本語で出力してください。
+出力は要約の本文のみにしてください。
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数の概算（APIを呼ばずに見積もる）
+    ASCIIは約4文字で1トークン、日本語などの非ASCII文字は1文字1トークンとして数える
+    """
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def content_tokens(content) -> int:
+    """メッセージ（Content）のトークン数の概算"""
+    tokens = 0
+    for part in content.parts:
+        if "inline_data" in part:
+            tokens += IMAGE_TOKENS
+        else:
+            tokens += estimate_tokens(part.text)
+    return tokens
+
+
+def content_text(content) -> str:
+    return "".join(part.text for part in content.parts if "text" in part)
+
+
+def compact_hint(text: str, max_chars: int = HINT_MAX_CHARS) -> str:
+    """天気予報やWikipediaの要約など、長いタスクのヒントを履歴用に切り詰める"""
+    def shorten(match):
+        body = match.group(1)
+        if len(body) <= max_chars:
+            return match.group(0)
+        return f"【{body[:max_chars]}…】"
+    return HINT_PATTERN.sub(shorten, text)
+
+
+def compact_user_message(content):
+    """送信済みのユーザーメッセージから画像を外し、長いヒントを切り詰める"""
+    parts = []
+    had_image = False
+    for part in content.parts:
+        if "inline_data" in part:
+            had_image = True
+        elif "text" in part:
+            parts.append(protos.Part(text=compact_hint(part.text)))
+    if had_image:
+        parts.append(protos.Part(text=IMAGE_PLACEHOLDER))
+    return protos.Content(role=content.role, parts=parts or [protos.Part(text=IMAGE_PLACEHOLDER)])
+
+
+def split_turns(messages: list) -> List[list]:
+    """履歴をターン（ユーザーのメッセージと、それに続くモデルの応答）ごとに分ける"""
+    turns: List[list] = []
+    for message in messages:
+        if message.role == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+@dataclass
+class HistoryStats:
+    """直近の送信時点の履歴の状態"""
+    messages: int = 0
+    turns: int = 0
+    estimated_tokens: int = 0
+    prompt_tokens: int = 0  # 直近の送信で実際に送ったトークン数（APIの応答から取得）
+    summarized_turns: int = 0
+
+
+class ChatHistoryManager:
+    """トークン予算付きのスライディングウィンドウと、ローリング要約による履歴管理"""
+
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: int = 8000,
+        min_turns: int = 4,
+        summary_max_chars: int = 400,
+        lock: Optional[threading.Lock] = None,
+    ):
+        """
+        Args:
+            system_prompt: 常に先頭に残すシステムプロンプト
+            token_budget: 履歴全体の推定トークン数の上限（0なら無制限。画像の除去とヒントの切り詰めのみ行う）
+            min_turns: 予算を超えても残す直近のターン数
+            summary_max_chars: ローリング要約の最大文字数
+            lock: 履歴を書き換える際の排他制御（投機実行の確定処理と共有する）
+        """
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.min_turns = min_turns
+        self.summary_max_chars = summary_max_chars
+        self.lock = lock or threading.Lock()
+        self.summary = ""
+        self.stats = HistoryStats()
+        self._summarizing = False
+        # 完成した要約と、それに畳み込んだ先頭からのターン数
+        self._ready: Optional[Tuple[str, int]] = None
+
+    def configure(self, token_budget: Optional[int] = None, min_turns: Optional[int] = None) -> None:
+        """予算の設定を変更する"""
+        if token_budget is not None:
+            self.token_budget = token_budget
+        if min_turns is not None:
+            self.min_turns = min_turns
+
+    def initial_history(self) -> list:
+        """start_chat に渡す初期履歴"""
+        return [self._head()]
+
+    def _head(self):
+        text = self.system_prompt
+        if self.summary:
+            text += f"\n\n{SUMMARY_HEADER}\n{self.summary}"
+        return content_types.to_content({"role": "user", "parts": [text]})
+
+    def after_turn(self, chat_session, response=None) -> HistoryStats:
+        """
+        送信後に履歴を整理する（画像の除去・ヒントの切り詰め・要約の反映・予算超過時の要約開始）
+
+        Args:
+            chat_session: 整理する ChatSession
+            response: 直近の送信の応答（実際に送ったトークン数の取得に使う）
+
+        Returns:
+            HistoryStats: 整理後の履歴の状態
+        """
+        with self.lock:
+            turns = split_turns(list(chat_session.history)[1:])
+            if turns and turns[-1][0].role == "user":
+                turns[-1][0] = compact_user_message(turns[-1][0])
+
+            if self._ready is not None:
+                self.summary, folded = self._ready
+                self._ready = None
+                turns = turns[folded:]
+                self.stats.summarized_turns += folded
+
+            head = self._head()
+            turn_tokens = [sum(content_tokens(message) for message in turn) for turn in turns]
+            total = content_tokens(head) + sum(turn_tokens)
+
+            if self.token_budget and total > self.token_budget and not self._summarizing:
+                fold = self._turns_to_fold(turn_tokens, total)
+                if fold:
+                    self._start_summary(turns[:fold])
+
+            chat_session.history = [head] + [message for turn in turns for message in turn]
+
+            self.stats.messages = len(chat_session.history)
+            self.stats.turns = len(turns)
+            self.stats.estimated_tokens = total
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None and usage.prompt_token_count:
+                self.stats.prompt_tokens = usage.prompt_token_count
+                registry.inc("prompt_tokens", usage.prompt_token_count, component="conversation")
+
+        registry.gauge("history_messages", self.stats.messages)
+        registry.gauge("history_estimated_tokens", self.stats.estimated_tokens)
+        print(f"[履歴] {self.stats.turns}ターン / 推定{self.stats.estimated_tokens}トークン / 送信{self.stats.prompt_tokens}トークン")
+        return self.stats
+
+    def _turns_to_fold(self, turn_tokens: List[int], total: int) -> int:
+        """予算の3/4に収まるまで、古い順に要約へ回すターン数（直近min_turnsは残す）"""
+        target = self.token_budget * 3 // 4
+        fold = 0
+        while total > target and len(turn_tokens) - fold > self.min_turns:
+            total -= turn_tokens[fold]
+            fold += 1
+        return fold
+
+    def _start_summary(self, turns: List[list]) -> None:
+        """古いターンの要約をバックグラウンドで作成（次のターンの応答を待たせない）"""
+        self._summarizing = True
+        previous = self.summary
+        log = "\n".join(
+            f"{'ユーザー' if message.role == 'user' else 'AITuber'}：{content_text(message)}"
+            for turn in turns for message in turn
+        )
+        threading.Thread(target=self._summarize, args=(previous, log, len(turns)), daemon=True).start()
+
+    def _summarize(self, previous: str, log: str, folded: int) -> None:
+        try:
+            count_api_call("history_summary")
+            response = summary_model.generate_content([
+                summary_prompt.format(max_chars=self.summary_max_chars),
+                f"これまでの要約：\n{previous or '（なし）'}\n\n新しい会話ログ：\n{log}",
+            ])
+            summary = response.text.strip()
+        except Exception as e:
+            # 要約できなくても履歴が際限なく伸びないよう、古いターンはそのまま捨てる
+            print(f"[履歴] 会話の要約に失敗したため古いターンを破棄します: {e}")
+            registry.inc("errors", stage="history_summary")
+            summary = previous
+        with self.lock:
+            self._ready = (summary, folded)
+            self._summarizing = False
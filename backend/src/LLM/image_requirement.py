@@ -1,15 +1,11 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
-import os
+
+from .classifier import InstructionClassifier
 
 # .envファイルをロード
 load_dotenv()
 
-# 環境変数を取得
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
 generation_config = {
     "temperature": 0, # 安定した出力に
     "top_p": 0.95,
@@ -68,17 +64,25 @@ prompt = """あなたは画像の必要性を判断するAIです。
     - 「やる気出ないなぁ」 → 不要
 """
 # print(prompt)
-chat_session = model.start_chat(history=[{"role":"user","parts":prompt}])
+# 指示文 + 今回の入力だけを送る（過去の判定結果を履歴に積み重ねない）
+classifier = InstructionClassifier(model, prompt, "image_requirement")
+
+
+def parse_image_requirement(response_text: str) -> bool:
+    """LLMの出力から画像の必要性を判定する"""
+    return "必要" in response_text
 
 
 def image_requirement_detector(user_input: str):
-    response = chat_session.send_message(user_input)
-    print(response.text)
-    if "必要" in response.text:
-        is_image_required = True
-    else:
-        is_image_required = False
-    return is_image_required
+    response_text = classifier.classify(user_input)
+    print(response_text)
+    return parse_image_requirement(response_text)
+
+
+async def image_requirement_detector_async(user_input: str):
+    response_text = await classifier.classify_async(user_input)
+    print(response_text)
+    return parse_image_requirement(response_text)
 
 
 if __name__ == "__main__":
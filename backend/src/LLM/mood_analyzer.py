@@ -1,16 +1,12 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
-import os
 import re
 
+from .classifier import InstructionClassifier
+
 # .envファイルをロード
 load_dotenv()
 
-# 環境変数を取得
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
 generation_config = {
     "temperature": 0, # 安定した出力に
     "top_p": 0.95,
@@ -63,7 +59,8 @@ AITuber：やったー！ずっと待ってたよー！楽しみ〜！
 """
 
 # print(base_prompt)
-chat_session = model.start_chat(history=[{"role":"user","parts":base_prompt}])
+# 指示文 + 今回の入力だけを送る（過去の判定結果を履歴に積み重ねない）
+classifier = InstructionClassifier(model, base_prompt, "mood_analyzer")
 
 
 def extract_mood_score(llm_output: str) -> int:
@@ -81,14 +78,22 @@ def extract_mood_score(llm_output: str) -> int:
     else:
         raise ValueError("0〜100の数値が見つかりませんでした")
 
-def mood_analyzer(user_input, llm_output):
-    prompt = f"""
+def build_mood_prompt(user_input, llm_output):
+    return f"""
     ユーザーの発言: {user_input}
     AITuberの発言: {llm_output}
     """
-    response = chat_session.send_message(prompt)
-    print(f"ご機嫌度：{response.text}")
-    mood_value = extract_mood_score(response.text)
+
+def mood_analyzer(user_input, llm_output):
+    response_text = classifier.classify(build_mood_prompt(user_input, llm_output))
+    print(f"ご機嫌度：{response_text}")
+    mood_value = extract_mood_score(response_text)
+    return mood_value
+
+async def mood_analyzer_async(user_input, llm_output):
+    response_text = await classifier.classify_async(build_mood_prompt(user_input, llm_output))
+    print(f"ご機嫌度：{response_text}")
+    mood_value = extract_mood_score(response_text)
     return mood_value
 
 
@@ -1,24 +1,25 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
+import asyncio
 import os
 import json
 import re
 
-from .tasks.check_wether import get_weather_by_day
-from .tasks.get_news import get_news
-from .tasks.spotify import play_track_by_name, pause_music, next_track
-from .tasks.wikipedia_search import search_and_display_wikipedia, get_wikipedia_summary
-from .tasks.paper_search import search_papers
+from .task_matcher import TaskMatcher
+from .classifier import InstructionClassifier
+from ..components.registry import components, ComponentUnavailable
+from ..metrics.registry import registry
+
+# タスクの実行に使うモジュール（wikipedia・openai などは任意の依存のため、初回利用時に読み込む）
+components.register("task_weather", f"{__package__}.tasks.check_wether", optional=True)
+components.register("task_news", f"{__package__}.tasks.get_news", optional=True)
+components.register("task_spotify", f"{__package__}.tasks.spotify", optional=True)
+components.register("task_wikipedia", f"{__package__}.tasks.wikipedia_search", optional=True)
+components.register("task_paper_search", f"{__package__}.tasks.paper_search", optional=True)
 
 # .envファイルをロード
 load_dotenv()
 
-# 環境変数を取得
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY環境変数が設定されていません")
-genai.configure(api_key=GEMINI_API_KEY)
-
 generation_config = {
     "temperature": 0, # 安定した出力に
     "top_p": 0.95,
@@ -63,19 +64,25 @@ def load_task_definitions(filepath):
         print(f"タスク定義ファイルの形式が正しくありません: {e}")
         return {}
 
-def build_prompt(task_definitions):
-    base_prompt = """あなたはタスク判定器です。以下のタスク定義に基づいて、与えられた入力がどのタスクに該当するかを判定してください。
-該当する場合は、タスク名と抽出された情報を JSON 形式で出力してください。
-
-【タスク定義】
-"""
+def format_task_definitions(task_definitions):
+    """タスク定義をプロンプト用のテキストに整形"""
+    text = ""
     for task in task_definitions:
         task_text = f"タスク名: {task['task_name']}\n"
         task_text += f"  条件: " + "、".join(f"「{cond}」" for cond in task["conditions"]) + "\n"
         task_text += f"  抽出項目:\n"
         for field in task["fields"]:
             task_text += f"    - {field}\n"
-        base_prompt += task_text + "\n"
+        text += task_text + "\n"
+    return text
+
+def build_prompt(task_definitions):
+    base_prompt = """あなたはタスク判定器です。以下のタスク定義に基づいて、与えられた入力がどのタスクに該当するかを判定してください。
+該当する場合は、タスク名と抽出された情報を JSON 形式で出力してください。
+
+【タスク定義】
+"""
+    base_prompt += format_task_definitions(task_definitions)
 
     base_prompt += """
     【入力】
@@ -98,11 +105,15 @@ def build_prompt(task_definitions):
     """
     return base_prompt
 
-task_definitions = load_task_definitions("src/LLM/task_definitions.json")
+# 起動時のカレントディレクトリ（リポジトリのルート / backend）に依存しないよう、このファイルからの相対パスで読み込む
+task_definitions = load_task_definitions(os.path.join(os.path.dirname(__file__), "task_definitions.json"))
 prompt = build_prompt(task_definitions)
+# 明確な一致・不一致をAPIを呼ばずに判定するローカル判定器（起動時に構築）
+task_matcher = TaskMatcher(task_definitions)
 # print(prompt)
 
-chat_session = model.start_chat(history=[{"role":"user","parts":prompt}])
+# 指示文 + 今回の入力だけを送る（過去の判定結果を履歴に積み重ねない）
+classifier = InstructionClassifier(model, prompt, "task_classifier")
 
 def extract_json_from_text(text):
     try:
@@ -116,14 +127,27 @@ def extract_json_from_text(text):
     except json.JSONDecodeError as e:
         raise ValueError(f"JSONパースエラー: {e}")
 
-def process_task_response(res_text, timer_callback=None):
+def process_task_response(res_text, timer_callback=None, on_timer_set=None):
     # 雑談用LLMが回答できるようにboolとテキスト(hint)を返す
+    try:
+        result = extract_json_from_text(res_text)
+    except ValueError as e:
+        print("→ JSONのパースに失敗しました。")
+        print(e)
+        print("元の出力\n", res_text)
+        return False, "JSONパースエラーが発生しました"
+
+    return process_task_result(result, timer_callback, on_timer_set)
+
+def process_task_result(result, timer_callback=None, on_timer_set=None):
+    """
+    判定結果（dict）に応じてタスクを実行し、(is_matched, hint) を返す
+    on_timer_set はタイマーをセットした時点で分数を渡して呼ぶ（終了のお知らせを先に生成しておくため）
+    """
     is_matched = False
     hint = ""  # デフォルト値を初期化
     
     try:
-        result = extract_json_from_text(res_text)
-
         if result.get("status") == "matched":
             task_name = result.get("task_name")
             is_matched = True
@@ -157,6 +181,8 @@ def process_task_response(res_text, timer_callback=None):
 
                 timer = threading.Timer(seconds, timer_finished, args=[minutes_float])
                 timer.start()
+                if on_timer_set:
+                    on_timer_set(minutes_float)
                 print(f"{minutes}分のタイマーを受け付けました。")
                 hint = f"あなたは今から{minutes}分のタイマーをセットします。こちらが指示するまでタイマーは終了させないでください。"
 
@@ -166,7 +192,7 @@ def process_task_response(res_text, timer_callback=None):
                 date = fields.get("対象日")
                 place = fields.get("対象地域")
                 print(f"{date}の{place}の天気を取得します。")
-                hint = get_weather_by_day(place, date)
+                hint = components.get("task_weather").get_weather_by_day(place, date)
 
             # ニュース記事の取得
             elif task_name == "get_news":
@@ -174,7 +200,7 @@ def process_task_response(res_text, timer_callback=None):
                 country = fields.get("country")
                 category = fields.get("category")
                 print(f"{country}の{category}に関するニュース記事を取得します。")
-                hint = get_news(country, category)
+                hint = components.get("task_news").get_news(country, category)
 
             # 曲名から再生指示
             elif task_name == "spotify_play_music":
@@ -183,29 +209,30 @@ def process_task_response(res_text, timer_callback=None):
                 track = fields[0]
 
                 print(f"「{track}」を再生します。")
-                play_track_by_name(track)
+                components.get("task_spotify").play_track_by_name(track)
                 hint = f"{track}という曲を再生することをお知らせしてください。"
 
             # 再生中の音楽を一時停止
             elif task_name == "spotify_pause_music":
                 print("Spotifyの音楽を停止します。")
-                pause_music()
+                components.get("task_spotify").pause_music()
                 hint = "再生中の音楽を停止したことをお知らせしてください。"
 
             # 次の曲を再生（挙動怪しい、、、）
             elif task_name == "spotify_next_track":
                 print("次の曲を再生します。")
-                next_track()
+                components.get("task_spotify").next_track()
                 hint = "次の曲を再生することをお知らせしてください。"
 
             # Wikipedia検索
             elif task_name == "wikipedia_search":
                 fields = result.get("fields")
                 query = fields[0]
-                success, url = search_and_display_wikipedia(query)
+                wikipedia_search = components.get("task_wikipedia")
+                success, url = wikipedia_search.search_and_display_wikipedia(query)
                 if success:
                     print(f"URL: {url}")
-                    summary_success, summary = get_wikipedia_summary(query)
+                    summary_success, summary = wikipedia_search.get_wikipedia_summary(query)
                     if summary_success:
                         print(f"要約:\n{summary}")
                         hint = summary # 要約をそのままhintとして渡す
@@ -220,7 +247,7 @@ def process_task_response(res_text, timer_callback=None):
             elif task_name == "paper_search":
                 fields = result.get("fields")
                 keyword = fields[0]
-                summary = search_papers(keyword)
+                summary = components.get("task_paper_search").search_papers(keyword)
                 hint = f"以下はあなたが論文検索で得た要約文です。\n{summary}\nあなたはこの論文について解説します。\n"
 
             else:
@@ -232,10 +259,14 @@ def process_task_response(res_text, timer_callback=None):
             print("タスクには該当しませんでした。")
             return False, ""
 
+    except ComponentUnavailable as e:
+        print(f"→ {e}")
+        is_matched = True
+        hint = "この機能は今の環境では使えないことをお知らせしてください。"
     except ValueError as e:
-        print("→ JSONのパースに失敗しました。")
+        print("→ タスクの抽出項目が不正です。")
         print(e)
-        print("元の出力\n", res_text)
+        print("判定結果\n", result)
         is_matched = False
         hint = "JSONパースエラーが発生しました"
     except Exception as e:
@@ -246,10 +277,33 @@ def process_task_response(res_text, timer_callback=None):
 
     return is_matched, hint
 
-def task_classifier(user_input: str, timer_callback=None):
-    response = chat_session.send_message(user_input)
-    print(response.text)
-    is_task_matched, hint = process_task_response(response.text, timer_callback)
+def match_locally(user_input: str):
+    """ローカル判定器で判定できればprocess_task_resultに渡す結果を、曖昧ならNoneを返す"""
+    result = task_matcher.match(user_input)
+    registry.inc("local_task_match", result=result.status)
+    return result.to_task_result()
+
+def task_classifier(user_input: str, timer_callback=None, use_local_matcher=False, on_timer_set=None):
+    if use_local_matcher:
+        local_result = match_locally(user_input)
+        if local_result is not None:
+            return process_task_result(local_result, timer_callback, on_timer_set)
+
+    response_text = classifier.classify(user_input)
+    print(response_text)
+    is_task_matched, hint = process_task_response(response_text, timer_callback, on_timer_set)
+    return is_task_matched, hint
+
+async def task_classifier_async(user_input: str, timer_callback=None, use_local_matcher=False, on_timer_set=None):
+    if use_local_matcher:
+        local_result = match_locally(user_input)
+        if local_result is not None:
+            return await asyncio.to_thread(process_task_result, local_result, timer_callback, on_timer_set)
+
+    response_text = await classifier.classify_async(user_input)
+    print(response_text)
+    # タスク実行（天気取得やSpotify操作など）はブロッキングなのでスレッドで実行
+    is_task_matched, hint = await asyncio.to_thread(process_task_response, response_text, timer_callback, on_timer_set)
     return is_task_matched, hint
 
 
@@ -0,0 +1,212 @@
+"""
+ローカルのタスク判定器
+task_definitions.json の conditions（と keywords）から文字n-gramの索引を起動時に構築し、
+明確な一致・明確な不一致だけをAPIを呼ばずに判定する。曖昧な入力はLLMに任せる
+不一致と判定するのは、どの条件文・キーワードとも文字bigramを共有せず、時間・固有名詞・質問の形も含まない入力だけ
+（タスクの依頼を取りこぼすとタスクが黙って実行されないため、迷ったらLLMに任せる）
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+# （曲名）や ⚪︎分 のようなプレースホルダ（NFKC正規化後の表記）
+PLACEHOLDER_PATTERN = re.compile(r"\([^)]*\)|[⚪○〇◯]︎?")
+# 判定に使わない記号・空白
+IGNORED_CHARS_PATTERN = re.compile(r"[\s?!。、,.・~〜「」『』\"']")
+# タスクの依頼でありうるので不一致にしない表現（NFKC正規化後の入力で調べる）
+TASK_HINT_PATTERNS = [
+    re.compile(r"[0-9一二三四五六七八九十百半]+\s*(分|秒|時間)"),  # 3分計って・十秒
+    re.compile(r"[ァ-ヺー]{2,}"),                            # カタカナの固有名詞（曲名・アーティスト名・用語）
+    re.compile(r"[A-Za-z]{2,}"),                             # ラテン文字の固有名詞
+    re.compile(r"何|って|\?"),                               # 質問の形（〜って何？）
+]
+
+
+def normalize(text: str) -> str:
+    """全角・半角や記号の揺れを吸収した比較用の文字列に変換"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return IGNORED_CHARS_PATTERN.sub("", text)
+
+
+def char_ngrams(text: str, n: int = 2) -> Set[str]:
+    """文字n-gramの集合（n文字未満の場合は文字列そのもの）"""
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+@dataclass
+class _Condition:
+    task_name: str
+    text: str                # プレースホルダを除いた正規化済みの条件文
+    grams: Set[str]
+    has_placeholder: bool
+
+
+@dataclass
+class LocalMatch:
+    """ローカル判定の結果"""
+    status: str              # "matched" / "no_match" / "ambiguous"
+    task_name: Optional[str] = None
+    score: float = 0.0
+
+    def to_task_result(self) -> Optional[dict]:
+        """task_classifier.process_task_result に渡せる形式に変換（曖昧な場合はNone）"""
+        if self.status == "matched":
+            return {"status": "matched", "task_name": self.task_name, "fields": []}
+        if self.status == "no_match":
+            return {"status": "no_match"}
+        return None
+
+
+@dataclass
+class MatcherStats:
+    """ローカル判定の集計"""
+    lookups: int = 0
+    matched: int = 0
+    no_match: int = 0
+    ambiguous: int = 0
+    total_seconds: float = 0.0
+    by_task: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def hits(self) -> int:
+        """APIを呼ばずに判定できた回数"""
+        return self.matched + self.no_match
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.ambiguous,
+            "matched": self.matched,
+            "no_match": self.no_match,
+            "hit_rate": self.hit_rate,
+            "avg_lookup_us": self.total_seconds / self.lookups * 1e6 if self.lookups else 0.0,
+            "by_task": dict(self.by_task),
+        }
+
+
+class TaskMatcher:
+    """conditions から構築する文字n-gram索引によるタスク判定器"""
+
+    def __init__(
+        self,
+        task_definitions: List[dict],
+        n: int = 2,
+        match_threshold: float = 0.85,
+        coverage_threshold: float = 0.5,
+    ):
+        """
+        Args:
+            task_definitions: task_definitions.json の内容
+            n: n-gramの文字数
+            match_threshold: 条件文のn-gramが入力に含まれる割合がこれ以上なら一致候補
+            coverage_threshold: 入力のn-gramが条件文で説明される割合がこれ以上なら一致候補
+        """
+        self.n = n
+        self.match_threshold = match_threshold
+        self.coverage_threshold = coverage_threshold
+        self.stats = MatcherStats()
+        self._lock = threading.Lock()
+
+        self._conditions: List[_Condition] = []
+        self._exact: Dict[str, Set[str]] = {}
+        self._keywords: Set[str] = set()
+        self._known_grams: Set[str] = set()  # 条件文・キーワードのいずれかに含まれるn-gram
+        self._tasks_with_fields: Set[str] = set()
+
+        for task in task_definitions:
+            task_name = task["task_name"]
+            if task.get("fields"):
+                self._tasks_with_fields.add(task_name)
+            for keyword in task.get("keywords", []):
+                self._keywords.add(normalize(keyword))
+                self._known_grams |= char_ngrams(normalize(keyword), n)
+            for condition in task.get("conditions", []):
+                has_placeholder = bool(PLACEHOLDER_PATTERN.search(unicodedata.normalize("NFKC", condition)))
+                text = normalize(PLACEHOLDER_PATTERN.sub("", unicodedata.normalize("NFKC", condition)))
+                if not text:
+                    continue
+                self._conditions.append(_Condition(task_name, text, char_ngrams(text, n), has_placeholder))
+                self._known_grams |= self._conditions[-1].grams
+                if not has_placeholder:
+                    self._exact.setdefault(text, set()).add(task_name)
+
+    def _classify(self, text: str) -> LocalMatch:
+        normalized = normalize(text)
+        if not normalized:
+            return LocalMatch("no_match")
+
+        # 条件文と完全一致（複数タスクに共通する条件文は曖昧扱い）
+        exact_tasks = self._exact.get(normalized)
+        if exact_tasks:
+            if len(exact_tasks) == 1:
+                task_name = next(iter(exact_tasks))
+                if task_name not in self._tasks_with_fields:
+                    return LocalMatch("matched", task_name, 1.0)
+            return LocalMatch("ambiguous", None, 1.0)
+
+        grams = char_ngrams(normalized, self.n)
+        best: Dict[str, float] = {}
+        best_coverage: Dict[str, float] = {}
+        for condition in self._conditions:
+            shared = len(condition.grams & grams)
+            if not shared:
+                continue
+            containment = shared / len(condition.grams)
+            if containment > best.get(condition.task_name, 0.0):
+                best[condition.task_name] = containment
+                best_coverage[condition.task_name] = shared / len(grams)
+
+        top_score = max(best.values(), default=0.0)
+        if self._clearly_unrelated(text, grams):
+            return LocalMatch("no_match", None, top_score)
+
+        candidates = [name for name, score in best.items() if score >= self.match_threshold]
+        if len(candidates) == 1:
+            task_name = candidates[0]
+            if task_name not in self._tasks_with_fields and best_coverage[task_name] >= self.coverage_threshold:
+                return LocalMatch("matched", task_name, best[task_name])
+
+        return LocalMatch("ambiguous", None, top_score)
+
+    def _clearly_unrelated(self, text: str, grams: Set[str]) -> bool:
+        """どの条件文・キーワードともn-gramを共有せず、タスクの依頼でありうる表現も含まない"""
+        if grams & self._known_grams:
+            return False
+        text = unicodedata.normalize("NFKC", text)
+        return not any(pattern.search(text) for pattern in TASK_HINT_PATTERNS)
+
+    def match(self, text: str) -> LocalMatch:
+        """
+        入力をローカルで判定する
+
+        Returns:
+            LocalMatch: matched（抽出項目のないタスクに明確に一致）/ no_match（明確に不一致）/ ambiguous（LLMに任せる）
+        """
+        start = time.perf_counter()
+        result = self._classify(text)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.stats.lookups += 1
+            self.stats.total_seconds += elapsed
+            if result.status == "matched":
+                self.stats.matched += 1
+                self.stats.by_task[result.task_name] = self.stats.by_task.get(result.task_name, 0) + 1
+            elif result.status == "no_match":
+                self.stats.no_match += 1
+            else:
+                self.stats.ambiguous += 1
+
+        print(f"[ローカル判定] {result.status} {result.task_name or ''} (score {result.score:.2f}, {elapsed * 1e6:.0f}µs)")
+        return result
@@ -1,15 +1,11 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
-import os
+
+from .classifier import InstructionClassifier
 
 # .envファイルをロード
 load_dotenv()
 
-# 環境変数を取得
-GEMINI_API_KEY = os.getenv("GEMINI_TRANSLATE_API_KEY")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
 generation_config = {
     "temperature": 1,
     "top_p": 0.95,
@@ -43,15 +39,20 @@ model = genai.GenerativeModel(
     safety_settings=safety_settings
   )
 
-chat_session = model.start_chat(history=[{"role":"user","parts":[
+# 指示文 + 今回の入力だけを送る（過去の翻訳を履歴に積み重ねない）
+classifier = InstructionClassifier(
+    model,
     "あなたは翻訳機です。"
     "与えられたテキストを英語に翻訳してください。"
-    "回答は翻訳結果のみにしてください。"
-    ]}])
+    "回答は翻訳結果のみにしてください。",
+    "translator",
+)
 
 def translator(user_input: str):
-    response = chat_session.send_message(user_input)
-    return response.text
+    return classifier.classify(user_input)
+
+async def translator_async(user_input: str):
+    return await classifier.classify_async(user_input)
 
 if __name__ == "__main__":
     user_input = input("テキストを入力： ")
@@ -0,0 +1,193 @@
+"""
+ターン分析器（統合版）
+タスク判定・画像必要性判定（応答前）と、感情分析・ご機嫌度診断・翻訳（応答後）を
+それぞれ1回のGemini呼び出しでまとめて行い、構造化JSONで受け取る
+"""
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+import json
+
+from .emotion_analyzer import EMOTION_LABELS
+from .task_classifier import task_definitions, format_task_definitions, extract_json_from_text
+from ..metrics.registry import count_api_call
+
+# .envファイルをロード
+load_dotenv()
+
+generation_config = {
+    "temperature": 0, # 安定した出力に
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_mime_type": "application/json",
+    }
+
+safety_settings = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_NONE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_NONE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_NONE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_NONE"
+    }
+]
+
+model = genai.GenerativeModel(
+    model_name="gemini-2.0-flash-lite",
+    generation_config=generation_config,
+    safety_settings=safety_settings
+    )
+
+TASK_NAMES = {task["task_name"] for task in task_definitions}
+
+input_prompt = """あなたはAITuberの入力分析器です。ユーザーの発言について、次の2つを同時に判定してください。
+
+1. タスク判定: 以下のタスク定義のどれに該当するか
+【タスク定義】
+""" + format_task_definitions(task_definitions) + """
+2. 画像必要性判定: 発言が「現在の画面や視覚的な要素」に依存しているか
+- 「これ」「この」「ここ」など指示語の対象が文脈上不明なとき、UIの操作対象を指していそうなとき、見た目に関する発言のときは true
+- 一般的な雑談・挨拶・質問など、画面を見なくても返答できるときは false
+
+【出力形式】
+以下のJSONのみを出力してください。
+タスクに該当する場合:
+{"task": {"status": "matched", "task_name": タスク名, "fields": 抽出項目}, "image_required": true または false}
+タスクに該当しない場合:
+{"task": {"status": "no_match"}, "image_required": true または false}
+"""
+
+output_prompt = """あなたはAITuberの応答分析器です。ユーザーとAITuberの発言について、次の3つを同時に出力してください。
+
+1. emotion: AITuberの発言の感情を、次のラベルから1つだけ選ぶ
+   """ + ", ".join(EMOTION_LABELS) + """
+2. mood: 会話の内容・口調・ユーザーへの反応から判断したAITuberの「ご機嫌度」を0〜100の整数で
+   （0は非常に不機嫌、100はとても機嫌が良い。曖昧な場合は50を基準に推定）
+3. translation: AITuberの発言の英語訳
+
+【出力形式】
+以下のJSONのみを出力してください。
+{"emotion": ラベル, "mood": 整数, "translation": 英訳}
+"""
+
+
+def parse_json_response(text: str) -> dict:
+    """JSONモードの出力をdictに変換（前後に余計な文字があれば抽出して再試行）"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return extract_json_from_text(text)
+
+
+def validate_input_analysis(data) -> dict:
+    """
+    応答前分析の出力を検証する
+
+    Returns:
+        dict: {"task": {...}, "image_required": bool}
+    Raises:
+        ValueError: スキーマに合わない場合
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"応答前分析の出力がオブジェクトではありません: {data!r}")
+
+    task = data.get("task")
+    if not isinstance(task, dict):
+        raise ValueError(f"task がオブジェクトではありません: {task!r}")
+
+    status = task.get("status")
+    if status == "matched":
+        if task.get("task_name") not in TASK_NAMES:
+            raise ValueError(f"未知のタスク名です: {task.get('task_name')!r}")
+        if not isinstance(task.get("fields", []), (dict, list)):
+            raise ValueError(f"fields の形式が不正です: {task.get('fields')!r}")
+    elif status != "no_match":
+        raise ValueError(f"status が不正です: {status!r}")
+
+    if not isinstance(data.get("image_required"), bool):
+        raise ValueError(f"image_required が真偽値ではありません: {data.get('image_required')!r}")
+
+    return data
+
+
+def validate_output_analysis(data) -> dict:
+    """
+    応答後分析の出力を検証する
+
+    Returns:
+        dict: {"emotion": str, "mood": int, "translation": str}
+    Raises:
+        ValueError: スキーマに合わない場合
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"応答後分析の出力がオブジェクトではありません: {data!r}")
+
+    if data.get("emotion") not in EMOTION_LABELS:
+        raise ValueError(f"未知の感情ラベルです: {data.get('emotion')!r}")
+
+    mood = data.get("mood")
+    if isinstance(mood, bool) or not isinstance(mood, (int, float)) or not 0 <= mood <= 100:
+        raise ValueError(f"mood が0〜100の数値ではありません: {mood!r}")
+    data["mood"] = int(mood)
+
+    if not isinstance(data.get("translation"), str):
+        raise ValueError(f"translation が文字列ではありません: {data.get('translation')!r}")
+
+    return data
+
+
+def build_output_request(user_input: str, llm_output: str) -> str:
+    return f"""
+    ユーザーの発言: {user_input}
+    AITuberの発言: {llm_output}
+    """
+
+
+def analyze_input(user_input: str) -> dict:
+    """応答前分析（タスク判定・画像必要性判定）を1回の呼び出しで行う"""
+    count_api_call("turn_analyzer")
+    response = model.generate_content([input_prompt, user_input])
+    print(response.text)
+    return validate_input_analysis(parse_json_response(response.text))
+
+
+def analyze_output(user_input: str, llm_output: str) -> dict:
+    """応答後分析（感情分析・ご機嫌度診断・翻訳）を1回の呼び出しで行う"""
+    count_api_call("turn_analyzer")
+    response = model.generate_content([output_prompt, build_output_request(user_input, llm_output)])
+    print(response.text)
+    return validate_output_analysis(parse_json_response(response.text))
+
+
+async def analyze_input_async(user_input: str) -> dict:
+    count_api_call("turn_analyzer")
+    response = await model.generate_content_async([input_prompt, user_input])
+    print(response.text)
+    return validate_input_analysis(parse_json_response(response.text))
+
+
+async def analyze_output_async(user_input: str, llm_output: str) -> dict:
+    count_api_call("turn_analyzer")
+    response = await model.generate_content_async([output_prompt, build_output_request(user_input, llm_output)])
+    print(response.text)
+    return validate_output_analysis(parse_json_response(response.text))
+
+
+if __name__ == "__main__":
+    while True:
+        user_input = input("ユーザーの発言： ")
+        if user_input.lower() == 'q':
+            break
+        print(analyze_input(user_input))
+        llm_output = input("AITuberの発言： ")
+        print(analyze_output(user_input, llm_output))
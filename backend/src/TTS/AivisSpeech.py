@@ -1,44 +1,170 @@
+import asyncio
 import io
 import json
 import soundfile
 import requests
 import time
-import re
+from typing import Optional, Tuple, Union
+
+from .audio_cache import cache_key, tts_cache
+from .readings import reading_dictionary
+from .wav import WavInfo, apply_gain_to_wav, parse_wav_header
+
+AIVIS_URL = "http://127.0.0.1:10101"
 
 class AivisAdapter:
-    def __init__(self):
+    def __init__(self, url: str = AIVIS_URL, session: Optional[requests.Session] = None, timeout=(3.0, 60.0)):
         # APIサーバーのエンドポイントURL
-        self.URL = "http://127.0.0.1:10101"
+        self.URL = url
+        # 接続を使い回す場合は呼び出し側のセッションを使う
+        self.session = session or requests
+        self.timeout = timeout
         # 話者ID (話させたい音声モデルidに変更してください)
         self.speaker = 888753760 # ノーマル
         # self.speaker = 706073888 # white
+        # 音量の倍率（1.0ならエンジンの出力をそのまま保存する）
+        self.volume_gain = 1.0
+
+    def synthesize(self, text: str, use_cache: bool = True, timeout=None) -> bytes:
+        """
+        音声を合成し、エンジンが返したWAVをそのまま返す（キャッシュ済みならエンジンを呼ばない）
+
+        Args:
+            text: 読み上げるテキスト
+            use_cache: 音声キャッシュを使うか
+            timeout: リクエストのタイムアウト（接続, 読み込み）。省略時は self.timeout
+
+        Raises:
+            requests.exceptions.RequestException: エンジンに接続できない・エラーが返った場合
+        """
+        key = self._cache_key(text)
+        content = tts_cache.get(key) if use_cache else None
+        if content is None:
+            timeout = timeout or self.timeout
+            params = {"text": text, "speaker": self.speaker}
+            query_response = self.session.post(f"{self.URL}/audio_query", params=params, timeout=timeout)
+            query_response.raise_for_status()
+
+            audio_response = self.session.post(
+                f"{self.URL}/synthesis",
+                params={"speaker": self.speaker},
+                headers={"accept": "audio/wav", "Content-Type": "application/json"},
+                data=query_response.content,
+                timeout=timeout,
+            )
+            audio_response.raise_for_status()
+            content = audio_response.content
+            tts_cache.put(key, content)
+        return content
+
+    def save_voice(self, text: str, output_filename: str = "voice.wav") -> float:
+        """音声を合成してWAVファイルに保存し、再生時間（秒）を返す"""
+        return self._write_wav(self.synthesize(text), output_filename)
+
+    async def synthesize_async(self, session, text: str, use_cache: bool = True, timeout=None) -> bytes:
+        """
+        aiohttpのセッションで音声を合成し、エンジンが返したWAVを返す（timeout は aiohttp.ClientTimeout）
+
+        Raises:
+            aiohttp.ClientError: エンジンに接続できない・エラーが返った場合
+        """
+        key = self._cache_key(text)
+        content = await asyncio.to_thread(tts_cache.get, key) if use_cache else None
+        if content is None:
+            params = {"text": text, "speaker": str(self.speaker)}
+            # 省略時はセッションのタイムアウトを使う（None を渡すとタイムアウトなしになる）
+            options = {"timeout": timeout} if timeout else {}
+            async with session.post(f"{self.URL}/audio_query", params=params, **options) as query_response:
+                query_response.raise_for_status()
+                query_data = await query_response.json()
+
+            async with session.post(
+                f"{self.URL}/synthesis",
+                params={"speaker": str(self.speaker)},
+                headers={"accept": "audio/wav", "Content-Type": "application/json"},
+                data=json.dumps(query_data),
+                **options,
+            ) as audio_response:
+                audio_response.raise_for_status()
+                content = await audio_response.read()
+            await asyncio.to_thread(tts_cache.put, key, content)
+        return content
 
-    def save_voice(self, text: str, output_filename: str = "voice.wav"):
-        params = {"text": text, "speaker": self.speaker}
-        query_response = requests.post(f"{self.URL}/audio_query", params=params).json()
+    async def save_voice_async(self, session, text: str, output_filename: str = "voice.wav") -> float:
+        """aiohttpのセッションで音声を合成して保存し、再生時間（秒）を返す"""
+        content = await self.synthesize_async(session, text)
+        # デコードとファイル書き込みはイベントループを止めないようスレッドで実行
+        return await asyncio.to_thread(self._write_wav, content, output_filename)
 
-        audio_response = requests.post(
-            f"{self.URL}/synthesis",
-            params={"speaker": self.speaker},
-            headers={"accept": "audio/wav", "Content-Type": "application/json"},
-            data=json.dumps(query_response),
-        )
+    def to_memory(self, content: bytes) -> Tuple[Union[bytes, memoryview], WavInfo]:
+        """
+        ファイルに書かずにVRMサーバーから配信するため、音量を調整したWAVとヘッダーの内容を返す
 
-        with io.BytesIO(audio_response.content) as audio_stream:
+        Raises:
+            ValueError: 16bitのPCMではない場合
+        """
+        if self.volume_gain != 1.0:
+            buffer = bytearray(content)
+            return memoryview(buffer), apply_gain_to_wav(buffer, self.volume_gain)
+        info = parse_wav_header(content)
+        if not info.is_pcm16:
+            raise ValueError(f"16bitのPCMのみ対応しています（format={info.audio_format}, bits={info.bits_per_sample}）")
+        return content, info
+
+    def _cache_key(self, text: str) -> str:
+        # audio_query の既定値のまま合成するので、韻律パラメータはキーに含めない
+        return cache_key(text, "aivis", self.speaker)
+
+    def _write_wav(self, content: bytes, output_filename: str) -> float:
+        """
+        エンジンが返したWAVをデコードせずにそのまま書き出し、再生時間（秒）を返す
+        音量を変える場合も16bitのPCMをその場で書き換えるだけで、float配列への変換と再エンコードはしない
+        """
+        try:
+            if self.volume_gain != 1.0:
+                buffer = bytearray(content)
+                info = apply_gain_to_wav(buffer, self.volume_gain)
+                content = memoryview(buffer)
+            else:
+                info = parse_wav_header(content)
+        except ValueError:
+            # ヘッダーが読めない・16bit以外の形式の場合だけデコードして書き直す
+            return self._rewrite_wav(content, output_filename)
+        with open(output_filename, "wb") as f:
+            f.write(content)
+        return info.duration
+
+    def _rewrite_wav(self, content: bytes, output_filename: str) -> float:
+        with io.BytesIO(content) as audio_stream:
             data, rate = soundfile.read(audio_stream)
-            soundfile.write(output_filename, data, rate)
+        if self.volume_gain != 1.0:
+            data = (data * self.volume_gain).clip(-1.0, 1.0)
+        soundfile.write(output_filename, data, rate)
+        return len(data) / rate
 
 def hiraganize(text):
-    """特別な読み方をして欲しいものを登録して平仮名に変換"""
-    text = re.sub(r'桜夜（さよ）', 'さよ', text)
-    text = re.sub(r'桜夜', 'さよ', text)
-    text = re.sub(r'TK256', 'ティーケー', text) #カタカナなのは目を瞑ってください
-    return text
+    """特別な読み方をして欲しいものを平仮名に変換（登録はキャラクターの読み方の辞書 *_readings.tsv で行う）"""
+    return reading_dictionary.apply(text)
+
+def save_wavefile(text, output_filename="backend/src/voice/voice.wav"):
+    adapter = AivisAdapter()
+    text_replaced = hiraganize(text)
+    return adapter.save_voice(text_replaced, output_filename=output_filename)
 
-def save_wavefile(text):
+async def save_wavefile_async(session, text, output_filename="backend/src/voice/voice.wav"):
     adapter = AivisAdapter()
     text_replaced = hiraganize(text)
-    adapter.save_voice(text_replaced, output_filename="backend/src/voice/voice.wav")
+    return await adapter.save_voice_async(session, text_replaced, output_filename=output_filename)
+
+def synthesize_wav(text):
+    """音声を合成し、ファイルに書かずに (WAV, ヘッダーの内容) を返す"""
+    adapter = AivisAdapter()
+    return adapter.to_memory(adapter.synthesize(hiraganize(text)))
+
+async def synthesize_wav_async(session, text):
+    adapter = AivisAdapter()
+    content = await adapter.synthesize_async(session, hiraganize(text))
+    return await asyncio.to_thread(adapter.to_memory, content)
 
 
 def main():
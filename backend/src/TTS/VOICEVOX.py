@@ -1,105 +1,343 @@
+import io
 import re
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import time
-import numpy as np
 import wave
-import simpleaudio
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from .audio_cache import cache_key, tts_cache
+from .lipsync import MoraTiming, mora_timings
+from .query_cache import apply_prosody, query_cache
+from .retry import CircuitBreaker, Deadline, DeadlineExceeded, retry_policy
+from .wav import WavInfo, apply_gain, build_wav_header
+from ..metrics.registry import TurnContextExecutor, registry
+
+VOICEVOX_URL = "http://localhost:50021"
+SPEED_SCALE = 1.2  # 再生速度
+# audio_query の結果に上書きする韻律のパラメータ
+PROSODY = {"speedScale": SPEED_SCALE}
+# 同時に合成する文の数（VOICEVOXのCPU版は並列数を上げすぎるとかえって遅くなる）
+MAX_WORKERS = 3
 
 #---音声合成---##################################################
-def audio_query(text, speaker, max_retry):
-    for query_i in range(max_retry):
+def _post(stage, path, max_retry, session, url, deadline=None, breaker=None, **kwargs):
+    """
+    再試行付きのPOST
+    失敗するたびにジッター付きの指数バックオフで待ち、締め切り（発話単位）を過ぎる前にあきらめる。
+    ブレーカーが開いていればリクエストせずにすぐ失敗する
+    """
+    deadline = deadline or Deadline(retry_policy.deadline)
+    for attempt in range(1, max_retry + 1):
+        if breaker:
+            breaker.check()
         try:
-            # `params=` を使うのが正しい
-            r = requests.post(
-                "http://localhost:50021/audio_query",
-                params={"text": text, "speaker": speaker},  # ← ここを `params=` に修正
-                headers={"Content-Type": "application/json"},  
-                timeout=(10.0, 300.0)
-            )
+            r = session.post(f"{url}{path}", timeout=deadline.timeout(retry_policy), **kwargs)
 
             if r.status_code == 200:
-                query_data = r.json()
-                query_data["speedScale"] = 1.2  # 再生速度を変更
-                return query_data
+                if breaker:
+                    breaker.record_success()
+                return r
 
-            print(f"audio_query エラー: {r.status_code} - {r.text}")
+            print(f"{stage} エラー: {r.status_code} - {r.text}")
+            if 400 <= r.status_code < 500:
+                # 入力の誤りは再試行しても結果が変わらない
+                raise ConnectionError(f"{stage} が {r.status_code} を返しました")
 
         except requests.exceptions.RequestException as e:
             print(f"リクエストエラー: {e}")
 
-        time.sleep(1)
+        if breaker:
+            breaker.record_failure()
+        if attempt == max_retry:
+            break
+        delay = retry_policy.backoff(attempt)
+        if delay >= deadline.remaining():
+            raise DeadlineExceeded(f"音声合成の締め切りまでに {stage} が成功しませんでした")
+        registry.inc("retries", stage=f"voicevox_{stage}")
+        time.sleep(delay)
 
-    raise ConnectionError(f"リトライ回数が上限に到達しました。 audio_query : {text[:30]}")
+    raise ConnectionError(f"リトライ回数が上限に到達しました。 {stage}")
 
-def synthesis(speaker, query_data, max_retry):
-    for synth_i in range(max_retry):
-        try:
-            r = requests.post(
-                "http://localhost:50021/synthesis",
-                params={"speaker": speaker},  # ここは `params=` でOK
-                json=query_data,  # `json=` を使う
-                headers={"Content-Type": "application/json"},
-                timeout=(10.0, 300.0)
+def audio_query(text, speaker, max_retry, session=None, url=VOICEVOX_URL, prosody=None, deadline=None, breaker=None):
+    # 同じテキスト・話者の結果はメモから返し、韻律の変更だけを手元で適用する
+    prosody = PROSODY if prosody is None else prosody
+    query_data = query_cache.get(text, speaker, prosody)
+    if query_data is not None:
+        return query_data
+
+    r = _post(
+        "audio_query", "/audio_query", max_retry, session or _default_engine().session, url, deadline, breaker,
+        params={"text": text, "speaker": speaker},
+        headers={"Content-Type": "application/json"},
+    )
+    query_data = r.json()
+    query_cache.put(text, speaker, query_data)
+    return apply_prosody(query_data, prosody)  # 再生速度などを変更
+
+def synthesis(speaker, query_data, max_retry, session=None, url=VOICEVOX_URL, deadline=None, breaker=None):
+    r = _post(
+        "synthesis", "/synthesis", max_retry, session or _default_engine().session, url, deadline, breaker,
+        params={"speaker": speaker},
+        json=query_data,
+        headers={"Content-Type": "application/json"},
+    )
+    return r.content
+
+
+@dataclass
+class SentenceAudio:
+    """1文分の合成結果（WAVのヘッダーを外したPCM）"""
+    index: int
+    text: str
+    pcm: bytes
+    channels: int
+    sample_width: int
+    frame_rate: int
+    seconds: float  # audio_query + synthesis にかかった時間
+    moras: Optional[List[MoraTiming]] = None  # 文の先頭からのモーラの時刻（キャッシュから読んだ場合はNone）
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (self.channels * self.sample_width * self.frame_rate)
+
+    @classmethod
+    def from_wav(cls, index: int, text: str, wav_bytes: bytes, seconds: float, moras: Optional[List[MoraTiming]] = None) -> "SentenceAudio":
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+            return cls(
+                index=index,
+                text=text,
+                pcm=wf.readframes(wf.getnframes()),
+                channels=wf.getnchannels(),
+                sample_width=wf.getsampwidth(),
+                frame_rate=wf.getframerate(),
+                seconds=seconds,
+                moras=moras,
             )
 
-            if r.status_code == 200:
-                return r.content
 
-            print(f"synthesis エラー: {r.status_code} - {r.text}")
+def split_sentences(texts: str) -> List[str]:
+    """。！？の直後で区切り、空の文を除く"""
+    return [text for text in re.split("(?<=！|。|？)", texts) if text.strip()]
 
-        except requests.exceptions.RequestException as e:
-            print(f"リクエストエラー: {e}")
 
-        time.sleep(1)
+class VoicevoxEngine:
+    """文ごとのaudio_query/synthesisを同時実行し、順番どおりに1つのWAVへまとめる"""
+
+    def __init__(self, url: str = VOICEVOX_URL, speaker: int = 46, max_workers: int = MAX_WORKERS, max_retry: int = 20, prosody: Optional[dict] = None, use_breaker: bool = True):
+        """
+        Args:
+            url: VOICEVOXエンジンのURL
+            speaker: 話者ID
+            max_workers: 同時に合成する文の数の上限
+            max_retry: 1リクエストあたりの最大試行回数（呼び出しごとに指定しなかった場合）
+            prosody: audio_query の結果に上書きする韻律のパラメータ（省略時は PROSODY）
+            use_breaker: サーキットブレーカーを持つか（TTSRouter の下ではルーターのブレーカーを使う）
+        """
+        self.url = url
+        self.speaker = speaker
+        self.prosody = dict(PROSODY if prosody is None else prosody)
+        self.max_workers = max_workers
+        self.max_retry = max_retry
+        # 接続を使い回す（文ごとにTCP接続を張り直さない）
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = TurnContextExecutor(max_workers=max_workers, thread_name_prefix="voicevox")
+        # 続けて失敗したらエンジンが復帰するまでリクエストしない
+        self.breaker = CircuitBreaker("voicevox", self.probe) if use_breaker else None
+
+    def probe(self) -> None:
+        """死活確認（GET /version）"""
+        r = self.session.get(f"{self.url}/version", timeout=(1.0, 2.0))
+        r.raise_for_status()
+
+    def synthesize_sentence(self, index: int, text: str, speaker: Optional[int] = None, use_cache: bool = True, deadline: Optional[Deadline] = None, max_retry: Optional[int] = None) -> SentenceAudio:
+        """1文を合成する（キャッシュ済みの文はエンジンを呼ばない）"""
+        speaker = self.speaker if speaker is None else speaker
+        max_retry = self.max_retry if max_retry is None else max_retry
+        start = time.time()
+        key = cache_key(text, "voicevox", speaker, self.prosody)
+        voice_data = tts_cache.get(key) if use_cache else None
+        if voice_data is None:
+            query_data = audio_query(
+                text, speaker, max_retry, session=self.session, url=self.url,
+                prosody=self.prosody, deadline=deadline, breaker=self.breaker,
+            )
+            voice_data = synthesis(
+                speaker, query_data, max_retry, session=self.session, url=self.url,
+                deadline=deadline, breaker=self.breaker,
+            )
+            tts_cache.put(key, voice_data)
+            registry.observe("voicevox_sentence", time.time() - start)
+        else:
+            # 音声がキャッシュにあっても、メモした audio_query があれば口パク用のモーラの時刻が分かる
+            query_data = query_cache.get(text, speaker, self.prosody, record=False)
+        moras = (mora_timings(query_data) or None) if query_data else None
+        return SentenceAudio.from_wav(index, text, voice_data, time.time() - start, moras)
+
+    def synthesize(self, texts: str, speaker: Optional[int] = None, use_cache: bool = True, deadline: Optional[Deadline] = None, max_retry: Optional[int] = None) -> List[SentenceAudio]:
+        """
+        文ごとに並行して合成し、文の順番どおりに返す
+        （全文で1つの締め切りを共有し、エンジンが落ちていれば締め切りかブレーカーですぐに失敗する）
+
+        Args:
+            texts: 読み上げるテキスト
+            speaker: 話者ID（省略時はエンジンの既定値）
+            use_cache: 音声キャッシュを使うか
+            deadline: 発話の締め切り（省略時はここから retry_policy.deadline 秒）
+            max_retry: 1リクエストあたりの最大試行回数（省略時はエンジンの既定値）
 
-    raise ConnectionError(f"音声エラー：リトライ回数が上限に到達しました。 synthesis")
+        Returns:
+            List[SentenceAudio]: 文の順番に並んだ合成結果
+        """
+        sentences = split_sentences(texts)
+        deadline = deadline or Deadline(retry_policy.deadline)
+        futures = [
+            self._executor.submit(self.synthesize_sentence, i, text, speaker, use_cache, deadline, max_retry)
+            for i, text in enumerate(sentences)
+        ]
+        return [future.result() for future in futures]
 
-def save_wav(data, filename, volume_gain=2.0):
-    # バイナリを numpy.int16 に変換
-    audio_array = np.frombuffer(data, dtype=np.int16)
+    def synthesize_wav(self, texts: str, speaker: Optional[int] = None, volume_gain: float = 2.0, use_cache: bool = True, deadline: Optional[Deadline] = None, max_retry: Optional[int] = None) -> Tuple[bytearray, WavInfo, Optional[List[MoraTiming]]]:
+        """
+        テキストを合成し、全文を1つにまとめたWAVとヘッダーの内容、WAVの先頭からのモーラの時刻を返す
+        （モーラの時刻が分からない文は、文全体を口を開く区間とする。どの文も分からなければNone）
 
-    # 音量を増幅（クリッピング対策で16bitの範囲に収める）
-    audio_array = np.clip(audio_array * volume_gain, -32768, 32767).astype(np.int16)
+        Args:
+            texts: 読み上げるテキスト
+            speaker: 話者ID（省略時はエンジンの既定値）
+            volume_gain: 音量の倍率
+            use_cache: 音声キャッシュを使うか
+            deadline: 発話の締め切り（TTSRouter が切り替え先のエンジンと共有する）
+            max_retry: 1リクエストあたりの最大試行回数（省略時はエンジンの既定値）
 
-    # numpy配列 → バイナリ
-    amplified_data = audio_array.tobytes()
+        Raises:
+            ValueError: 読み上げる文がない、または文ごとの音声形式が一致しない場合
+        """
+        start = time.time()
+        sentences = self.synthesize(texts, speaker, use_cache, deadline, max_retry)
+        if not sentences:
+            raise ValueError("読み上げる文がありません")
+        for sentence in sentences:
+            print(f"[VOICEVOX] 文{sentence.index + 1}: {sentence.seconds:.2f}秒 「{sentence.text[:20]}」")
+
+        first = sentences[0]
+        for sentence in sentences[1:]:
+            if (sentence.channels, sentence.sample_width, sentence.frame_rate) != (first.channels, first.sample_width, first.frame_rate):
+                raise ValueError(f"文ごとの音声形式が一致しません: {sentence.text[:30]}")
+
+        # ヘッダーと全文のPCMを1つのバッファに順番どおりに並べる（bytesの連結を繰り返さない）
+        data_size = sum(len(sentence.pcm) for sentence in sentences)
+        header = build_wav_header(first.channels, first.frame_rate, first.sample_width, data_size)
+        buffer = bytearray(len(header) + data_size)
+        view = memoryview(buffer)
+        view[:len(header)] = header
+        offset = len(header)
+        for sentence in sentences:
+            view[offset:offset + len(sentence.pcm)] = sentence.pcm
+            offset += len(sentence.pcm)
+        apply_gain(view[len(header):], volume_gain)
+
+        total = time.time() - start
+        slowest = max(sentence.seconds for sentence in sentences)
+        registry.observe("voicevox_synthesis", total)
+        print(f"[VOICEVOX] {len(sentences)}文の合成: {total:.2f}秒（最も遅い文: {slowest:.2f}秒）")
+        info = WavInfo(1, first.channels, first.frame_rate, first.sample_width * 8, len(header), data_size)
+        return buffer, info, self._join_moras(sentences)
+
+    @staticmethod
+    def _join_moras(sentences: List[SentenceAudio]) -> Optional[List[MoraTiming]]:
+        if all(sentence.moras is None for sentence in sentences):
+            return None
+        moras: List[MoraTiming] = []
+        offset = 0.0
+        for sentence in sentences:
+            if sentence.moras is None:
+                moras.append((offset, offset + sentence.duration, "a"))
+            else:
+                moras.extend((offset + start, offset + end, shape) for start, end, shape in sentence.moras)
+            offset += sentence.duration
+        return moras
+
+    def save_wavefile(self, texts: str, filename: str = "voice.wav", speaker: Optional[int] = None, volume_gain: float = 2.0, max_retry: Optional[int] = None) -> float:
+        """
+        テキストを合成してWAVファイルに保存し、再生時間（秒）を返す
+
+        Args:
+            texts: 読み上げるテキスト
+            filename: 保存先
+            speaker: 話者ID（省略時はエンジンの既定値）
+            volume_gain: 音量の倍率
+            max_retry: 1リクエストあたりの最大試行回数（省略時はエンジンの既定値）
+
+        Returns:
+            float: 再生時間（秒）
+        """
+        if not split_sentences(texts):
+            return 0.0
+        wav, info, _ = self.synthesize_wav(texts, speaker, volume_gain, max_retry=max_retry)
+        with open(filename, "wb") as f:
+            f.write(wav)
+        return info.duration
+
+    def cached(self, texts: str, speaker: Optional[int] = None) -> bool:
+        """全文がキャッシュ済みか（エンジンを呼ばずに返せるか）"""
+        speaker = self.speaker if speaker is None else speaker
+        return all(
+            tts_cache.contains(cache_key(text, "voicevox", speaker, self.prosody))
+            for text in split_sentences(texts)
+        )
+
+    def close(self) -> None:
+        if self.breaker:
+            self.breaker.close()
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_engine: Optional[VoicevoxEngine] = None
+_engine_lock = threading.Lock()
+
+
+def _default_engine() -> VoicevoxEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = VoicevoxEngine()
+        return _engine
+
+
+def save_wav(data, filename, volume_gain=2.0, framerate=24000):
+    # ヘッダーを除いたPCM（16bitモノラル）を増幅して保存
+    buffer = bytearray(data)
+    apply_gain(buffer, volume_gain)
 
     with wave.open(filename, 'wb') as wf:
         wf.setnchannels(1)       # モノラル
         wf.setsampwidth(2)       # 16bit = 2bytes
-        wf.setframerate(24000)   # VOICEVOXの出力サンプリング周波数
-        wf.writeframes(amplified_data)
+        wf.setframerate(framerate)   # VOICEVOXの出力サンプリング周波数
+        wf.writeframes(buffer)
 
-def save_wavefile(texts, speaker=46, max_retry=20):
+def save_wavefile(texts, speaker=46, max_retry=20, filename="voice.wav"):
     if texts==False:
         texts="ちょっと、通信状態悪いかも？"
-    texts=re.split("(?<=！|。|？)",texts)
-    all_voice_data = b''
-    play_obj=None
-    for text in texts:
-
-        if not text.strip():
-            continue
-
-        # audio_query
-        query_data = audio_query(text,speaker,max_retry)
-
-        # synthesis
-        voice_data=synthesis(speaker,query_data,max_retry)
-
-        # データを結合
-        all_voice_data += voice_data
+    engine = _default_engine()
 
-    #音声の保存
-    filename = "voice.wav"
-    save_wav(all_voice_data, filename)
+    #音声の合成と保存（文ごとに並行して合成。共有のエンジンの設定は書き換えない）
+    duration = engine.save_wavefile(texts, filename=filename, speaker=speaker, max_retry=max_retry)
     print(f"音声ファイルを保存しました: {filename}")
 
     #音声の再生
-    # wave_obj=simpleaudio.WaveObject(all_voice_data,1,2,24000)
+    # import simpleaudio
+    # wave_obj=simpleaudio.WaveObject.from_wave_file(filename)
     # play_obj=wave_obj.play()
     # play_obj.wait_done()
+    return duration
 ###############################################################
 
 if __name__ == "__main__":
-    save_wavefile("こんにちは")
\ No newline at end of file
+    save_wavefile("こんにちは")
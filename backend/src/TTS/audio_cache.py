@@ -0,0 +1,181 @@
+"""
+音声合成結果のディスクキャッシュ
+読み上げるテキスト（正規化後）・エンジン・話者・韻律パラメータから決まるキーで、エンジンが返したWAVをそのまま保存する。
+挨拶・タイマーの通知・お別れの挨拶など繰り返し読み上げる文は、2回目以降エンジンを呼ばずに再生できる。
+容量の上限を超えたら最後に使われたのが古いものから削除する（LRU）
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from ..metrics.registry import registry
+
+CACHE_SUFFIX = ".wav"
+
+
+def normalize_text(text: str) -> str:
+    """表記ゆれでキーが分かれないよう、全角・半角を揃えて前後と連続する空白を詰める"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(text: str, engine: str, speaker, params: Optional[dict] = None) -> str:
+    """
+    キャッシュのキーを作る
+
+    Args:
+        text: 読み上げるテキスト（hiraganize などの読み替え後）
+        engine: エンジン名（"aivis" / "voicevox"）
+        speaker: 話者ID
+        params: 音声に影響するパラメータ（speedScale など）
+
+    Returns:
+        str: キー（SHA-256の16進表記）
+    """
+    material = json.dumps(
+        {"text": normalize_text(text), "engine": engine, "speaker": speaker, "params": params or {}},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """容量の上限付きの、内容から決まるキーによるディスクキャッシュ"""
+
+    def __init__(self, directory: str = "backend/cache/tts", max_bytes: int = 200 * 1024 * 1024, suffix: str = CACHE_SUFFIX, metric: str = "tts_cache"):
+        """
+        Args:
+            directory: 保存先のディレクトリ
+            max_bytes: 合計サイズの上限（0でキャッシュを無効にする）
+            suffix: 保存するファイルの拡張子
+            metric: 計測値の名前の接頭辞
+        """
+        self.suffix = suffix
+        self.metric = metric
+        self._lock = threading.Lock()
+        # キー → サイズ（先頭ほど長く使われていない）
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.configure(directory, max_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def configure(self, directory: str, max_bytes: int) -> None:
+        """保存先と上限を変更し、既存のファイルを読み込み直す"""
+        with self._lock:
+            self.directory = directory
+            self.max_bytes = max_bytes
+            self._entries.clear()
+            self._total_bytes = 0
+            if self.enabled and os.path.isdir(directory):
+                self._scan()
+            self._evict()
+
+    def _scan(self) -> None:
+        """既存のファイルを最終アクセスの古い順に登録する"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        キャッシュ済みの音声を返す
+
+        Returns:
+            Optional[bytes]: エンジンが返したWAV（なければNone）
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+        data = None
+        if known:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+                # 最終アクセス時刻を更新し、再起動後もLRUの順番を保つ
+                os.utime(self._path(key))
+            except OSError:
+                with self._lock:
+                    self._total_bytes -= self._entries.pop(key, 0)
+        self._record(data is not None)
+        return data
+
+    def contains(self, key: str) -> bool:
+        """ファイルを読まずに、キャッシュ済みかどうかだけを返す（ヒット率には数えない）"""
+        with self._lock:
+            return self.enabled and key in self._entries
+
+    def put(self, key: str, data: bytes) -> None:
+        """音声を保存する（一時ファイルに書いてから置き換えるため、書きかけのファイルは読まれない）"""
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"[キャッシュ] {self.directory} への保存に失敗しました: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        """上限を超えた分を、長く使われていないものから削除する（ロック内で呼ぶ）"""
+        while self._entries and self._total_bytes > self.max_bytes:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            registry.inc(f"{self.metric}_evictions")
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+        registry.gauge(f"{self.metric}_bytes", self._total_bytes)
+        registry.gauge(f"{self.metric}_entries", len(self._entries))
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            lookups = self.hits + self.misses
+            registry.gauge(f"{self.metric}_hit_rate", self.hits / lookups)
+        registry.inc(self.metric, result="hit" if hit else "miss")
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# プロセス全体で共有するキャッシュ（main で保存先と上限を設定する）
+tts_cache = AudioCache()
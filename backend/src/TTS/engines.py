@@ -0,0 +1,562 @@
+"""
+音声合成エンジンの共通インターフェースと切り替え
+AivisSpeech と VOICEVOX を同じ TTSEngine として扱い、接続を使い回す。
+起動時にダミーの合成で各エンジンを温め、定期的に死活確認を行う。
+合成に失敗したら次のエンジンに切り替え、文字あたりの合成時間が短い健全なエンジンを優先する。
+再試行の待ち時間・発話の締め切り・サーキットブレーカー（retry.py）はどのエンジンにもルーターで適用する。
+合成した音声には口パク用のトラック（lipsync）を添えて返せる
+"""
+
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from .AivisSpeech import AIVIS_URL, AivisAdapter, hiraganize
+from .VOICEVOX import VOICEVOX_URL, VoicevoxEngine
+from .audio_cache import tts_cache
+from .lipsync import LipSyncTrack, MoraTiming, build_track
+from .retry import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, retry_policy
+from .wav import WavInfo, apply_gain_to_wav, parse_wav_header
+from ..metrics.registry import registry
+
+DEFAULT_ENGINES = ["aivis", "voicevox"]
+# 起動時の慣らし運転で合成する文（キャッシュは使わない）
+WARM_UP_TEXT = "こんにちは。"
+# 死活確認のタイムアウト（接続, 読み込み）
+PROBE_TIMEOUT = (1.0, 2.0)
+# 文字あたりの合成時間の移動平均の重み
+LATENCY_SMOOTHING = 0.3
+# 設定の順番が1つ下がるごとに合成時間に掛ける割増（声が頻繁に入れ替わらないよう、優先度の低いエンジンは十分速いときだけ選ぶ）
+PRIORITY_PENALTY = 1.0
+
+WavBytes = Union[bytes, bytearray, memoryview]
+
+
+class TTSUnavailable(ConnectionError):
+    """すべてのエンジンで合成に失敗した"""
+
+
+def _pooled_session(pool_maxsize: int = 4) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class TTSEngine:
+    """音声合成エンジンの共通インターフェース"""
+
+    name = ""
+
+    def __init__(self, url: str, session: Optional[requests.Session] = None):
+        """
+        Args:
+            url: エンジンのURL
+            session: 接続を使い回すセッション（省略時はエンジンごとに作る）
+        """
+        self.url = url
+        self.session = session or _pooled_session()
+
+    def synthesize(self, text: str, use_cache: bool = True, deadline: Optional[Deadline] = None) -> WavBytes:
+        """
+        音声を合成し、音量を調整したWAV全体を返す
+
+        Args:
+            text: 読み上げるテキスト
+            use_cache: 音声キャッシュを使うか
+            deadline: 発話の締め切り（リクエストのタイムアウトを残り時間で頭打ちにする）
+
+        Raises:
+            Exception: エンジンに接続できない・エラーが返った場合
+        """
+        raise NotImplementedError
+
+    def synthesize_timed(self, text: str, use_cache: bool = True, deadline: Optional[Deadline] = None) -> Tuple[WavBytes, Optional[List[MoraTiming]]]:
+        """
+        音声を合成し、WAV全体とモーラの時刻（エンジンが返さない場合はNone）を返す
+        """
+        return self.synthesize(text, use_cache, deadline), None
+
+    async def synthesize_timed_async(self, session, text: str, use_cache: bool = True, deadline: Optional[Deadline] = None) -> Tuple[WavBytes, Optional[List[MoraTiming]]]:
+        """
+        synthesize_timed の非同期版
+        aiohttpのセッションで合成できないエンジンは、ブロッキング処理用のスレッドで synthesize_timed を呼ぶ
+
+        Args:
+            session: 非同期エンジンが共有するaiohttpのセッション
+        """
+        return await asyncio.to_thread(self.synthesize_timed, text, use_cache, deadline)
+
+    def cached(self, text: str) -> bool:
+        """エンジンを呼ばずにキャッシュから返せるか"""
+        return False
+
+    def probe(self) -> None:
+        """
+        死活確認（GET /version）
+
+        Raises:
+            requests.exceptions.RequestException: 応答がない・エラーが返った場合
+        """
+        response = self.session.get(f"{self.url}/version", timeout=PROBE_TIMEOUT)
+        response.raise_for_status()
+
+    def warm_up(self) -> None:
+        """ダミーの合成でモデルの読み込みと接続を済ませておく"""
+        self.synthesize(WARM_UP_TEXT, use_cache=False)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AivisTTSEngine(TTSEngine):
+    """AivisSpeech（文章全体を1回で合成する）"""
+
+    name = "aivis"
+
+    def __init__(self, url: str = AIVIS_URL, volume_gain: float = 1.0):
+        super().__init__(url)
+        self.adapter = AivisAdapter(url, session=self.session)
+        self.adapter.volume_gain = volume_gain
+
+    def synthesize(self, text: str, use_cache: bool = True, deadline: Optional[Deadline] = None) -> WavBytes:
+        timeout = deadline.timeout(retry_policy) if deadline else None
+        return self._apply_gain(self.adapter.synthesize(text, use_cache, timeout))
+
+    async def synthesize_timed_async(self, session, text: str, use_cache: bool = True, deadline: Optional[Deadline] = None) -> Tuple[WavBytes, Optional[List[MoraTiming]]]:
+        # audio_query と synthesis をaiohttpのセッションで送り、スレッドを占有しない
+        timeout = None
+        if deadline:
+            connect, read = deadline.timeout(retry_policy)
+            timeout = aiohttp.ClientTimeout(total=read, connect=connect)
+        content = await self.adapter.synthesize_async(session, text, use_cache, timeout)
+        return self._apply_gain(content), None
+
+    def _apply_gain(self, content: bytes) -> WavBytes:
+        if self.adapter.volume_gain == 1.0:
+            return content
+        buffer = bytearray(content)
+        apply_gain_to_wav(buffer, self.adapter.volume_gain)
+        return buffer
+
+    def cached(self, text: str) -> bool:
+        return tts_cache.contains(self.adapter._cache_key(text))
+
+
+class VoicevoxTTSEngine(TTSEngine):
+    """VOICEVOX（文ごとに並行して合成し、1つのWAVにまとめる）"""
+
+    name = "voicevox"
+
+    def __init__(self, url: str = VOICEVOX_URL, volume_gain: float = 2.0):
+        # 再試行とブレーカーはルーターがすべてのエンジンに同じ方針で適用するので、エンジン側では行わない
+        self.engine = VoicevoxEngine(url=url, max_retry=1, use_breaker=False)
+        super().__init__(url, session=self.engine.session)
+        self.volume_gain = volume_gain
+
+    def synthesize(self, text: str, use_cache: bool = True, deadline: Optional[Deadline] = None) -> WavBytes:
+        return self.synthesize_timed(text, use_cache, deadline)[0]
+
+    def synthesize_timed(self, text: str, use_cache: bool = True, deadline: Optional[Deadline] = None) -> Tuple[WavBytes, Optional[List[MoraTiming]]]:
+        wav, _, moras = self.engine.synthesize_wav(text, volume_gain=self.volume_gain, use_cache=use_cache, deadline=deadline)
+        return wav, moras
+
+    def cached(self, text: str) -> bool:
+        return self.engine.cached(text)
+
+    def close(self) -> None:
+        self.engine.close()
+
+
+# エンジン名 → URLを受け取ってエンジンを作る関数
+ENGINE_TYPES: Dict[str, Callable[[str], TTSEngine]] = {
+    "aivis": AivisTTSEngine,
+    "voicevox": VoicevoxTTSEngine,
+}
+DEFAULT_URLS = {"aivis": AIVIS_URL, "voicevox": VOICEVOX_URL}
+
+
+def register_engine(name: str, factory: Callable[[str], TTSEngine], url: str) -> None:
+    """エンジンの種類を追加する"""
+    ENGINE_TYPES[name] = factory
+    DEFAULT_URLS[name] = url
+
+
+@dataclass
+class SynthesisResult:
+    """合成結果"""
+    engine: str
+    wav: WavBytes
+    moras: Optional[List[MoraTiming]] = None  # WAVの先頭からのモーラの時刻（分からなければNone）
+
+
+@dataclass
+class EngineHealth:
+    """エンジンごとの状態"""
+    healthy: bool = True
+    seconds_per_char: float = 0.0  # 文字あたりの合成時間の移動平均（0は未計測）
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    last_error: str = ""
+
+
+class TTSRouter:
+    """設定された順番と状態に応じてエンジンを選び、失敗したら次のエンジンに切り替える"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engines: Dict[str, TTSEngine] = {}
+        self.health: Dict[str, EngineHealth] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.probe_interval = 30.0
+        self._stop = threading.Event()
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def configure(self, engine_names: Optional[List[str]] = None, urls: Optional[Dict[str, str]] = None, probe_interval: float = 30.0) -> None:
+        """
+        使うエンジンを設定し直す
+
+        Args:
+            engine_names: 使うエンジン名（優先する順。省略時は aivis, voicevox）
+            urls: エンジン名 → URL（省略したものは既定のURL）
+            probe_interval: 死活確認の間隔（秒。0以下なら行わない）
+
+        Raises:
+            ValueError: 未知のエンジン名が含まれる場合
+        """
+        names = engine_names or DEFAULT_ENGINES
+        unknown = [name for name in names if name not in ENGINE_TYPES]
+        if unknown:
+            raise ValueError(f"未知の音声合成エンジンです: {', '.join(unknown)}（{', '.join(ENGINE_TYPES)} から選んでください）")
+        urls = {**DEFAULT_URLS, **(urls or {})}
+        self.close()
+        with self._lock:
+            self.engines = {name: ENGINE_TYPES[name](urls[name]) for name in names}
+            self.health = {name: EngineHealth() for name in names}
+            self.breakers = {name: CircuitBreaker(name, engine.probe) for name, engine in self.engines.items()}
+            self.probe_interval = probe_interval
+        for name in names:
+            registry.gauge("tts_engine_healthy", 1, engine=name)
+
+    def _ensure_configured(self) -> None:
+        if not self.engines:
+            self.configure()
+
+    def preferred_order(self) -> List[str]:
+        """
+        合成を試す順番
+        健全なエンジンを先にし、その中では設定の順番で割増した文字あたりの合成時間が短い順
+        （未計測の健全なエンジンがあるうちは設定の順番どおり）
+        """
+        with self._lock:
+            names = list(self.engines)
+            measured = all(health.seconds_per_char for health in self.health.values() if health.healthy)
+
+            def score(item):
+                rank, name = item
+                health = self.health[name]
+                latency = health.seconds_per_char * (1 + PRIORITY_PENALTY * rank) if measured else 0.0
+                return (not health.healthy, latency, rank)
+
+            return [name for _, name in sorted(enumerate(names), key=score)]
+
+    def synthesize(self, text: str, use_cache: bool = True) -> SynthesisResult:
+        """
+        優先するエンジンから順に合成を試す
+        すべてのエンジンで失敗したら、ジッター付きの指数バックオフで待って最大 retry_policy.max_attempts 回まで試し直す。
+        締め切り（発話単位）は切り替え先のエンジンと共有し、ブレーカーが開いているエンジンはリクエストせずに飛ばす
+
+        Returns:
+            SynthesisResult: 合成したエンジン名と、音量を調整したWAV全体
+
+        Raises:
+            TTSUnavailable: すべてのエンジンで失敗した、または締め切りを過ぎた場合
+        """
+        self._ensure_configured()
+        deadline = Deadline(retry_policy.deadline)
+        errors: List[str] = []
+        for attempt in range(1, retry_policy.max_attempts + 1):
+            tried = False
+            for name in self.preferred_order():
+                engine = self.engines[name]
+                from_cache = use_cache and engine.cached(text)
+                start = time.perf_counter()
+                try:
+                    tried |= self._admit(name, from_cache, deadline)
+                    wav, moras = engine.synthesize_timed(text, use_cache, deadline)
+                except Exception as e:
+                    self._record_attempt_failure(name, e, errors)
+                    continue
+                self._record_result(name, time.perf_counter() - start, text, from_cache, errors)
+                return SynthesisResult(name, wav, moras)
+            delay = self._retry_delay(attempt, tried, deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+        raise TTSUnavailable(f"すべての音声合成エンジンで失敗しました: {'; '.join(errors)}")
+
+    async def synthesize_async(self, session, text: str, use_cache: bool = True) -> SynthesisResult:
+        """
+        synthesize の非同期版（切り替えの順番・再試行・締め切り・ブレーカーと記録は同じ）
+
+        Args:
+            session: 非同期エンジンが共有するaiohttpのセッション
+
+        Raises:
+            TTSUnavailable: すべてのエンジンで失敗した、または締め切りを過ぎた場合
+        """
+        self._ensure_configured()
+        deadline = Deadline(retry_policy.deadline)
+        errors: List[str] = []
+        for attempt in range(1, retry_policy.max_attempts + 1):
+            tried = False
+            for name in self.preferred_order():
+                engine = self.engines[name]
+                from_cache = use_cache and engine.cached(text)
+                start = time.perf_counter()
+                try:
+                    tried |= self._admit(name, from_cache, deadline)
+                    wav, moras = await engine.synthesize_timed_async(session, text, use_cache, deadline)
+                except Exception as e:
+                    self._record_attempt_failure(name, e, errors)
+                    continue
+                self._record_result(name, time.perf_counter() - start, text, from_cache, errors)
+                return SynthesisResult(name, wav, moras)
+            delay = self._retry_delay(attempt, tried, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        raise TTSUnavailable(f"すべての音声合成エンジンで失敗しました: {'; '.join(errors)}")
+
+    def _admit(self, name: str, from_cache: bool, deadline: Deadline) -> bool:
+        """
+        エンジンにリクエストしてよいか確かめる（キャッシュから返せる場合はブレーカー・締め切りによらず通す）
+
+        Returns:
+            bool: エンジンにリクエストするか（キャッシュから返す場合はFalse）
+
+        Raises:
+            CircuitOpenError: ブレーカーが開いている場合
+            DeadlineExceeded: 締め切りを過ぎている場合
+        """
+        if from_cache:
+            return False
+        self.breakers[name].check()
+        if deadline.remaining() <= 0:
+            raise DeadlineExceeded("音声合成の締め切りを過ぎました")
+        return True
+
+    def _record_attempt_failure(self, name: str, error: BaseException, errors: List[str]) -> None:
+        """試行の失敗を記録する（ブレーカーで飛ばした・締め切りを過ぎた場合はエンジンの失敗に数えない）"""
+        errors.append(f"{name}: {error}")
+        if not isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+            self._record_failure(name, error)
+
+    def _retry_delay(self, attempt: int, tried: bool, deadline: Deadline) -> Optional[float]:
+        """
+        すべてのエンジンで失敗したあと、試し直すまでの待ち時間
+
+        Returns:
+            Optional[float]: 待ち時間（秒）。試行回数の上限に達した・どのエンジンにもリクエストしなかった
+            （すべてブレーカーが開いている）・待つと締め切りを過ぎる場合はNone
+        """
+        if attempt >= retry_policy.max_attempts or not tried:
+            return None
+        delay = retry_policy.backoff(attempt)
+        if delay >= deadline.remaining():
+            return None
+        registry.inc("retries", stage="tts")
+        return delay
+
+    def _record_result(self, name: str, elapsed: float, text: str, from_cache: bool, errors: List[str]) -> None:
+        """合成できたエンジンの所要時間と、切り替えがあったことを記録する"""
+        registry.observe(f"tts_{name}", elapsed)
+        registry.inc("tts_requests", engine=name, result="cached" if from_cache else "ok")
+        if not from_cache:
+            self._record_success(name, elapsed, len(text))
+        if errors:
+            registry.inc("tts_failover", engine=name)
+            print(f"[音声合成] {name} に切り替えました（{'; '.join(errors)}）")
+
+    def _record_success(self, name: str, elapsed: float, chars: int) -> None:
+        self.breakers[name].record_success()
+        per_char = elapsed / max(chars, 1)
+        with self._lock:
+            health = self.health[name]
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.healthy = True
+            if health.seconds_per_char:
+                per_char = LATENCY_SMOOTHING * per_char + (1 - LATENCY_SMOOTHING) * health.seconds_per_char
+            health.seconds_per_char = per_char
+        registry.gauge("tts_engine_healthy", 1, engine=name)
+        registry.gauge("tts_engine_seconds_per_char", per_char, engine=name)
+
+    def _record_failure(self, name: str, error: BaseException) -> None:
+        with self._lock:
+            health = self.health[name]
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.healthy = False
+            health.last_error = f"{type(error).__name__}: {error}"
+        registry.inc("tts_requests", engine=name, result="error")
+        registry.gauge("tts_engine_healthy", 0, engine=name)
+        self.breakers[name].record_failure()
+        print(f"[音声合成] {name} で失敗しました: {error}")
+
+    def _probe_engine(self, name: str) -> bool:
+        """1つのエンジンの死活確認を行い、状態を更新する"""
+        try:
+            self.engines[name].probe()
+        except Exception as e:
+            with self._lock:
+                health = self.health[name]
+                was_healthy = health.healthy
+                health.healthy = False
+                health.last_error = f"{type(e).__name__}: {e}"
+            registry.gauge("tts_engine_healthy", 0, engine=name)
+            if was_healthy:
+                print(f"[音声合成] {name} に接続できません: {e}")
+            return False
+        with self._lock:
+            health = self.health[name]
+            recovered = not health.healthy
+            health.healthy = True
+            health.consecutive_failures = 0
+        registry.gauge("tts_engine_healthy", 1, engine=name)
+        if recovered:
+            print(f"[音声合成] {name} が復帰しました")
+        return True
+
+    def probe_all(self) -> Dict[str, bool]:
+        """すべてのエンジンの死活確認"""
+        self._ensure_configured()
+        return {name: self._probe_engine(name) for name in list(self.engines)}
+
+    def warm_up(self) -> None:
+        """接続できるエンジンでダミーの合成を並行して行い、初回の合成の遅さを起動時に済ませる"""
+        self._ensure_configured()
+
+        def warm(name: str) -> None:
+            if not self._probe_engine(name):
+                return
+            start = time.perf_counter()
+            try:
+                self.engines[name].warm_up()
+            except Exception as e:
+                self._record_failure(name, e)
+                return
+            elapsed = time.perf_counter() - start
+            self._record_success(name, elapsed, len(WARM_UP_TEXT))
+            print(f"[音声合成] {name} の準備ができました（{elapsed:.2f}秒）")
+
+        with ThreadPoolExecutor(max_workers=len(self.engines), thread_name_prefix="tts-warmup") as executor:
+            list(executor.map(warm, list(self.engines)))
+
+    def start_health_probe(self) -> None:
+        """死活確認をバックグラウンドで定期的に行う（失敗したエンジンの復帰を検出する）"""
+        if self.probe_interval <= 0 or (self._probe_thread and self._probe_thread.is_alive()):
+            return
+        self._stop.clear()
+        self._probe_thread = threading.Thread(target=self._probe_loop, name="tts-health-probe", daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            self.probe_all()
+
+    def status(self) -> Dict[str, dict]:
+        """エンジンごとの状態（優先する順）"""
+        order = self.preferred_order()
+        with self._lock:
+            return {name: asdict(self.health[name]) for name in order}
+
+    def report(self) -> str:
+        lines = []
+        for name, health in self.status().items():
+            state = "正常" if health["healthy"] else f"停止中（{health['last_error']}）"
+            lines.append(
+                f"  {name}: {state} / {health['seconds_per_char'] * 1000:.0f}ミリ秒/文字 "
+                f"/ 成功 {health['successes']} / 失敗 {health['failures']}"
+            )
+        return "音声合成エンジン:\n" + "\n".join(lines)
+
+    def close(self) -> None:
+        """死活確認を止め、接続を閉じる"""
+        self._stop.set()
+        if self._probe_thread:
+            self._probe_thread.join(timeout=PROBE_TIMEOUT[0] + PROBE_TIMEOUT[1])
+            self._probe_thread = None
+        with self._lock:
+            engines = list(self.engines.values())
+            breakers = list(self.breakers.values())
+        for breaker in breakers:
+            breaker.close()
+        for engine in engines:
+            engine.close()
+
+
+# プロセス全体で共有するエンジンの切り替え（main で使うエンジンと死活確認の間隔を設定する）
+tts_router = TTSRouter()
+
+
+def _wav_duration(wav: WavBytes) -> float:
+    try:
+        return parse_wav_header(wav).duration
+    except ValueError:
+        import soundfile
+        return soundfile.info(io.BytesIO(bytes(wav))).duration
+
+
+def save_wavefile(text: str, output_filename: str = "backend/src/voice/voice.wav") -> float:
+    """音声を合成してWAVファイルに保存し、再生時間（秒）を返す"""
+    return _write_wavefile(tts_router.synthesize(hiraganize(text)).wav, output_filename)
+
+
+def synthesize_wav(text: str, lipsync: bool = True) -> Tuple[WavBytes, WavInfo, Optional[LipSyncTrack]]:
+    """
+    音声を合成し、ファイルに書かずに (WAV, ヘッダーの内容, 口パク用のトラック) を返す
+
+    Args:
+        text: 読み上げるテキスト
+        lipsync: 口パク用のトラックを作るか（Falseならトラックは None）
+
+    Raises:
+        ValueError: 16bitのPCMではない場合
+    """
+    return _with_track(tts_router.synthesize(hiraganize(text)), lipsync)
+
+
+def _with_track(result: SynthesisResult, lipsync: bool) -> Tuple[WavBytes, WavInfo, Optional[LipSyncTrack]]:
+    info = parse_wav_header(result.wav)
+    if not info.is_pcm16:
+        raise ValueError(f"16bitのPCMのみ対応しています（format={info.audio_format}, bits={info.bits_per_sample}）")
+    track = build_track(result.wav, info, result.moras) if lipsync else None
+    return result.wav, info, track
+
+
+def _write_wavefile(wav: WavBytes, output_filename: str) -> float:
+    with open(output_filename, "wb") as f:
+        f.write(wav)
+    return _wav_duration(wav)
+
+
+async def save_wavefile_async(session, text: str, output_filename: str = "backend/src/voice/voice.wav") -> float:
+    """aiohttpのセッションで合成し、イベントループを止めないよう書き込みだけをスレッドで行う"""
+    result = await tts_router.synthesize_async(session, hiraganize(text))
+    return await asyncio.to_thread(_write_wavefile, result.wav, output_filename)
+
+
+async def synthesize_wav_async(session, text: str, lipsync: bool = True) -> Tuple[WavBytes, WavInfo, Optional[LipSyncTrack]]:
+    """synthesize_wav の非同期版（aiohttpのセッションで合成できるエンジンはスレッドを使わない）"""
+    return _with_track(await tts_router.synthesize_async(session, hiraganize(text)), lipsync)
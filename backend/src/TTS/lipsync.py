@@ -0,0 +1,151 @@
+"""
+口パク用のトラックの生成
+合成したPCMを固定長のフレームに区切ってNumPyでまとめてRMS（音量）を求め、口の開き具合の列にする。
+VOICEVOXの audio_query が返すモーラの長さがあれば、フレームごとの口の形（母音）も合わせて求める。
+フロントエンドは再生位置からフレームを引くだけで口を動かせる（音声の解析をしない）
+"""
+
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from .wav import WavInfo
+
+# 1フレームの長さ（ミリ秒）
+FRAME_MS = 20
+# 口の開き具合の段階数（0〜LEVEL_STEPS の整数で送る）
+LEVEL_STEPS = 100
+# 音量を正規化する基準（発話内の音量の上位5%）と、無音ばかりの発話を持ち上げすぎないための下限
+REFERENCE_PERCENTILE = 95
+MIN_REFERENCE_RMS = 0.02
+# 口を閉じる形（撥音・促音・ポーズ・発話の前後の無音）
+CLOSED = "n"
+VOWELS = "aiueo"
+
+# (開始秒, 終了秒, 口の形)
+MoraTiming = Tuple[float, float, str]
+
+
+@dataclass
+class LipSyncTrack:
+    """フレームごとの口の開き具合と口の形"""
+    frame_ms: int
+    levels: List[int]              # 0〜LEVEL_STEPS
+    visemes: Optional[str] = None  # 1フレーム1文字（a/i/u/e/o/n）。モーラの長さがない場合はNone
+
+    def to_dict(self, partial: bool = False) -> dict:
+        """partial=True なら、続きの文のフレームがあとから追記されることをフロントエンドに知らせる"""
+        data = asdict(self)
+        if partial:
+            data["partial"] = True
+        return data
+
+    def extend(self, other: "LipSyncTrack", start: float) -> None:
+        """
+        続きの音声のトラックを start 秒の位置からつなげる（文ごとに合成して1つの発話に追記する場合）
+
+        Args:
+            other: 続きの音声のトラック（フレームの長さが同じであること）
+            start: 続きの音声が始まる、発話の先頭からの時刻（秒）
+        """
+        # 文の長さはフレームの倍数ではないので、文の境目がずれていかないよう時刻からフレーム位置を求め直す
+        frames = round(start * 1000 / self.frame_ms)
+        pad = max(frames - len(self.levels), 0)
+        levels = self.levels[:frames] + [0] * pad
+        if self.visemes is None and other.visemes is None:
+            visemes = None
+        else:
+            # 片方だけモーラの長さがない場合は、口の形を「あ」にしておく（フロントエンドの既定と同じ）
+            head = self.visemes if self.visemes is not None else "a" * len(self.levels)
+            visemes = head[:frames] + CLOSED * pad + (other.visemes if other.visemes is not None else "a" * len(other.levels))
+        self.levels = levels + other.levels
+        self.visemes = visemes
+
+
+def _viseme(vowel: str) -> str:
+    """audio_query の母音（無声化は大文字、N・cl・pau を含む）を口の形にする"""
+    vowel = (vowel or "").lower()
+    return vowel if vowel in VOWELS else CLOSED
+
+
+def mora_timings(query_data: dict) -> List[MoraTiming]:
+    """
+    audio_query の結果から、合成音声の中でのモーラごとの時刻と口の形を求める
+
+    Args:
+        query_data: 合成に使った audio_query の結果（speedScale などの変更後）
+
+    Returns:
+        List[MoraTiming]: 時刻順のモーラ（accent_phrases が空なら空のリスト）
+    """
+    # 音素の長さはすべて speedScale で割った長さで合成される
+    speed = query_data.get("speedScale") or 1.0
+    elapsed = query_data.get("prePhonemeLength") or 0.0
+    timings = []
+    for phrase in query_data.get("accent_phrases") or []:
+        moras = list(phrase.get("moras") or [])
+        if phrase.get("pause_mora"):
+            moras.append(phrase["pause_mora"])
+        for mora in moras:
+            length = (mora.get("consonant_length") or 0.0) + (mora.get("vowel_length") or 0.0)
+            timings.append((elapsed / speed, (elapsed + length) / speed, _viseme(mora.get("vowel"))))
+            elapsed += length
+    return timings
+
+
+def rms_envelope(pcm: Union[bytes, bytearray, memoryview], channels: int, sample_rate: int, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """
+    16bitのPCMのフレームごとのRMS（-1.0〜1.0のスケール）
+
+    Returns:
+        np.ndarray: フレームごとのRMS（float32）
+    """
+    samples = np.frombuffer(memoryview(pcm).cast("B")[:len(pcm) - len(pcm) % (2 * channels)], dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    frames = -(-len(samples) // frame_length)
+    padded = np.zeros(frames * frame_length, dtype=np.float32)
+    padded[:len(samples)] = samples
+    padded /= 32768.0
+    blocks = padded.reshape(frames, frame_length)
+    return np.sqrt(np.einsum("ij,ij->i", blocks, blocks) / frame_length)
+
+
+def _levels(rms: np.ndarray) -> List[int]:
+    """発話内の音量で正規化して 0〜LEVEL_STEPS の整数にする"""
+    if not len(rms):
+        return []
+    reference = max(float(np.percentile(rms, REFERENCE_PERCENTILE)), MIN_REFERENCE_RMS)
+    return np.rint(np.clip(rms / reference, 0.0, 1.0) * LEVEL_STEPS).astype(int).tolist()
+
+
+def _visemes(frames: int, frame_ms: int, moras: List[MoraTiming]) -> str:
+    """フレームの中央の時刻を含むモーラの口の形（どのモーラにも入らないフレームは閉じる）"""
+    centers = (np.arange(frames) + 0.5) * frame_ms / 1000.0
+    starts = np.array([start for start, _, _ in moras])
+    ends = np.array([end for _, end, _ in moras])
+    shapes = np.array([shape for _, _, shape in moras] + [CLOSED])
+    index = np.searchsorted(starts, centers, side="right") - 1
+    inside = (index >= 0) & (centers < ends[np.clip(index, 0, None)])
+    return "".join(shapes[np.where(inside, index, len(moras))])
+
+
+def build_track(wav: Union[bytes, bytearray, memoryview], info: WavInfo, moras: Optional[List[MoraTiming]] = None, frame_ms: int = FRAME_MS) -> LipSyncTrack:
+    """
+    WAVから口パク用のトラックを作る
+
+    Args:
+        wav: WAV全体のバイト列（16bitのPCM）
+        info: WAVヘッダーの内容
+        moras: 音声の先頭からの時刻で並べたモーラ（省略時は口の形を求めない）
+        frame_ms: 1フレームの長さ（ミリ秒）
+
+    Returns:
+        LipSyncTrack: 口パク用のトラック
+    """
+    pcm = memoryview(wav)[info.data_offset:info.data_offset + info.data_size]
+    rms = rms_envelope(pcm, info.channels, info.sample_rate, frame_ms)
+    visemes = _visemes(len(rms), frame_ms, moras) if moras else None
+    return LipSyncTrack(frame_ms, _levels(rms), visemes)
@@ -0,0 +1,135 @@
+"""
+VOICEVOXの audio_query の結果のメモ
+audio_query の結果（アクセント句・モーラ・ピッチ）はテキストと話者が同じなら変わらないので、
+メモリ上のLRUと（任意で）ディスクに保存しておき、話速などの韻律の変更だけを手元で上書きして使い回す。
+繰り返し読み上げる文は audio_query の往復を省いて synthesis だけで合成できる
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from .audio_cache import AudioCache, cache_key
+from ..metrics.registry import registry
+
+QUERY_SUFFIX = ".json"
+
+
+def apply_prosody(query_data: dict, prosody: Optional[dict] = None) -> dict:
+    """
+    メモした audio_query の結果に韻律の変更（speedScale など）を適用した新しい辞書を返す
+    （メモの中身は書き換えない。アクセント句は共有するので、呼び出し側も書き換えないこと）
+    """
+    return {**query_data, **(prosody or {})}
+
+
+class QueryCache:
+    """audio_query の結果のメモ（メモリ上のLRUと、任意のディスク保存）"""
+
+    def __init__(self, max_entries: int = 512, directory: Optional[str] = None, max_disk_bytes: int = 20 * 1024 * 1024):
+        """
+        Args:
+            max_entries: メモリに置く件数の上限（0でメモを無効にする）
+            directory: ディスクの保存先（Noneならメモリだけ）
+            max_disk_bytes: ディスクに保存する合計サイズの上限
+        """
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._store: Optional[AudioCache] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.configure(max_entries, directory, max_disk_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def configure(self, max_entries: int, directory: Optional[str] = None, max_disk_bytes: int = 20 * 1024 * 1024) -> None:
+        """上限と保存先を変更する（メモリ上のメモは空にする）"""
+        with self._lock:
+            self.max_entries = max_entries
+            self._entries.clear()
+        store = None
+        if max_entries > 0 and directory:
+            store = AudioCache(directory, max_disk_bytes, suffix=QUERY_SUFFIX, metric="voicevox_query_store")
+        self._store = store
+
+    @staticmethod
+    def key(text: str, speaker) -> str:
+        return cache_key(text, "voicevox_query", speaker)
+
+    def get(self, text: str, speaker, prosody: Optional[dict] = None, record: bool = True) -> Optional[dict]:
+        """
+        メモした audio_query の結果に韻律の変更を適用して返す
+
+        Args:
+            text: 読み上げるテキスト
+            speaker: 話者ID
+            prosody: 上書きする韻律のパラメータ（speedScale など）
+            record: ヒット率に数えるか（口パク用にモーラだけを引く場合などはFalse）
+
+        Returns:
+            Optional[dict]: audio_query の結果（メモになければNone）
+        """
+        if not self.enabled:
+            return None
+        key = self.key(text, speaker)
+        with self._lock:
+            query_data = self._entries.get(key)
+            if query_data is not None:
+                self._entries.move_to_end(key)
+        result = "hit"
+        if query_data is None and self._store is not None:
+            data = self._store.get(key)
+            if data is not None:
+                try:
+                    query_data = json.loads(data)
+                    result = "disk"
+                    self._remember(key, query_data)
+                except ValueError:
+                    query_data = None
+        if query_data is None:
+            result = "miss"
+        if record:
+            self._record(result)
+        return apply_prosody(query_data, prosody) if query_data is not None else None
+
+    def put(self, text: str, speaker, query_data: dict) -> None:
+        """audio_query が返したままの結果（韻律の変更前）をメモする"""
+        if not self.enabled:
+            return
+        key = self.key(text, speaker)
+        self._remember(key, query_data)
+        if self._store is not None:
+            self._store.put(key, json.dumps(query_data, ensure_ascii=False).encode("utf-8"))
+
+    def _remember(self, key: str, query_data: dict) -> None:
+        with self._lock:
+            self._entries[key] = query_data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            registry.gauge("voicevox_query_cache_entries", len(self._entries))
+
+    def _record(self, result: str) -> None:
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            elif result == "disk":
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            registry.gauge("voicevox_query_cache_hit_rate", self.hit_rate)
+        registry.inc("voicevox_query_cache", result=result)
+
+    @property
+    def hit_rate(self) -> float:
+        """メモリ・ディスクのどちらかにあった割合"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+# プロセス全体で共有するメモ（main で件数と保存先を設定する）
+query_cache = QueryCache()
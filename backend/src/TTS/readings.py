@@ -0,0 +1,149 @@
+"""
+キャラクターの読み方の辞書
+assets/characters/<名前>/data/<名前>_readings.tsv（表記<TAB>読み）を読み込み、全項目を1つの正規表現にまとめて
+テキストを1回走査するだけで置き換える（項目ごとに re.sub でテキスト全体を走査しない）。
+表記は共通の接頭辞でまとめた木構造の正規表現にするので、分岐の数は項目数ではなく文字の種類で決まり、
+同じ位置で複数の表記が一致する場合は最も長い表記を使う。ファイルが更新されたら次の置き換えの前に読み込み直す
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+DEFAULT_PATH = "assets/characters/Sample/data/Sample_readings.tsv"
+# ファイルの更新を確認する間隔（秒）
+CHECK_INTERVAL = 1.0
+
+
+def parse_readings(text: str, source: str = "") -> Dict[str, str]:
+    """
+    辞書ファイルの内容を {表記: 読み} にする（# で始まる行と空行は読み飛ばす）
+
+    Args:
+        text: ファイルの内容
+        source: 警告に表示するファイル名
+    """
+    readings = {}
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip("\r\n")
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        surface, sep, reading = line.partition("\t")
+        if not sep or not surface:
+            print(f"[読み方の辞書] {source}:{number} を読み飛ばしました（表記<TAB>読み の形式ではありません）")
+            continue
+        readings[surface] = reading.strip()
+    return readings
+
+
+def compile_readings(readings: Dict[str, str]) -> Optional[re.Pattern]:
+    """
+    表記を共通の接頭辞でまとめた1つの正規表現にする
+
+    Returns:
+        Optional[re.Pattern]: 表記のいずれかに一致する正規表現（辞書が空ならNone）
+    """
+    if not readings:
+        return None
+    # 文字ごとの木を作る（"" は表記の終わり）
+    trie: dict = {}
+    for surface in readings:
+        node = trie
+        for char in surface:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def to_regex(node: dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # 表記の終わりでも続きがあれば、量指定子の貪欲さで長い表記を先に試す
+        if terminal:
+            return f"(?:{body})?"
+        return body
+
+    return re.compile(to_regex(trie))
+
+
+class ReadingDictionary:
+    """ファイルの更新に追従する読み方の辞書"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, check_interval: float = CHECK_INTERVAL):
+        """
+        Args:
+            path: 辞書ファイル（Noneなら置き換えない。最初の置き換えのときに読み込む）
+            check_interval: ファイルの更新を確認する間隔（秒）
+        """
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # (正規表現, 表記 → 読み) を1つのタプルで差し替え、読み込み直し中の置き換えでも組がずれないようにする
+        self._compiled: Tuple[Optional[re.Pattern], Dict[str, str]] = (None, {})
+        self._mtime: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self.path = path
+
+    def configure(self, path: Optional[str]) -> None:
+        """辞書ファイルを変更して読み込む"""
+        with self._lock:
+            self.path = path
+            self._mtime = None
+            self._compiled = (None, {})
+            self._checked_at = None
+        self.reload_if_changed(force=True)
+
+    def __len__(self) -> int:
+        return len(self._compiled[1])
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """
+        ファイルの更新時刻が変わっていれば読み込み直す
+
+        Args:
+            force: 確認の間隔に関係なく更新時刻を確認する
+
+        Returns:
+            bool: 読み込み直したか
+        """
+        now = time.monotonic()
+        checked_at = self._checked_at
+        if not self.path or (not force and checked_at is not None and now - checked_at < self.check_interval):
+            return False
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                # 初回と、読み込めていたファイルが消えたときだけ知らせる
+                if self._mtime is not None or checked_at is None:
+                    print(f"[読み方の辞書] {self.path} が見つかりません（読み替えをしません）")
+                self._mtime = None
+                self._compiled = (None, {})
+                return False
+            if mtime == self._mtime:
+                return False
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    readings = parse_readings(f.read(), self.path)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"[読み方の辞書] {self.path} を読み込めませんでした: {e}")
+                return False
+            self._compiled = (compile_readings(readings), readings)
+            self._mtime = mtime
+        print(f"[読み方の辞書] {self.path} を読み込みました（{len(readings)}件）")
+        return True
+
+    def apply(self, text: str) -> str:
+        """テキストを1回走査して、辞書の表記を読みに置き換える"""
+        self.reload_if_changed()
+        pattern, readings = self._compiled
+        if pattern is None:
+            return text
+        return pattern.sub(lambda match: readings[match.group(0)], text)
+
+
+# プロセス全体で共有する辞書（main で辞書ファイルを設定する）
+reading_dictionary = ReadingDictionary()
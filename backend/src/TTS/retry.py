@@ -0,0 +1,145 @@
+"""
+音声合成エンジンへのリクエストの再試行と遮断
+待ち時間をジッター付きの指数バックオフで伸ばし、1回の発話の合成に締め切りを設ける。
+連続して失敗したらサーキットブレーカーを開いてすぐに失敗させ、裏で死活確認をして復帰したら閉じる
+（エンジンが落ちていても会話を止めず、字幕だけで続けられるようにする）
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from ..metrics.registry import registry
+
+
+class CircuitOpenError(ConnectionError):
+    """サーキットブレーカーが開いている（エンジンが停止中とみなしてリクエストしない）"""
+
+
+class DeadlineExceeded(ConnectionError):
+    """発話の合成の締め切りを過ぎた"""
+
+
+@dataclass
+class RetryPolicy:
+    """再試行の方針（VOICEVOX を単体で使う場合の試行回数の上限は呼び出し側の max_retry）"""
+    max_attempts: int = 3       # TTSRouter がすべてのエンジンを試し直す回数（1なら再試行しない）
+    base_delay: float = 0.2     # 1回目の再試行までの待ち時間の上限（秒）
+    max_delay: float = 2.0      # 待ち時間の上限（秒）
+    deadline: float = 30.0      # 1回の発話の合成の締め切り（秒。0以下なら設けない）
+    connect_timeout: float = 3.0
+    read_timeout: float = 60.0
+
+    def backoff(self, attempt: int) -> float:
+        """attempt 回目の失敗のあとの待ち時間（フルジッター: 0〜base×2^(attempt-1) の一様乱数）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def configure(self, deadline: Optional[float] = None, max_delay: Optional[float] = None) -> None:
+        if deadline is not None:
+            self.deadline = deadline
+        if max_delay is not None:
+            self.max_delay = max_delay
+
+
+class Deadline:
+    """1回の発話の合成の締め切り（文ごとのリクエストで共有する）"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds if seconds > 0 else None
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, policy: RetryPolicy):
+        """
+        requests に渡すタイムアウト（締め切りまでの残りで頭打ちにする）
+
+        Raises:
+            DeadlineExceeded: 締め切りを過ぎている場合
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("音声合成の締め切りを過ぎました")
+        return (min(policy.connect_timeout, remaining), min(policy.read_timeout, remaining))
+
+
+class CircuitBreaker:
+    """連続した失敗でリクエストを遮断し、裏の死活確認で復帰を検出する"""
+
+    def __init__(self, name: str, probe: Callable[[], None], failure_threshold: int = 3, probe_interval: float = 5.0):
+        """
+        Args:
+            name: エンジン名（計測値のラベル）
+            probe: 死活確認の関数（失敗したら例外を送出する）
+            failure_threshold: ブレーカーを開く連続失敗の回数
+            probe_interval: ブレーカーが開いている間の死活確認の間隔（秒）
+        """
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open = False
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        registry.gauge("circuit_open", 0, engine=name)
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def check(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: ブレーカーが開いている場合
+        """
+        if self._open:
+            registry.inc("circuit_rejected", engine=self.name)
+            raise CircuitOpenError(f"{self.name} は停止中のため合成をスキップします")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._open or self._failures < self.failure_threshold:
+                return
+            self._open = True
+            self._stop.clear()
+            self._prober = threading.Thread(target=self._probe_loop, name=f"{self.name}-breaker-probe", daemon=True)
+            self._prober.start()
+        registry.inc("circuit_breaker", engine=self.name, state="open")
+        registry.gauge("circuit_open", 1, engine=self.name)
+        print(f"[{self.name}] {self.failure_threshold}回続けて失敗したため、復帰するまで合成をスキップします")
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception:
+                continue
+            self._close()
+            return
+
+    def _close(self) -> None:
+        with self._lock:
+            self._open = False
+            self._failures = 0
+        registry.inc("circuit_breaker", engine=self.name, state="closed")
+        registry.gauge("circuit_open", 0, engine=self.name)
+        print(f"[{self.name}] 復帰したため合成を再開します")
+
+    def close(self) -> None:
+        """死活確認を止める"""
+        self._stop.set()
+
+
+# プロセス全体で共有する再試行の方針（main で締め切りを設定する）
+retry_policy = RetryPolicy()
@@ -0,0 +1,121 @@
+"""
+文単位の音声合成パイプライン
+ストリーミングで届く応答を文ごとに音声合成し、生成順に再生キューへ積む
+"""
+
+import contextvars
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from ..metrics.registry import TurnContextExecutor
+
+# 文末記号の直後で区切る（「！？」や「。」」のような連続記号の途中では区切らない）
+SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？!?\n])(?=[^。！？!?\n」』）)])")
+
+
+class SentenceBuffer:
+    """ストリーミングで届くテキストを文単位に区切るバッファ"""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        チャンクを追加し、確定した文を返す
+
+        Args:
+            chunk: 新しく届いたテキスト
+
+        Returns:
+            List[str]: 確定した文のリスト（未完の末尾はバッファに残る）
+        """
+        self._pending += chunk
+        parts = SENTENCE_BOUNDARY.split(self._pending)
+        self._pending = parts.pop()
+        return [part for part in parts if part.strip()]
+
+    def flush(self) -> Optional[str]:
+        """バッファに残った末尾のテキストを返して空にする"""
+        rest, self._pending = self._pending, ""
+        return rest if rest.strip() else None
+
+
+class SpeechPipeline:
+    """文ごとの音声合成と、生成順での再生を行うパイプライン"""
+
+    def __init__(
+        self,
+        synthesize: Callable[[str, str], Tuple[float, Optional[str]]],
+        play: Callable[[str, Optional[str], Optional[str]], None],
+        output_path: str = "backend/src/voice/voice.wav",
+        max_workers: int = 2,
+        playback_margin: float = 0.3,
+    ):
+        """
+        Args:
+            synthesize: (テキスト, 保存先パス) を受け取り、(再生時間（秒）, 発話ID) を返す合成関数。
+                VRMサーバーに音声を登録した場合は発話IDを返し、ファイルに保存した場合はNoneを返す
+            play: (テキスト, 発話ID, ターンID) を受け取る再生指示関数。文の音声が再生できる状態になった直後に呼ばれる
+                （再生はターンの終了後も続くので、speak に渡したターンIDで、どのターンの文かを見分ける）
+            output_path: フロントエンドが読み込む音声ファイルのパス
+            max_workers: 同時に合成する文の数
+            playback_margin: 文と文の間に空ける再生待ち時間（秒）
+        """
+        self.synthesize = synthesize
+        self.play = play
+        self.output_path = output_path
+        self.playback_margin = playback_margin
+        self._executor = TurnContextExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._playback_queue: "queue.Queue" = queue.Queue()
+        self._counter = itertools.count()
+        self._player = threading.Thread(target=self._playback_loop, daemon=True)
+        self._player.start()
+
+    def speak(self, sentence: str, turn_id: Optional[str] = None) -> Future:
+        """
+        文の音声合成を開始し、再生キューに追加する
+
+        Args:
+            sentence: 読み上げる文
+            turn_id: 文を生成したターンのID（そのまま play に渡す）
+
+        Returns:
+            Future: 合成完了時に (再生時間（秒）, 発話ID) を返すFuture
+        """
+        root, ext = os.path.splitext(self.output_path)
+        segment_path = f"{root}_{next(self._counter)}{ext}"
+        future = self._executor.submit(self.synthesize, sentence, segment_path)
+        # 再生の指示は speak を呼んだターンのコンテキストで行う（計測値を再生中のターンに混ぜない）
+        self._playback_queue.put((sentence, segment_path, future, turn_id, contextvars.copy_context()))
+        return future
+
+    def _playback_loop(self) -> None:
+        """合成済みの文を生成順に再生する"""
+        while True:
+            item = self._playback_queue.get()
+            if item is None:
+                break
+            sentence, segment_path, future, turn_id, context = item
+            try:
+                duration, utterance_id = future.result()
+            except Exception as e:
+                print(f"[TTS] 文の音声合成に失敗しました: {e}")
+                continue
+
+            if utterance_id is None:
+                # 再生中のファイルを書き換えないよう、前の文の再生が終わってから差し替える
+                os.replace(segment_path, self.output_path)
+            context.run(self.play, sentence, utterance_id, turn_id)
+            time.sleep(duration + self.playback_margin)
+
+    def shutdown(self) -> None:
+        """キューに残った文を再生し終えてから停止する"""
+        self._playback_queue.put(None)
+        self._player.join()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,100 @@
+"""
+WAVのバイト列をデコードせずに扱うための補助関数
+エンジンが返したWAVはヘッダーだけを読んで再生時間を求め、音量の変更はPCMの部分をint16のmemoryviewとしてその場で書き換える
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Union
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# 音量変更で一度に処理するサンプル数（作業用の配列をこの大きさに抑える）
+GAIN_BLOCK_SAMPLES = 65536
+
+
+@dataclass
+class WavInfo:
+    """WAVヘッダーの内容"""
+    audio_format: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int  # PCMの先頭の位置
+    data_size: int    # PCMのバイト数
+
+    @property
+    def is_pcm16(self) -> bool:
+        return self.audio_format in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) and self.bits_per_sample == 16
+
+    @property
+    def duration(self) -> float:
+        """再生時間（秒）"""
+        return self.data_size / (self.channels * self.bits_per_sample // 8 * self.sample_rate)
+
+
+def parse_wav_header(data: Union[bytes, bytearray, memoryview]) -> WavInfo:
+    """
+    RIFFのチャンクをたどって fmt と data の位置を読む
+
+    Raises:
+        ValueError: WAVとして読めない場合
+    """
+    if len(data) < 12 or bytes(data[0:4]) != b"RIFF" or bytes(data[8:12]) != b"WAVE":
+        raise ValueError("WAVではありません")
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(data[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", data, body)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("fmtチャンクがありません")
+            audio_format, channels, sample_rate, _, _, bits_per_sample = fmt
+            # ストリーミング出力などでサイズが未確定（0や上限値）の場合は末尾までをPCMとみなす
+            size = min(chunk_size, len(data) - body) if chunk_size else len(data) - body
+            return WavInfo(audio_format, channels, sample_rate, bits_per_sample, body, size)
+        offset = body + chunk_size + (chunk_size & 1)
+    raise ValueError("dataチャンクがありません")
+
+
+def build_wav_header(channels: int, sample_rate: int, sample_width: int, data_size: int) -> bytes:
+    """16bitなどの整数PCM用の44バイトのWAVヘッダー"""
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, WAVE_FORMAT_PCM, channels, sample_rate,
+        sample_rate * block_align, block_align, sample_width * 8, b"data", data_size,
+    )
+
+
+def apply_gain(buffer: Union[bytearray, memoryview], volume_gain: float) -> None:
+    """16bitのPCMの音量をその場で増幅する（クリッピング対策で16bitの範囲に収める）"""
+    if volume_gain == 1.0:
+        return
+    samples = np.frombuffer(memoryview(buffer).cast("B").cast("h"), dtype=np.int16)
+    gain = np.float32(volume_gain)
+    for start in range(0, len(samples), GAIN_BLOCK_SAMPLES):
+        block = samples[start:start + GAIN_BLOCK_SAMPLES]
+        np.copyto(block, np.clip(block * gain, -32768, 32767), casting="unsafe")
+
+
+def apply_gain_to_wav(wav: bytearray, volume_gain: float) -> WavInfo:
+    """
+    WAV全体のバイト列のうち、PCMの部分だけの音量をその場で変更する
+
+    Raises:
+        ValueError: 16bitのPCMではない場合
+    """
+    info = parse_wav_header(wav)
+    if volume_gain != 1.0:
+        if not info.is_pcm16:
+            raise ValueError(f"16bitのPCMのみ対応しています（format={info.audio_format}, bits={info.bits_per_sample}）")
+        size = info.data_size - info.data_size % 2
+        apply_gain(memoryview(wav)[info.data_offset:info.data_offset + size], volume_gain)
+    return info
@@ -0,0 +1,172 @@
+"""
+コンポーネントの遅延読み込み
+重いモジュール（Geminiのモデル生成、Quartz/AppKit、wikipedia、openai など）を初回利用時に読み込むか、
+バックグラウンドで並行して事前に読み込む。任意の依存が入っていない場合はそのコンポーネントだけを無効にして起動を続ける
+"""
+
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from ..metrics.registry import registry
+
+
+class ComponentUnavailable(RuntimeError):
+    """任意のコンポーネントが読み込めなかった（依存ライブラリがない・対応していない環境など）"""
+
+    def __init__(self, name: str, error: BaseException):
+        super().__init__(f"{name} は利用できません: {error}")
+        self.name = name
+        self.error = error
+
+
+@dataclass
+class ComponentStatus:
+    """コンポーネントの読み込み状況"""
+    name: str
+    state: str = "pending"   # pending / loading / ready / unavailable / failed
+    seconds: float = 0.0     # import とモジュールの初期化にかかった時間
+    loaded_by: str = ""      # 読み込んだスレッド名（warmup / 初回利用）
+    error: str = ""
+
+
+class LazyComponent:
+    """初回の get() で読み込まれるコンポーネント"""
+
+    def __init__(self, name: str, loader: Union[str, Callable[[], Any]], optional: bool = False, warm: bool = True):
+        """
+        Args:
+            name: コンポーネント名
+            loader: モジュールのパス（"src.LLM.translator" など）、または読み込み関数
+            optional: Trueなら読み込みに失敗しても起動を続ける（get() は ComponentUnavailable を送出）
+            warm: バックグラウンドの事前読み込みの対象にするか
+        """
+        self.name = name
+        self.loader = loader
+        self.optional = optional
+        self.warm = warm
+        self.status = ComponentStatus(name)
+        self._value: Any = None
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Any:
+        if isinstance(self.loader, str):
+            return importlib.import_module(self.loader)
+        return self.loader()
+
+    def get(self) -> Any:
+        """コンポーネントを返す（未読み込みならこのスレッドで読み込み、読み込み中なら完了を待つ）"""
+        with self._lock:
+            if self.status.state == "ready":
+                return self._value
+            if self.status.state == "pending":
+                self.status.state = "loading"
+                self.status.loaded_by = threading.current_thread().name
+                start = time.perf_counter()
+                try:
+                    self._value = self._load()
+                    self.status.state = "ready"
+                except Exception as e:
+                    self._error = e
+                    self.status.error = f"{type(e).__name__}: {e}"
+                    self.status.state = "unavailable" if self.optional else "failed"
+                finally:
+                    self.status.seconds = time.perf_counter() - start
+                    registry.gauge("component_init_seconds", self.status.seconds, component=self.name)
+                    registry.inc("component_loads", component=self.name, state=self.status.state)
+
+            if self.status.state == "ready":
+                return self._value
+            if self.optional:
+                raise ComponentUnavailable(self.name, self._error)
+            raise self._error
+
+
+class ComponentRegistry:
+    """名前でコンポーネントを登録・取得する"""
+
+    def __init__(self):
+        self._components: Dict[str, LazyComponent] = {}
+        self._lock = threading.Lock()
+        self._warmup_executor: Optional[ThreadPoolExecutor] = None
+        self._warmup_futures: List = []
+
+    def register(self, name: str, loader: Union[str, Callable[[], Any]], optional: bool = False, warm: bool = True) -> None:
+        """コンポーネントを登録（同名がすでにあれば何もしない）"""
+        with self._lock:
+            if name not in self._components:
+                self._components[name] = LazyComponent(name, loader, optional=optional, warm=warm)
+
+    def get(self, name: str) -> Any:
+        """
+        コンポーネントを取得する
+
+        Raises:
+            ComponentUnavailable: 任意のコンポーネントが読み込めなかった場合
+        """
+        return self._components[name].get()
+
+    def available(self, name: str) -> bool:
+        """コンポーネントが利用できるか（未読み込みならこの場で読み込む）"""
+        try:
+            self.get(name)
+            return True
+        except ComponentUnavailable:
+            return False
+
+    def loaded(self, name: str) -> bool:
+        """読み込み済みか（読み込みは始めない）"""
+        return self._components[name].status.state == "ready"
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, max_workers: int = 4) -> None:
+        """
+        コンポーネントをバックグラウンドで並行して読み込む
+
+        Args:
+            names: 読み込むコンポーネント（省略時は warm=True のものすべて）。先に並べたものから読み込む
+            max_workers: 同時に読み込む数
+        """
+        if names is None:
+            names = [name for name, component in self._components.items() if component.warm]
+        if self._warmup_executor is None:
+            self._warmup_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup")
+        for name in names:
+            self._warmup_futures.append(self._warmup_executor.submit(self._warm_one, name))
+
+    def _warm_one(self, name: str) -> None:
+        try:
+            self.get(name)
+        except Exception:
+            pass  # 失敗は status に記録済み。必須コンポーネントなら利用時に改めて例外になる
+
+    def wait_warm_up(self, timeout: Optional[float] = None) -> None:
+        """事前読み込みの完了を待つ"""
+        if self._warmup_futures:
+            wait(self._warmup_futures, timeout=timeout)
+
+    def statuses(self) -> List[ComponentStatus]:
+        return [component.status for component in self._components.values()]
+
+    def report(self) -> str:
+        """コンポーネントごとの読み込み時間と状態の一覧"""
+        lines = ["[コンポーネント] 読み込み状況:"]
+        for status in sorted(self.statuses(), key=lambda s: -s.seconds):
+            line = f"  {status.name:<20} {status.state:<12} {status.seconds:6.2f}秒"
+            if status.loaded_by:
+                line += f"  ({status.loaded_by})"
+            if status.error:
+                line += f"  {status.error}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def shutdown(self) -> None:
+        if self._warmup_executor is not None:
+            self._warmup_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# プロセス全体で共有するコンポーネント一覧
+components = ComponentRegistry()
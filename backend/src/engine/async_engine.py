@@ -0,0 +1,387 @@
+"""
+asyncioベースの会話エンジン
+ブロッキングなGemini呼び出しとrequestsをスレッドプールに投げる代わりに、
+非同期のGemini呼び出しとaiohttpで独立したステージを1つのイベントループ上で重ね合わせる
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import aiohttp
+
+from src.LLM.conversation import send_message_async, send_message_with_image_async
+from src.LLM.conversation import generate_detached_async, commit_detached
+from src.LLM.translator import translator_async
+from src.LLM.task_classifier import task_classifier_async, process_task_result
+from src.LLM.image_requirement import image_requirement_detector_async
+from src.LLM.emotion_analyzer import emotion_analyzer_async
+from src.LLM.mood_analyzer import mood_analyzer_async
+from src.LLM.turn_analyzer import analyze_input_async, analyze_output_async
+from src.TTS.engines import save_wavefile_async, synthesize_wav_async
+from src.vrm_control.vrm_controller import AsyncVRMController, VRMController
+from src.metrics.registry import registry
+
+
+@dataclass
+class StageTimeouts:
+    """ステージごとのタイムアウト（秒）"""
+    task_classification: float = 15.0
+    image_requirement: float = 15.0
+    response_generation: float = 60.0
+    translation: float = 20.0
+    emotion_analysis: float = 15.0
+    mood_value_analysis: float = 15.0
+    voice_synthesis: float = 60.0
+    turn_input_analysis: float = 15.0
+    turn_output_analysis: float = 20.0
+
+
+# ステージ名 → ログ表示名（ConversationMetricsのフィールドは「ステージ名_time」）
+STAGE_LABELS = {
+    "task_classification": "タスク判定",
+    "image_requirement": "画像必要性判定",
+    "response_generation": "応答生成",
+    "translation": "翻訳",
+    "emotion_analysis": "感情分析",
+    "mood_value_analysis": "ご機嫌度診断",
+    "voice_synthesis": "音声合成",
+    "turn_input_analysis": "応答前分析",
+    "turn_output_analysis": "応答後分析",
+}
+
+_REQUIRED = object()
+
+
+class AsyncConversationEngine:
+    """VRMAITuberSystemの非同期会話エンジン"""
+
+    def __init__(
+        self,
+        metrics: Any,
+        vrm_controller: VRMController,
+        timer_callback: Callable[[int], None],
+        on_first_audio: Callable[[], None],
+        timeouts: Optional[StageTimeouts] = None,
+        fused_analyzer: bool = False,
+        local_task_matcher: bool = False,
+        speculation_stats: Any = None,
+        max_blocking_threads: int = 2,
+        max_connections: int = 8,
+        audio_endpoint: bool = True,
+        lipsync_track: bool = True,
+        on_timer_set: Optional[Callable[[float], None]] = None,
+    ):
+        """
+        Args:
+            metrics: ステージごとの時間を書き込むConversationMetrics
+            vrm_controller: 感情マッピングとサーバー可否を共有する同期版コントローラ
+            timer_callback: タイマー終了時のコールバック
+            on_first_audio: 音声再生指示の直前に呼ばれるコールバック
+            timeouts: ステージごとのタイムアウト
+            fused_analyzer: 応答前・応答後の分析をそれぞれ1回のAPI呼び出しにまとめるか
+            local_task_matcher: タスク判定をまずローカル判定器で試すか
+            speculation_stats: 投機的応答生成を行う場合の集計先（Noneなら投機実行しない）
+            max_blocking_threads: スクリーンショットやタスク実行などブロッキング処理用のスレッド数
+            max_connections: aiohttpの同時接続数の上限
+            audio_endpoint: 音声をファイルに書かずにVRMサーバーへ登録して配信するか
+            lipsync_track: 口パク用のトラックを音声と一緒に配信するか
+            on_timer_set: タイマーをセットしたときのコールバック（終了のお知らせの事前生成用）
+        """
+        self.metrics = metrics
+        self.vrm_controller = vrm_controller
+        self.timer_callback = timer_callback
+        self.on_first_audio = on_first_audio
+        self.timeouts = timeouts or StageTimeouts()
+        self.fused_analyzer = fused_analyzer
+        self.local_task_matcher = local_task_matcher
+        self.speculation_stats = speculation_stats
+        self.max_blocking_threads = max_blocking_threads
+        self.max_connections = max_connections
+        self.audio_endpoint = audio_endpoint
+        self.lipsync_track = lipsync_track
+        self.on_timer_set = on_timer_set
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.vrm: Optional[AsyncVRMController] = None
+        self._blocking_executor: Optional[ThreadPoolExecutor] = None
+        self._current_turn: Optional[asyncio.Task] = None
+        self._cancel_requested = False
+
+    async def start(self) -> None:
+        """イベントループ上の資源（接続プール・ブロッキング処理用スレッド）を準備"""
+        loop = asyncio.get_running_loop()
+        self._blocking_executor = ThreadPoolExecutor(
+            max_workers=self.max_blocking_threads, thread_name_prefix="aituber-blocking"
+        )
+        loop.set_default_executor(self._blocking_executor)
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(connector=connector)
+        self.vrm = AsyncVRMController(self.vrm_controller, self.session)
+
+    async def close(self) -> None:
+        """進行中のターンを取り消し、接続を閉じる"""
+        self.cancel()
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def cancel(self) -> bool:
+        """
+        進行中のターンを取り消す（ターンの処理中に Ctrl-C を押したときと、終了時の close から呼ばれる）
+
+        Returns:
+            bool: 取り消すターンがあったかどうか
+        """
+        if self._current_turn and not self._current_turn.done():
+            self._cancel_requested = True
+            self._current_turn.cancel()
+            return True
+        return False
+
+    async def _stage(self, name: str, awaitable: Awaitable, fallback: Any = _REQUIRED) -> Any:
+        """
+        1ステージをタイムアウト付きで実行し、所要時間を記録する
+        失敗・タイムアウト時はfallbackを返す（fallback未指定の場合は例外をそのまま送出）
+        """
+        start = time.time()
+        try:
+            return await asyncio.wait_for(awaitable, getattr(self.timeouts, name))
+        except asyncio.TimeoutError:
+            print(f"[async] {STAGE_LABELS[name]}がタイムアウトしました（{getattr(self.timeouts, name)}秒）")
+            registry.inc("timeouts", stage=name)
+            if fallback is _REQUIRED:
+                raise
+            return fallback
+        except Exception as e:
+            print(f"[async] {STAGE_LABELS[name]}でエラーが発生しました: {e}")
+            registry.inc("errors", stage=name)
+            if fallback is _REQUIRED:
+                raise
+            return fallback
+        finally:
+            elapsed = time.time() - start
+            setattr(self.metrics, f"{name}_time", elapsed)
+            registry.observe(name, elapsed, label=STAGE_LABELS[name])
+
+    async def _generate_response(self, prompt: str, use_image: bool, capture_screenshot: Callable[[], Optional[str]]) -> str:
+        """AI応答の生成（スクリーンショットはスレッドで撮影。撮影できなければ画像なしで応答）"""
+        image_path = await asyncio.to_thread(capture_screenshot) if use_image else None
+        if image_path:
+            return await send_message_with_image_async(prompt, image_path)
+        return await send_message_async(prompt)
+
+    async def _classify(self, user_input: str) -> Tuple[bool, str, bool]:
+        """タスク分類と画像必要性検出を同時に実行（統合分析器が使えれば1回で）"""
+        if self.fused_analyzer:
+            analysis = await self._stage("turn_input_analysis", analyze_input_async(user_input), None)
+            if analysis is not None:
+                is_task_matched, hint = await asyncio.to_thread(
+                    process_task_result, analysis["task"], self.timer_callback, self.on_timer_set
+                )
+                return is_task_matched, hint, analysis["image_required"]
+            print("[統合分析] 個別判定に切り替えます")
+
+        (is_task_matched, hint), is_image_requirement = await asyncio.gather(
+            self._stage(
+                "task_classification",
+                task_classifier_async(
+                    user_input,
+                    timer_callback=self.timer_callback,
+                    use_local_matcher=self.local_task_matcher,
+                    on_timer_set=self.on_timer_set,
+                ),
+                (False, ""),
+            ),
+            self._stage("image_requirement", image_requirement_detector_async(user_input), False),
+        )
+        return is_task_matched, hint, is_image_requirement
+
+    async def _finish_turn(self, user_input: str, response: str) -> str:
+        """
+        応答後の分析・音声合成とVRM・UIの更新
+
+        翻訳・感情分析・ご機嫌度診断・音声合成を同時に走らせ、
+        そろった時点で表情・モーション・ご機嫌度・字幕・音声再生を1回のリクエストでまとめて送信する
+        音声合成に失敗した場合は字幕のみで続行する
+        """
+        voice = asyncio.ensure_future(
+            self._stage("voice_synthesis", self._synthesize_voice(response), None)
+        )
+        en_res, emotion, mood_value = await self._analyze_response(user_input, response)
+        voice_result = await voice
+
+        print("AI:\n", response)
+        print("Eng:\n", en_res)
+
+        if voice_result is not None:
+            self.on_first_audio()
+        await self.vrm.apply_state(
+            expression=emotion,
+            emotion=emotion,
+            mood_value=mood_value,
+            subtitle=(response, en_res),
+            play_voice=voice_result is not None,
+            utterance_id=voice_result[1] if voice_result else None,
+        )
+        return en_res
+
+    async def _synthesize_voice(self, text: str) -> Tuple[float, Optional[str]]:
+        """
+        音声合成（VRMサーバーに登録できればファイルに書かない）
+
+        Returns:
+            (duration, utterance_id): 再生時間（秒）と発話ID（ファイルに保存した場合はNone）
+        """
+        if self.audio_endpoint and self.vrm_controller.server_available:
+            try:
+                wav, info, track = await synthesize_wav_async(self.session, text, self.lipsync_track)
+            except ValueError:
+                pass  # 16bitのPCM以外はファイル経由で再生する
+            else:
+                utterance_id = await self.vrm.send_audio(wav, info, lipsync=track.to_dict() if track else None)
+                if utterance_id:
+                    return info.duration, utterance_id
+        return await save_wavefile_async(self.session, text), None
+
+    async def _analyze_response(self, user_input: str, response: str) -> Tuple[str, str, int]:
+        """翻訳・感情分析・ご機嫌度診断（統合分析器が使えれば1回で）"""
+        if self.fused_analyzer:
+            analysis = await self._stage(
+                "turn_output_analysis", analyze_output_async(user_input, response), None
+            )
+            if analysis is not None:
+                return analysis["translation"], analysis["emotion"], analysis["mood"]
+            print("[統合分析] 個別分析に切り替えます")
+
+        return await asyncio.gather(
+            self._stage("translation", translator_async(response), ""),
+            self._stage("emotion_analysis", emotion_analyzer_async(response), "normal"),
+            self._stage("mood_value_analysis", mood_analyzer_async(user_input, response), 50),
+        )
+
+    async def _speculate(self, user_input: str):
+        """履歴を変更せずに通常の応答を生成（投機実行用）"""
+        start = time.time()
+        response, base_length = await generate_detached_async(user_input)
+        return response, base_length, time.time() - start
+
+    async def _resolve_speculation(self, speculation: asyncio.Task, spec_start: float, user_input: str, usable: bool) -> Optional[str]:
+        """
+        投機的に生成した応答を採用するか取り消すかを決める
+
+        Returns:
+            Optional[str]: 採用した応答。取り消した場合はNone（通常の応答生成に進む）
+        """
+        classified_at = time.time()
+        self.speculation_stats.attempts += 1
+
+        if not usable:
+            speculation.cancel()
+            print("[投機実行] タスクまたは画像が必要なため投機応答を取り消しました")
+            registry.inc("speculation", result="discarded")
+            return None
+
+        try:
+            response, base_length, generation_time = await asyncio.wait_for(
+                speculation, self.timeouts.response_generation
+            )
+            text = response.text
+        except Exception as e:
+            print(f"[投機実行] 投機応答の生成に失敗しました: {e}")
+            registry.inc("errors", stage="speculation")
+            return None
+
+        if not commit_detached(user_input, response, base_length):
+            print("[投機実行] 生成中に履歴が更新されたため投機応答を破棄しました")
+            registry.inc("speculation", result="conflict")
+            return None
+
+        saved = max(0.0, (classified_at - spec_start) + generation_time - (time.time() - spec_start))
+        self.speculation_stats.hits += 1
+        self.speculation_stats.total_saved_time += saved
+        self.metrics.response_generation_time = generation_time
+        self.metrics.speculation_saved_time = saved
+        registry.inc("speculation", result="hit")
+        registry.observe("response_generation", generation_time, label="応答生成（投機実行）")
+        registry.observe("speculation_saved", saved, label="投機実行で短縮した時間")
+        return text
+
+    async def _run_turn(self, user_input: str, capture_screenshot: Callable[[], Optional[str]]) -> str:
+        speculation = None
+        if self.speculation_stats is not None:
+            spec_start = time.time()
+            speculation = asyncio.ensure_future(self._speculate(user_input))
+            # 破棄した投機実行の例外が未回収の警告にならないようにする
+            speculation.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+        try:
+            is_task_matched, hint, is_image_requirement = await self._classify(user_input)
+        except BaseException:
+            if speculation:
+                speculation.cancel()
+            raise
+
+        if is_task_matched:
+            prompt = f"【{hint}これを踏まえて次のメッセージに返答して。】\n\n{user_input}"
+        else:
+            prompt = user_input
+
+        response = None
+        if speculation:
+            response = await self._resolve_speculation(
+                speculation, spec_start, user_input, usable=not is_task_matched and not is_image_requirement
+            )
+        if response is None:
+            response = await self._stage(
+                "response_generation",
+                self._generate_response(prompt, is_image_requirement, capture_screenshot),
+            )
+        await self._finish_turn(prompt, response)
+        return response
+
+    async def _run_greeting(self, prompt: str) -> str:
+        response = await self._stage("response_generation", send_message_async(prompt))
+        await self._finish_turn("", response)
+        return response
+
+    async def _track(self, coro: Awaitable) -> Any:
+        """ターンをタスクとして実行し、cancel()で取り消せるようにする"""
+        self._current_turn = asyncio.ensure_future(coro)
+        try:
+            return await self._current_turn
+        except asyncio.CancelledError:
+            # cancel()による取り消しだけを吸収し、ループ自体の停止はそのまま伝える
+            if not self._cancel_requested:
+                raise
+            print("[async] 会話処理を取り消しました")
+            return None
+        finally:
+            self._cancel_requested = False
+            self._current_turn = None
+
+    async def process_conversation(self, user_input: str, capture_screenshot: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        一回の会話処理（非同期版）
+
+        Args:
+            user_input: ユーザーの入力
+            capture_screenshot: スクリーンショットを撮影して画像パスを返す関数
+
+        Returns:
+            Optional[str]: 応答。取り消し・失敗時はNone
+        """
+        try:
+            return await self._track(self._run_turn(user_input, capture_screenshot))
+        except Exception as e:
+            print(f"[async] 会話処理に失敗しました: {e}")
+            return None
+
+    async def greeting(self, prompt: str) -> Optional[str]:
+        """起動時の挨拶（非同期版）"""
+        try:
+            return await self._track(self._run_greeting(prompt))
+        except Exception as e:
+            print(f"[async] 挨拶に失敗しました: {e}")
+            return None
@@ -0,0 +1,185 @@
+"""
+定型の発話の事前生成キュー
+タイマー終了のお知らせ・起動時の挨拶・お別れの挨拶のように、話す前から分かっている発話を
+優先度の低い1本のスレッドで先に生成しておく（応答・英訳・感情・音声をまとめた束）。
+生成は段階ごとに区切り、会話のターンの間は次の段階に進まずに待つので、対話の応答を遅らせない。
+発話するときは生成済みの束を取り出してすぐに再生し、間に合わなければ生成を取り消して従来どおりその場で生成する
+"""
+
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from ..metrics.registry import registry
+
+# ターンが終わらないまま止まり続けないよう、1回の一時停止で待つ上限（秒）
+MAX_PAUSE = 60.0
+
+
+class PreRenderCancelled(Exception):
+    """事前生成が取り消された"""
+
+
+@dataclass
+class UtteranceBundle:
+    """事前生成した発話（応答・英訳・感情・音声）"""
+    key: str
+    prompt: str                      # LLMに送ったプロンプト（発話するときに履歴に追加する）
+    response: Any                    # LLMの応答（履歴に追加する）
+    text: str
+    translation: str
+    emotion: str = "normal"
+    mood_value: Optional[int] = None
+    audio: Any = None                # (wav, WavInfo, LipSyncTrack) 。合成できなければNone
+    created_at: float = field(default_factory=time.time)
+    expires_at: Optional[float] = None
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.time() > self.expires_at
+
+
+@dataclass(eq=False)
+class _Job:
+    key: str
+    render: Callable[[Callable[[], None]], UtteranceBundle]
+    max_age: Optional[float]
+    cancelled: bool = False
+
+
+class PreRenderQueue:
+    """定型の発話を裏で先に生成しておくキュー"""
+
+    def __init__(self, max_pause: float = MAX_PAUSE):
+        """
+        Args:
+            max_pause: 会話のターンの間に生成を待つ上限（秒）
+        """
+        self.max_pause = max_pause
+        self._lock = threading.Lock()
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._jobs: Dict[str, List[_Job]] = {}
+        self._ready: Dict[str, List[UtteranceBundle]] = {}
+        self._interactive = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, key: str, render: Callable[[Callable[[], None]], UtteranceBundle], priority: int = 0, max_age: Optional[float] = None) -> None:
+        """
+        発話の事前生成を予約する（同じキーで複数予約した場合は、取り出すたびに古いものから使う）
+
+        Args:
+            key: 発話の種類（"timer" など）
+            render: 段階の区切りで checkpoint() を呼びながら束を生成する関数
+            priority: 小さいほど先に生成する
+            max_age: 生成してから使えるまでの秒数（Noneなら無期限）
+        """
+        job = _Job(key, render, max_age)
+        with self._lock:
+            self._jobs.setdefault(key, []).append(job)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="prerender", daemon=True)
+                self._worker.start()
+        self._queue.put((priority, next(self._counter), job))
+        registry.inc("prerender", result="submitted", kind=key)
+
+    def take(self, key: str) -> Optional[UtteranceBundle]:
+        """
+        生成済みの束を取り出す（まだ生成中なら、その予約を取り消してNoneを返す）
+
+        Returns:
+            Optional[UtteranceBundle]: 生成済みの束（なければNone。呼び出し側でその場で生成する）
+        """
+        with self._lock:
+            bundles = self._ready.get(key) or []
+            while bundles:
+                bundle = bundles.pop(0)
+                if not bundle.expired:
+                    registry.inc("prerender", result="hit", kind=key)
+                    return bundle
+                registry.inc("prerender", result="expired", kind=key)
+            jobs = self._jobs.get(key) or []
+            if jobs:
+                jobs.pop(0).cancelled = True
+        registry.inc("prerender", result="miss", kind=key)
+        return None
+
+    def pending(self, key: str) -> int:
+        """予約中・生成済みの件数"""
+        with self._lock:
+            return len(self._jobs.get(key) or []) + len(self._ready.get(key) or [])
+
+    def begin_interactive(self) -> None:
+        """会話のターンの開始（終わるまで事前生成を次の段階に進めない）"""
+        with self._lock:
+            self._interactive += 1
+            self._idle.clear()
+
+    def end_interactive(self) -> None:
+        """会話のターンの終了"""
+        with self._lock:
+            self._interactive = max(0, self._interactive - 1)
+            if not self._interactive:
+                self._idle.set()
+
+    def _checkpoint(self, job: _Job) -> None:
+        """
+        段階の区切り（ターンの間は待ち、取り消されていれば中断する）
+
+        Raises:
+            PreRenderCancelled: 予約が取り消された場合
+        """
+        if job.cancelled:
+            raise PreRenderCancelled(job.key)
+        if not self._idle.is_set():
+            start = time.time()
+            self._idle.wait(self.max_pause)
+            registry.observe("prerender_yield", time.time() - start)
+        if job.cancelled:
+            raise PreRenderCancelled(job.key)
+
+    def _run(self) -> None:
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            if job.cancelled:
+                continue
+            start = time.time()
+            try:
+                bundle = job.render(lambda: self._checkpoint(job))
+            except PreRenderCancelled:
+                registry.inc("prerender", result="cancelled", kind=job.key)
+                continue
+            except Exception as e:
+                # 生成できなかった発話は、発話するときにその場で生成する
+                print(f"[事前生成] {job.key} の生成に失敗しました: {e}")
+                registry.inc("errors", stage="prerender")
+                self._finish(job, None)
+                continue
+            registry.observe("prerender_render", time.time() - start)
+            if job.max_age is not None:
+                bundle.expires_at = time.time() + job.max_age
+            self._finish(job, bundle)
+
+    def _finish(self, job: _Job, bundle: Optional[UtteranceBundle]) -> None:
+        with self._lock:
+            jobs = self._jobs.get(job.key) or []
+            if job in jobs:
+                jobs.remove(job)
+            if bundle is not None and not job.cancelled:
+                self._ready.setdefault(job.key, []).append(bundle)
+
+    def close(self) -> None:
+        """予約を取り消して生成スレッドを止める"""
+        with self._lock:
+            for jobs in self._jobs.values():
+                for job in jobs:
+                    job.cancelled = True
+            self._idle.set()
+        self._queue.put((float("-inf"), -1, None))
@@ -0,0 +1,281 @@
+"""
+パフォーマンス計測の集計
+ステージごとのローリングヒストグラム、ターン単位の記録、API呼び出し・リトライ・エラーのカウンタを保持し、
+JSONLファイルとPrometheusテキスト形式で出力する
+ターンの記録は contextvars で、begin_turn を呼んだ処理（とそこから起動したタスク・スレッド）の観測だけを集める
+"""
+
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+# Prometheusに出力する分位点
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 実行中の処理が属するターンのID（ターンの外や、ターンを引き継がないスレッドではNone）
+_current_turn: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("aituber_turn", default=None)
+
+
+class RollingHistogram:
+    """直近window件の観測値から分位点を求めるヒストグラム（件数と合計は累積）"""
+
+    def __init__(self, window: int = 1000):
+        self.values: deque = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> float:
+        """分位点（0〜1）を線形補間で求める"""
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        position = (len(ordered) - 1) * q
+        lower = math.floor(position)
+        upper = math.ceil(position)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            **{f"p{int(q * 100)}": self.percentile(q) for q in QUANTILES},
+        }
+
+
+class TurnContextExecutor(ThreadPoolExecutor):
+    """
+    submit した側のターンを引き継いで実行するスレッドプール
+    ThreadPoolExecutor は contextvars を引き継がないため、submit 時点のコンテキストのコピー上で実行する
+    """
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """ステージ別ヒストグラム・カウンタ・ターン記録の集計先"""
+
+    def __init__(self, namespace: str = "aituber", window: int = 1000, jsonl_path: Optional[str] = None):
+        """
+        Args:
+            namespace: Prometheusのメトリクス名の接頭辞
+            window: 分位点の計算に使う直近の観測数
+            jsonl_path: ターン記録を追記するJSONLファイル（Noneなら書き出さない）
+        """
+        self.namespace = namespace
+        self.window = window
+        self.jsonl_path = jsonl_path
+        self.session_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, RollingHistogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._request_sizes: Dict[str, RollingHistogram] = {}
+        self.verbose = False
+        self._turn_seq = 0
+        # 進行中のターンの記録（ターンID → 記録）。裏のスレッドのターンが終わる前に次のターンが始まることがある
+        self._turns: Dict[str, dict] = {}
+
+    def configure(self, jsonl_path: Optional[str] = None, verbose: bool = False) -> None:
+        """
+        出力先の設定を変更する
+
+        Args:
+            jsonl_path: ターン記録を追記するJSONLファイル（Noneなら書き出さない）
+            verbose: ステージごとの所要時間を観測のたびに表示する
+        """
+        with self._lock:
+            self.jsonl_path = jsonl_path
+            self.verbose = verbose
+
+    def reset(self) -> None:
+        """集計値をすべて破棄する（ベンチマークのウォームアップ後など）"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+            self._request_sizes.clear()
+            self._turns.clear()
+
+    def _active_turn(self) -> Optional[dict]:
+        """呼び出し元のコンテキストが属する進行中のターンの記録（ロックを取った状態で呼ぶ）"""
+        turn_id = _current_turn.get()
+        return self._turns.get(turn_id) if turn_id else None
+
+    # --- 観測 ---
+
+    def observe(self, stage: str, seconds: float, label: Optional[str] = None) -> None:
+        """
+        ステージの所要時間を記録（呼び出し元が進行中のターンに属していればその記録にも残す）
+
+        Args:
+            stage: ステージ名
+            seconds: 所要時間（秒）
+            label: 表示名（verbose のときに「<表示名>にかかった時間」を表示する）
+        """
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+            turn = self._active_turn()
+            if turn is not None:
+                turn["stages"][stage] = round(seconds, 4)
+        if label and self.verbose:
+            print(f"{label}にかかった時間: {seconds:.2f}秒")
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        """カウンタを加算（api_calls, retries, errors など）"""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            turn = self._active_turn()
+            if turn is not None:
+                counter_name = name + _label_text(key[1])
+                turn["counters"][counter_name] = turn["counters"].get(counter_name, 0) + amount
+
+    def observe_request_size(self, component: str, tokens: int) -> None:
+        """APIに送るリクエストの推定トークン数を記録"""
+        with self._lock:
+            histogram = self._request_sizes.get(component)
+            if histogram is None:
+                histogram = self._request_sizes[component] = RollingHistogram(self.window)
+            histogram.observe(tokens)
+            turn = self._active_turn()
+            if turn is not None:
+                turn["request_tokens"][component] = tokens
+
+    def gauge(self, name: str, value: float, **labels: str) -> None:
+        """現在値を記録（履歴のメッセージ数など）"""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+            turn = self._active_turn()
+            if turn is not None:
+                turn["gauges"][name + _label_text(key[1])] = value
+
+    # --- ターン記録 ---
+
+    def begin_turn(self, kind: str = "conversation") -> str:
+        """
+        ターンの記録を開始し、ターンIDを返す
+        以降、呼び出し元のコンテキスト（と TurnContextExecutor・asyncio のタスクなど、それを引き継いだ処理）の観測をこのターンに記録する
+        """
+        with self._lock:
+            # 同じコンテキストで終了しなかったターンは破棄する
+            self._turns.pop(_current_turn.get() or "", None)
+            self._turn_seq += 1
+            turn_id = f"{self.session_id}-{self._turn_seq:05d}"
+            _current_turn.set(turn_id)
+            self._turns[turn_id] = {
+                "turn_id": turn_id,
+                "kind": kind,
+                "started_at": time.time(),
+                "stages": {},
+                "counters": {},
+                "gauges": {},
+                "request_tokens": {},
+            }
+            return turn_id
+
+    def end_turn(self, **fields) -> Optional[dict]:
+        """
+        呼び出し元のコンテキストのターンの記録を終了し、JSONLファイルに追記する
+        ターンの終了後に届いた観測（前のターンの再生や追記の続きなど）は、ヒストグラムとカウンタにだけ記録する
+
+        Args:
+            fields: 記録に追加する値（total_time, time_to_first_audio など）
+
+        Returns:
+            Optional[dict]: 確定したターンの記録
+        """
+        with self._lock:
+            record = self._turns.pop(_current_turn.get() or "", None)
+            _current_turn.set(None)
+            path = self.jsonl_path
+        if record is None:
+            return None
+
+        record.update(fields)
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    # --- 出力 ---
+
+    def snapshot(self) -> dict:
+        """現在の集計値をdictで返す"""
+        with self._lock:
+            return {
+                "stages": {stage: h.snapshot() for stage, h in self._histograms.items()},
+                "counters": {name + _label_text(labels): value for (name, labels), value in self._counters.items()},
+                "gauges": {name + _label_text(labels): value for (name, labels), value in self._gauges.items()},
+                "request_tokens": {component: h.snapshot() for component, h in self._request_sizes.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        ns = self.namespace
+        lines = [
+            f"# HELP {ns}_stage_seconds Per-stage latency over the last {self.window} observations",
+            f"# TYPE {ns}_stage_seconds summary",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                for q in QUANTILES:
+                    lines.append(f'{ns}_stage_seconds{{stage="{stage}",quantile="{q}"}} {histogram.percentile(q):.6f}')
+                lines.append(f'{ns}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{ns}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                lines.append(f"# TYPE {ns}_{name}_total counter")
+                for (counter_name, labels), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        lines.append(f"{ns}_{name}_total{_label_text(labels)} {value:g}")
+
+            if self._request_sizes:
+                lines.append(f"# TYPE {ns}_request_tokens summary")
+            for component, histogram in sorted(self._request_sizes.items()):
+                for q in QUANTILES:
+                    lines.append(f'{ns}_request_tokens{{component="{component}",quantile="{q}"}} {histogram.percentile(q):g}')
+                lines.append(f'{ns}_request_tokens_sum{{component="{component}"}} {histogram.sum:g}')
+                lines.append(f'{ns}_request_tokens_count{{component="{component}"}} {histogram.count}')
+
+            for name in sorted({name for name, _ in self._gauges}):
+                lines.append(f"# TYPE {ns}_{name} gauge")
+                for (gauge_name, labels), value in sorted(self._gauges.items()):
+                    if gauge_name == name:
+                        lines.append(f"{ns}_{name}{_label_text(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# プロセス全体で共有する集計先
+registry = MetricsRegistry()
+
+
+def count_api_call(component: str) -> None:
+    """外部API（Gemini）の呼び出し回数を記録"""
+    registry.inc("api_calls", component=component)
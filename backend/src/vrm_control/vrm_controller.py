@@ -1,21 +1,63 @@
 """
 VRM感情制御システム
 Live2Dの感情分析結果をVRMのVRMAアニメーションにマッピング
+表情・モーション・ご機嫌度・字幕・音声再生の指示は裏の送信スレッドが /vrm/state に送るので、
+VRMサーバーが遅くても会話のスレッドは待たない（まだ送っていない更新は1回の送信にまとめる）
 """
 
+import asyncio
+import aiohttp
 import requests
 import json
-from typing import Optional
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
 import warnings
 
+from ..metrics.registry import registry
+from ..TTS.wav import WavInfo
+
 # requestsの警告を抑制
 warnings.filterwarnings('ignore')
 
+# 送信待ちの更新の上限（VRMサーバーが止まっている間にたまり続けないよう、超えたら古いものから捨てる）
+DISPATCH_QUEUE_SIZE = 64
+# close() で送り残しの送信を待つ上限（秒）
+CLOSE_TIMEOUT = 2.0
+
+
+@dataclass(eq=False)
+class _Update:
+    """送信待ちの状態の更新（/vrm/state に送る内容）"""
+    frame: dict
+    ticket: int                     # 予約の通し番号（まとめた場合は最後の予約の番号）
+    queued_at: float = field(default_factory=time.monotonic)
+
+
 class VRMController:
-    def __init__(self, flask_server_url: str = "http://127.0.0.1:5000"):
+    def __init__(self, flask_server_url: str = "http://127.0.0.1:5000", background: bool = True):
+        """
+        Args:
+            flask_server_url: VRMサーバーのURL
+            background: 状態の更新を裏の送信スレッドで送る（Falseなら呼び出したスレッドで送り、結果を返す）
+        """
         self.flask_server_url = flask_server_url
+        # 接続を使い回す（リクエストごとにTCP接続を張り直さない）。送信スレッドと呼び出し元で同じ接続プールを共有する
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
         self.server_available = self._check_server_availability()
         
+        self.background = background
+        self._condition = threading.Condition()
+        self._updates: deque = deque()
+        self._pending_metrics: Optional[Tuple[str, int]] = None
+        self._queued = 0        # 予約した更新の通し番号
+        self._delivered = 0     # 送信を終えた（成否を問わない）更新の通し番号
+        self._closed = False
+        self._dispatcher: Optional[threading.Thread] = None
+        
         # Live2D表情 → VRM感情のマッピング
         self.live2d_to_vrm_emotion = {
             'normal': 'normal',
@@ -55,7 +97,7 @@ class VRMController:
     def _check_server_availability(self) -> bool:
         """VRMサーバーが利用可能かチェック"""
         try:
-            response = requests.get(f"{self.flask_server_url}/", timeout=1)
+            response = self.session.get(f"{self.flask_server_url}/", timeout=1)
             return response.status_code == 200
         except:
             return False
@@ -68,28 +110,9 @@ class VRMController:
             emotion: 感情 ('normal', 'angry', 'sad', 'happy', 'excited', 'blush', 'surprised', 'sleepy', 'thinking', 'relax', 'goodbye')
         
         Returns:
-            bool: 送信成功かどうか
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
         """
-        if not self.server_available:
-            return False
-            
-        try:
-            response = requests.post(
-                f"{self.flask_server_url}/vrm/motion",
-                json={'emotion': emotion},
-                timeout=2
-            )
-            
-            if response.status_code == 200:
-                print(f"[VRM] 感情 '{emotion}' を送信しました")
-                return True
-            else:
-                # VRMサーバーが利用できない場合は静かに失敗
-                return False
-                
-        except requests.exceptions.RequestException as e:
-            # VRMサーバーが起動していない場合は静かに失敗
-            return False
+        return self._submit({'motion': emotion})
     
     def convert_live2d_emotion(self, live2d_emotion: str) -> Optional[str]:
         """
@@ -147,27 +170,9 @@ class VRMController:
             emotion: 感情名
             
         Returns:
-            bool: 設定成功かどうか
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
         """
-        # 表情設定をFlaskサーバーに送信（モーションとは別のエンドポイント）
-        if not self.server_available:
-            return False
-            
-        try:
-            response = requests.post(
-                f"{self.flask_server_url}/expression",
-                json={'expression': emotion},
-                timeout=2
-            )
-            
-            if response.status_code == 200:
-                print(f"[VRM] 表情 '{emotion}' を送信しました")
-                return True
-            else:
-                return False
-                
-        except requests.exceptions.RequestException as e:
-            return False
+        return self._submit({'expression': emotion})
     
     def play_motion(self, motion: str) -> bool:
         """
@@ -183,66 +188,121 @@ class VRMController:
         emotion = self.live2d_to_vrm_emotion.get(motion, 'normal')
         return self.send_vrm_emotion(emotion)
     
-    def play_voice(self) -> bool:
+    def play_voice(self, utterance_id: Optional[str] = None) -> bool:
         """
         音声を再生（Live2D互換メソッド）
         VRMサーバーに音声再生指示を送信
         
+        Args:
+            utterance_id: send_audio で登録した発話ID（省略時はフロントエンドが voice.wav を読み込む）
+        
         Returns:
-            bool: 送信成功かどうか
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
+        """
+        return self._submit({'voice': {'utterance_id': utterance_id}})
+    
+    def send_audio(self, wav, info: WavInfo, final: bool = True, lipsync: Optional[dict] = None) -> Optional[str]:
+        """
+        合成した音声をVRMサーバーに登録する（フロントエンドは /audio/<発話ID> から再生する）
+        発話IDが必要なため、呼び出したスレッドで送る（再生指示は登録のあとに予約されるので、登録より先に届かない）
+        
+        Args:
+            wav: WAV全体のバイト列
+            info: WAVヘッダーの内容
+            final: Falseなら合成途中として登録し、続きを append_audio で追記する
+            lipsync: 口パク用のトラック（/audio/<発話ID>/lipsync から配信する）
+            
+        Returns:
+            Optional[str]: 発話ID（登録できなかった場合はNone）
         """
         if not self.server_available:
-            return False
+            return None
             
+        pcm = memoryview(wav)[info.data_offset:info.data_offset + info.data_size]
         try:
-            response = requests.post(
-                f"{self.flask_server_url}/voice",
-                json={'action': 'play'},
-                timeout=2
+            response = self.session.post(
+                f"{self.flask_server_url}/audio",
+                params={
+                    'sample_rate': info.sample_rate,
+                    'channels': info.channels,
+                    'sample_width': info.bits_per_sample // 8,
+                    'final': int(final),
+                },
+                data=pcm.tobytes(),
+                headers={'Content-Type': 'application/octet-stream'},
+                timeout=5
             )
-            
-            if response.status_code == 200:
-                print("[VRM] 音声再生指示を送信しました")
-                return True
-            else:
-                # VRMサーバーが利用できない場合は静かに失敗
-                return False
+            if response.status_code != 200:
+                return None
+            utterance_id = response.json().get('utterance_id')
                 
         except requests.exceptions.RequestException as e:
             # VRMサーバーが起動していない場合は静かに失敗
-            return False
+            return None
+        
+        if utterance_id and lipsync is not None:
+            # 再生指示より先に届くよう、登録の直後に送っておく（失敗してもフロントエンドが音声から口パクする）
+            try:
+                self.session.post(
+                    f"{self.flask_server_url}/audio/{utterance_id}/lipsync",
+                    json=lipsync,
+                    timeout=5
+                )
+            except requests.exceptions.RequestException:
+                pass
+        return utterance_id
     
-    def set_mood_value(self, mood_value: int) -> bool:
+    def append_audio(self, utterance_id: str, pcm: bytes, final: bool = False, lipsync: Optional[dict] = None) -> bool:
         """
-        ご機嫌度を設定（Live2D互換メソッド）
+        合成途中で登録した発話にPCMを追記する
         
         Args:
-            mood_value: ご機嫌度（0-100）
+            utterance_id: send_audio(final=False) で得た発話ID
+            pcm: 続きのPCM（ヘッダーなし）
+            final: Trueなら発話の音声がそろったことを通知する
+            lipsync: 追記した分までの口パク用のトラック（登録済みのトラックを置き換える）
             
         Returns:
-            bool: 設定成功かどうか
+            bool: 送信成功かどうか
         """
         if not self.server_available:
             return False
             
         try:
-            response = requests.post(
-                f"{self.flask_server_url}/mood",
-                json={'mood_value': mood_value},
-                timeout=2
+            response = self.session.post(
+                f"{self.flask_server_url}/audio/{utterance_id}",
+                params={'final': int(final)},
+                data=bytes(pcm),
+                headers={'Content-Type': 'application/octet-stream'},
+                timeout=5
             )
-            
-            if response.status_code == 200:
-                print(f"[VRM] ご機嫌度 {mood_value} を送信しました")
-                return True
-            else:
-                # VRMサーバーが利用できない場合は静かに失敗
+            if response.status_code != 200:
                 return False
+            if lipsync is not None:
+                # 失敗しても音声は届いているので、フロントエンドは手元のトラックの続きを口を閉じて再生する
+                self.session.post(
+                    f"{self.flask_server_url}/audio/{utterance_id}/lipsync",
+                    json=lipsync,
+                    timeout=5
+                )
+            return True
                 
         except requests.exceptions.RequestException as e:
             # VRMサーバーが起動していない場合は静かに失敗
             return False
     
+    def set_mood_value(self, mood_value: int) -> bool:
+        """
+        ご機嫌度を設定（Live2D互換メソッド）
+        
+        Args:
+            mood_value: ご機嫌度（0-100）
+            
+        Returns:
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
+        """
+        return self._submit({'mood': mood_value})
+    
     def send_subtitle(self, japanese_text: str, english_text: str) -> bool:
         """
         字幕を送信（VRM向け拡張メソッド）
@@ -252,31 +312,285 @@ class VRMController:
             english_text: 英語字幕
             
         Returns:
-            bool: 送信成功かどうか
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
+        """
+        return self._submit({'subtitle': {'japanese': japanese_text, 'english': english_text}})
+    
+    def state_frame(
+        self,
+        expression: Optional[str] = None,
+        emotion: Optional[str] = None,
+        mood_value: Optional[int] = None,
+        subtitle: Optional[Tuple[str, str]] = None,
+        play_voice: bool = False,
+        utterance_id: Optional[str] = None,
+    ) -> dict:
+        """/vrm/state に送る状態（引数は apply_state と同じ）"""
+        frame = {}
+        if expression is not None:
+            frame['expression'] = expression
+        if emotion is not None:
+            frame['motion'] = self.convert_live2d_emotion(emotion) or 'normal'
+        if mood_value is not None:
+            frame['mood'] = mood_value
+        if subtitle is not None:
+            frame['subtitle'] = {'japanese': subtitle[0], 'english': subtitle[1]}
+        if play_voice:
+            frame['voice'] = {'utterance_id': utterance_id}
+        return frame
+    
+    def apply_state(
+        self,
+        expression: Optional[str] = None,
+        emotion: Optional[str] = None,
+        mood_value: Optional[int] = None,
+        subtitle: Optional[Tuple[str, str]] = None,
+        play_voice: bool = False,
+        utterance_id: Optional[str] = None,
+    ) -> bool:
+        """
+        表情・モーション・ご機嫌度・字幕・音声再生をまとめて1回のリクエストで送る（/vrm/state）
+        フロントエンドにはすべての変更が同時に届く。省略した項目は変更しない
+        
+        Args:
+            expression: 表情
+            emotion: 感情分析の結果（VRM感情に変換してモーションを再生する）
+            mood_value: ご機嫌度（0-100）
+            subtitle: (日本語字幕, 英語字幕)
+            play_voice: 音声の再生を指示するか
+            utterance_id: send_audio で登録した発話ID（省略時はフロントエンドが voice.wav を読み込む）
+            
+        Returns:
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
+        """
+        return self._submit(self.state_frame(expression, emotion, mood_value, subtitle, play_voice, utterance_id))
+    
+    def send_metrics(self, metrics_text: str) -> bool:
+        """
+        パフォーマンス計測の集計値を送信（VRMサーバーの /metrics で公開される）
+        まだ送っていない集計値は最新のものだけを送る
+        
+        Args:
+            metrics_text: Prometheusテキスト形式の集計値
+            
+        Returns:
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
         """
         if not self.server_available:
             return False
-            
+        if not self.background:
+            return self._post_metrics(metrics_text)
+        with self._condition:
+            if self._closed:
+                return False
+            self._queued += 1
+            if self._pending_metrics is not None:
+                registry.inc("vrm_dispatch", result="coalesced", kind="metrics")
+            self._pending_metrics = (metrics_text, self._queued)
+            self._start_dispatcher()
+        return True
+    
+    def _submit(self, frame: dict) -> bool:
+        """
+        状態の更新を送信スレッドに渡す（まだ送っていない更新があれば、後の値で上書きして1回の送信にまとめる）
+        
+        Returns:
+            bool: 送信を予約できたか（background=False なら送信成功かどうか）
+        """
+        if not self.server_available or not frame:
+            return False
+        if not self.background:
+            return self._post_state(frame)
+        with self._condition:
+            if self._closed:
+                return False
+            self._queued += 1
+            last = self._updates[-1] if self._updates else None
+            # 音声の再生指示は1つずつ再生したいので、再生指示どうしはまとめない
+            if last is not None and not ('voice' in last.frame and 'voice' in frame):
+                last.frame.update(frame)
+                last.ticket = self._queued
+                registry.inc("vrm_dispatch", result="coalesced", kind="state")
+            else:
+                if len(self._updates) >= DISPATCH_QUEUE_SIZE:
+                    self._updates.popleft()
+                    registry.inc("vrm_dispatch", result="dropped", kind="state")
+                self._updates.append(_Update(dict(frame), self._queued))
+            self._start_dispatcher()
+        return True
+    
+    def _start_dispatcher(self) -> None:
+        """送信スレッドを起こす（最初の予約で起動する。self._condition を取得した状態で呼ぶ）"""
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="vrm-dispatch", daemon=True)
+            self._dispatcher.start()
+        self._condition.notify_all()
+    
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._updates or self._pending_metrics is not None or self._closed)
+                # 予約した順に送る
+                if self._updates and (self._pending_metrics is None or self._updates[0].ticket < self._pending_metrics[1]):
+                    update, metrics = self._updates.popleft(), None
+                elif self._pending_metrics is not None:
+                    update, metrics = None, self._pending_metrics
+                    self._pending_metrics = None
+                else:
+                    return
+                registry.gauge("vrm_dispatch_queue", len(self._updates))
+            if update is not None:
+                success = self._post_state(update.frame)
+                registry.observe("vrm_dispatch", time.monotonic() - update.queued_at)
+                registry.inc("vrm_dispatch", result="sent" if success else "failed", kind="state")
+                ticket = update.ticket
+            else:
+                success = self._post_metrics(metrics[0])
+                registry.inc("vrm_dispatch", result="sent" if success else "failed", kind="metrics")
+                ticket = metrics[1]
+            with self._condition:
+                self._delivered = max(self._delivered, ticket)
+                self._condition.notify_all()
+    
+    def _post_state(self, frame: dict) -> bool:
+        """状態を /vrm/state に送る"""
         try:
-            response = requests.post(
-                f"{self.flask_server_url}/subtitle",
-                json={
-                    'japanese': japanese_text,
-                    'english': english_text
-                },
+            response = self.session.post(
+                f"{self.flask_server_url}/vrm/state",
+                json=frame,
                 timeout=2
             )
             
             if response.status_code == 200:
-                print(f"[VRM] 字幕を送信しました")
+                print(f"[VRM] 状態を送信しました: {', '.join(frame)}")
                 return True
             else:
-                # VRMサーバーが利用できない場合は静かに失敗
                 return False
                 
         except requests.exceptions.RequestException as e:
             # VRMサーバーが起動していない場合は静かに失敗
             return False
+    
+    def _post_metrics(self, metrics_text: str) -> bool:
+        try:
+            response = self.session.post(
+                f"{self.flask_server_url}/metrics",
+                data=metrics_text.encode("utf-8"),
+                headers={'Content-Type': 'text/plain; charset=utf-8'},
+                timeout=2
+            )
+            return response.status_code == 200
+                
+        except requests.exceptions.RequestException as e:
+            # VRMサーバーが起動していない場合は静かに失敗
+            return False
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        それまでに予約した更新を送り終えるまで待つ
+        
+        Args:
+            timeout: 待つ上限（秒。Noneなら送り終えるまで）
+            
+        Returns:
+            bool: 時間内に送り終えたか
+        """
+        with self._condition:
+            target = self._queued
+            return self._condition.wait_for(lambda: self._delivered >= target, timeout=timeout)
+    
+    def close(self, timeout: float = CLOSE_TIMEOUT) -> None:
+        """送り残しの送信を待って（最大 timeout 秒）送信スレッドを止め、接続を閉じる（2回目以降は何もしない）"""
+        with self._condition:
+            if self._closed:
+                return
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._updates.clear()
+            self._pending_metrics = None
+            # 捨てた更新は送り終えたことにして、あとから flush を呼んでも待たせない
+            self._delivered = self._queued
+            self._condition.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        self.session.close()
+
+class AsyncVRMController:
+    """
+    VRMControllerの非同期版
+    aiohttpのセッションを共有し、音声の登録と、表情・モーション・ご機嫌度・字幕・音声再生をまとめた状態のフレームを送信する
+    """
+
+    def __init__(self, controller: VRMController, session: aiohttp.ClientSession, timeout: float = 2.0):
+        """
+        Args:
+            controller: 感情マッピングとサーバー可否を共有する同期版コントローラ
+            session: 接続を使い回すaiohttpセッション
+            timeout: 1リクエストあたりのタイムアウト（秒）
+        """
+        self.controller = controller
+        self.session = session
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def _post(self, path: str, payload: dict) -> bool:
+        """Flaskサーバーへ非同期にPOSTし、成功したかを返す"""
+        if not self.controller.server_available:
+            return False
+
+        try:
+            async with self.session.post(
+                f"{self.controller.flask_server_url}{path}",
+                json=payload,
+                timeout=self.timeout
+            ) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # VRMサーバーが起動していない場合は静かに失敗
+            return False
+
+    async def send_audio(self, wav, info: WavInfo, lipsync: Optional[dict] = None) -> Optional[str]:
+        """合成した音声（と口パク用のトラック）をVRMサーバーに登録し、発話IDを返す"""
+        if not self.controller.server_available:
+            return None
+
+        pcm = memoryview(wav)[info.data_offset:info.data_offset + info.data_size]
+        try:
+            async with self.session.post(
+                f"{self.controller.flask_server_url}/audio",
+                params={
+                    'sample_rate': info.sample_rate,
+                    'channels': info.channels,
+                    'sample_width': info.bits_per_sample // 8,
+                },
+                data=pcm.tobytes(),
+                headers={'Content-Type': 'application/octet-stream'},
+                timeout=self.timeout
+            ) as response:
+                if response.status != 200:
+                    return None
+                utterance_id = (await response.json()).get('utterance_id')
+            if utterance_id and lipsync is not None:
+                await self._post(f"/audio/{utterance_id}/lipsync", lipsync)
+            return utterance_id
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    async def apply_state(
+        self,
+        expression: Optional[str] = None,
+        emotion: Optional[str] = None,
+        mood_value: Optional[int] = None,
+        subtitle: Optional[Tuple[str, str]] = None,
+        play_voice: bool = False,
+        utterance_id: Optional[str] = None,
+    ) -> bool:
+        """表情・モーション・ご機嫌度・字幕・音声再生をまとめて送信（引数は VRMController.apply_state と同じ）"""
+        frame = self.controller.state_frame(expression, emotion, mood_value, subtitle, play_voice, utterance_id)
+        success = await self._post("/vrm/state", frame)
+        if success:
+            print(f"[VRM] 状態を送信しました: {', '.join(frame)}")
+        return success
 
 # 使用例とテスト用関数
 def test_vrm_emotion_controller():
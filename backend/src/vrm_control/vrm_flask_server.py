@@ -3,122 +3,593 @@ VRM制御用Flask APIサーバー
 Live2D制御サーバーと同じシンプルな仕組み
 """
 
+import json
 import logging
-from flask import Flask, jsonify, request
+import re
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)
 
-# 状態管理用
-current_emotion = None
-current_expression = None
-current_voice = False
-latest_subtitle = {"japanese": "", "english": "", "timestamp": 0}
-mood_value = 50
+# 状態管理用。グローバル変数には持たず、イベントの履歴 event_log が種類ごとの最新の値と版（連番）をロックの下で保持する
+# （スレッドで並行に処理するリクエストが同時に書き換えても、更新が失われたり字幕とご機嫌度が食い違ったりしない）
+INITIAL_STATE = {
+    'mood': {'mood': 50},
+    'subtitle': {"japanese": "", "english": "", "timestamp": 0},
+}
+
+# イベントの配信用（/events/stream・/events）。状態を変更するたびに連番付きのイベントを記録し、
+# クライアントはそれぞれ自分の位置（前回受け取ったイベントID）の続きから受け取る（古すぎて残っていなければ現在の状態を送り直す）
+EVENT_HISTORY = 256
+# /events のロングポーリングで待つ時間の上限（秒）
+MAX_POLL_WAIT = 30.0
+# 接続を保つためのコメント行を送る間隔（秒）
+HEARTBEAT_SECONDS = 15.0
+# EventSource が切断後に再接続するまでの待ち時間（ミリ秒）
+RECONNECT_MILLISECONDS = 1000
+# サーバーの起動ごとに変わるID（再起動で連番が戻ったことをクライアントが判別する）
+EPOCH = uuid.uuid4().hex[:8]
+
+# メトリクス用（リクエスト数・処理時間と、バックエンドから送られた集計値）
+metrics_lock = threading.Lock()
+request_counts = {}
+request_seconds = {}
+backend_metrics = ""
+
+# 合成済み音声（発話ID → 音声）。ディスクを介さずにフロントエンドへ配信する
+MAX_UTTERANCES = 32
+# 合成中の音声を配信する際に、次のチャンクを待つ最大時間（秒）
+AUDIO_CHUNK_TIMEOUT = 30.0
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class Utterance:
+    """1回の発話の音声（ヘッダーなしのPCMと形式）。合成中はチャンクが追記されていく"""
+
+    def __init__(self, utterance_id, sample_rate, channels, sample_width):
+        self.id = utterance_id
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.pcm = bytearray()
+        self.lipsync = None  # 口パク用のトラック（frame_ms, levels, visemes）
+        self.complete = False
+        self.condition = threading.Condition()
+
+    def append(self, chunk, final=False):
+        with self.condition:
+            if not self.complete:
+                self.pcm += chunk
+                self.complete = final
+            self.condition.notify_all()
+
+    def header(self, data_size=None):
+        """WAVヘッダー（data_size が None なら長さ未確定のストリーミング用）"""
+        if data_size is None:
+            riff_size = data_size = 0xFFFFFFFF
+        else:
+            riff_size = 36 + data_size
+        block_align = self.channels * self.sample_width
+        return struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF", riff_size, b"WAVE", b"fmt ", 16, 1, self.channels, self.sample_rate,
+            self.sample_rate * block_align, block_align, self.sample_width * 8, b"data", data_size,
+        )
+
+    def wait_complete(self, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.complete, timeout=timeout)
+
+    def read_range(self, start, end):
+        """ヘッダーを含めたWAV全体のうち start〜end（両端を含む）のバイト列"""
+        with self.condition:
+            header = self.header(len(self.pcm))
+            head = header[start:end + 1] if start < len(header) else b""
+            body = self.pcm[max(0, start - len(header)):max(0, end + 1 - len(header))]
+        return head + bytes(body)
+
+    @property
+    def wav_size(self):
+        return 44 + len(self.pcm)
+
+
+utterances_lock = threading.Lock()
+utterances = OrderedDict()
+
+
+def event_parts(kind, data):
+    """イベントを種類ごとの値に分ける（一括設定の state は含まれる項目ごと）"""
+    if kind != 'state':
+        return [(kind, data)]
+    parts = {
+        'expression': lambda value: {'expression': value},
+        'motion': lambda value: {'emotion': value},
+        'mood': lambda value: {'mood': value},
+        'subtitle': lambda value: value,
+        'voice': lambda value: value,
+    }
+    return [(key, parts[key](value)) for key, value in data.items() if key in parts]
+
+
+class EventLog:
+    """
+    状態変更のイベントの連番付きの履歴（種類ごとの最新の値を保持する状態の保存先を兼ねる）
+    新しいものから capacity 件だけ残すリングバッファなので、流れたイベントの数によらずメモリは一定。
+    クライアントはそれぞれ自分の位置（連番）から読むので、複数のビューアーがすべてのイベントを受け取れる。
+    種類ごとの値の版は、最後に変更したイベントの連番（変更のたびに増える）
+    """
+
+    def __init__(self, capacity=EVENT_HISTORY, initial=None):
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        # 種類 → (連番, 値)。履歴から溢れても種類ごとの最新の値は残す（初期値の版は0）
+        self._latest = {kind: (0, value) for kind, value in (initial or {}).items()}
+        # 位置を持たない従来のGET（/vrm/motion など）が受け取り済みの連番
+        self._legacy_cursors = {}
+        self.condition = threading.Condition()
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, kind, data):
+        """イベントを記録して待っているクライアントを起こし、連番を返す"""
+        with self.condition:
+            self._seq += 1
+            self._events.append((self._seq, kind, data))
+            for part_kind, value in event_parts(kind, data):
+                self._latest[part_kind] = (self._seq, value)
+            self.condition.notify_all()
+            return self._seq
+
+    def since(self, seq):
+        """
+        seq より後のイベント
+
+        Returns:
+            (events, complete): イベントのリストと、seq の直後から欠けずに残っていたか
+        """
+        with self.condition:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            events = [event for event in self._events if event[0] > seq]
+            return events, seq <= self._seq and seq + 1 >= oldest
+
+    def wait(self, seq, timeout):
+        """seq より後のイベントが記録されるまで待つ"""
+        with self.condition:
+            self.condition.wait_for(lambda: self._seq != seq, timeout=timeout)
+
+    def latest(self, kind):
+        """種類ごとの最新の値（なければNone）"""
+        return self.state(kind)[1]
+
+    def state(self, kind):
+        """
+        種類ごとの最新の値と版
+
+        Returns:
+            (version, value): 版（値がなければ0）と値（なければNone）
+        """
+        with self.condition:
+            return self._latest.get(kind, (0, None))
+
+    def snapshot(self):
+        """
+        すべての種類の最新の値を、途中で変更されないように一度に読み出す
+
+        Returns:
+            (version, values): 全体の版（最後のイベントの連番）と {種類: 値}
+        """
+        with self.condition:
+            return self._seq, {kind: value for kind, (_, value) in self._latest.items()}
+
+    def take_latest(self, kind):
+        """
+        位置を持たない従来のGET用に、まだ返していない最新の値を返す（なければNone）
+        従来どおり最初に取得したクライアントだけが受け取る（複数のビューアーは /events・/events/stream を使う）
+
+        Returns:
+            Optional[(seq, value)]: 連番と値
+        """
+        with self.condition:
+            latest = self._latest.get(kind)
+            if latest is None or latest[0] <= self._legacy_cursors.get(kind, 0):
+                return None
+            self._legacy_cursors[kind] = latest[0]
+            return latest
+
+
+event_log = EventLog(initial=INITIAL_STATE)
+
+
+def publish_event(kind, data):
+    """状態の変更を記録して配信する"""
+    return event_log.publish(kind, data)
+
+
+def current_state(values):
+    """続きを送れないクライアントに送り直す現在の状態（再生指示などの一度きりのイベントは含めない）"""
+    return {'epoch': EPOCH, 'mood': values['mood']['mood'], 'subtitle': values['subtitle']}
+
+
+def _conditional_json(version, build):
+    """
+    状態の版を ETag にして JSON を返す（If-None-Match が一致すれば、本文を作らずに 304 Not Modified を返す）
+
+    Args:
+        version: 状態の版
+        build: 本文の辞書を作る関数
+    """
+    etag = f"{EPOCH}-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # 保存してよいが、使う前に毎回サーバーに変更を確認させる
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _next_events(cursor, wait):
+    """
+    cursor より後のイベントを（なければ wait 秒まで待って）返す
+
+    Returns:
+        (events, snapshot, cursor): イベントのリスト、続きが残っていなかった場合の現在の状態（残っていればNone）、次の位置
+    """
+    if cursor is not None:
+        events, complete = event_log.since(cursor)
+        if complete and not events and wait > 0:
+            event_log.wait(cursor, wait)
+            events, complete = event_log.since(cursor)
+        if complete:
+            return events, None, events[-1][0] if events else cursor
+    # 初回・サーバーの再起動後・履歴から溢れた場合は、現在の状態から始める
+    version, values = event_log.snapshot()
+    return [], current_state(values), version
+
+
+def _sse(kind, data, seq=None):
+    # イベントIDは「起動ID-連番」（再起動前のIDで再接続されたら続きからは送らない）
+    lines = [] if seq is None else [f"id: {EPOCH}-{seq}"]
+    lines += [f"event: {kind}", f"data: {json.dumps(data, ensure_ascii=False)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def create_utterance(sample_rate, channels, sample_width):
+    """発話を登録（古いものから MAX_UTTERANCES 件を超えた分を破棄）"""
+    utterance = Utterance(uuid.uuid4().hex[:12], sample_rate, channels, sample_width)
+    with utterances_lock:
+        utterances[utterance.id] = utterance
+        while len(utterances) > MAX_UTTERANCES:
+            utterances.popitem(last=False)
+    return utterance
+
+
+def get_utterance(utterance_id):
+    with utterances_lock:
+        return utterances.get(utterance_id)
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def count_request(response):
+    """エンドポイントごとのリクエスト数と処理時間を集計"""
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    key = (request.method, request.url_rule.rule if request.url_rule else 'unmatched')
+    with metrics_lock:
+        request_counts[key] = request_counts.get(key, 0) + 1
+        request_seconds[key] = request_seconds.get(key, 0.0) + elapsed
+    return response
 
 @app.route('/vrm/motion', methods=['GET'])
 def get_motion():
-    """クライアントが定期取得"""
-    global current_emotion
-    if current_emotion:
-        emotion = current_emotion
-        current_emotion = None
-        return jsonify({'emotion': emotion})
+    """クライアントが定期取得（まだ返していない最新のモーション。すべてのイベントは /events で取得できる）"""
+    latest = event_log.take_latest('motion')
+    if latest:
+        return jsonify({'emotion': latest[1]['emotion'], 'seq': latest[0], 'epoch': EPOCH})
     return jsonify({'emotion': None})
 
 @app.route('/vrm/motion', methods=['POST'])
 def set_motion():
     """感情/モーションを設定"""
-    global current_emotion
     data = request.get_json()
     emotion = data.get('emotion')
     if emotion:
-        current_emotion = emotion
+        publish_event('motion', {'emotion': emotion})
         print(f"[VRM Flask] 感情設定: {emotion}")
         return jsonify({'status': 'ok'})
     return jsonify({'status': 'error', 'message': 'emotion not provided'}), 400
 
 @app.route('/expression', methods=['GET'])
 def get_expression():
-    """クライアントが表情を定期取得"""
-    global current_expression
-    if current_expression:
-        expression = current_expression
-        current_expression = None
-        return jsonify({'expression': expression})
+    """クライアントが表情を定期取得（まだ返していない最新の表情）"""
+    latest = event_log.take_latest('expression')
+    if latest:
+        return jsonify({'expression': latest[1]['expression'], 'seq': latest[0], 'epoch': EPOCH})
     return jsonify({'expression': None})
 
 @app.route('/expression', methods=['POST'])
 def set_expression():
     """表情を設定"""
-    global current_expression
     data = request.get_json()
     expression = data.get('expression')
     if expression:
-        current_expression = expression
+        publish_event('expression', {'expression': expression})
         print(f"[VRM Flask] 表情設定: {expression}")
         return jsonify({'status': 'ok'})
     return jsonify({'status': 'error', 'message': 'expression not provided'}), 400
 
 @app.route('/voice', methods=['GET'])
 def get_voice():
-    """音声再生状態を取得"""
-    global current_voice
-    if current_voice:
-        current_voice = False
-        return jsonify({'play': True})
+    """音声再生状態を取得（utterance_id があれば /audio/<utterance_id> から再生する）"""
+    latest = event_log.take_latest('voice')
+    if latest:
+        return jsonify({'play': True, 'utterance_id': latest[1]['utterance_id'], 'seq': latest[0], 'epoch': EPOCH})
     return jsonify({'play': False})
 
 @app.route('/voice', methods=['POST'])
 def set_voice():
     """音声再生を設定"""
-    global current_voice
-    current_voice = True
-    print("[VRM Flask] 音声再生設定")
+    data = request.get_json(silent=True) or {}
+    utterance_id = data.get('utterance_id')
+    publish_event('voice', {'utterance_id': utterance_id})
+    print(f"[VRM Flask] 音声再生設定: {utterance_id or 'voice.wav'}")
     return jsonify({'status': 'ok'})
 
+@app.route('/audio', methods=['POST'])
+def create_audio():
+    """
+    発話の音声（ヘッダーなしのPCM）を登録
+    クエリ: sample_rate, channels, sample_width, final（0なら続きを /audio/<utterance_id> に追記する）
+    """
+    sample_rate = request.args.get('sample_rate', type=int)
+    if not sample_rate:
+        return jsonify({'status': 'error', 'message': 'sample_rate not provided'}), 400
+    utterance = create_utterance(
+        sample_rate,
+        request.args.get('channels', 1, type=int),
+        request.args.get('sample_width', 2, type=int),
+    )
+    utterance.append(request.get_data(), final=request.args.get('final', '1') != '0')
+    return jsonify({'status': 'ok', 'utterance_id': utterance.id})
+
+@app.route('/audio/<utterance_id>', methods=['POST'])
+def append_audio(utterance_id):
+    """合成中の発話にPCMのチャンクを追記（final=1 で完了）"""
+    utterance = get_utterance(utterance_id)
+    if utterance is None:
+        return jsonify({'status': 'error', 'message': 'unknown utterance'}), 404
+    utterance.append(request.get_data(), final=request.args.get('final', '0') != '0')
+    return jsonify({'status': 'ok'})
+
+@app.route('/audio/<utterance_id>/lipsync', methods=['POST'])
+def set_lipsync(utterance_id):
+    """発話の口パク用のトラックを登録"""
+    utterance = get_utterance(utterance_id)
+    if utterance is None:
+        return jsonify({'status': 'error', 'message': 'unknown utterance'}), 404
+    track = request.get_json(silent=True)
+    if not isinstance(track, dict) or 'levels' not in track:
+        return jsonify({'status': 'error', 'message': 'levels not provided'}), 400
+    utterance.lipsync = track
+    return jsonify({'status': 'ok'})
+
+@app.route('/audio/<utterance_id>/lipsync', methods=['GET'])
+def get_lipsync(utterance_id):
+    """発話の口パク用のトラックを取得（フロントエンドは再生位置からフレームを引く）"""
+    utterance = get_utterance(utterance_id)
+    if utterance is None or utterance.lipsync is None:
+        return jsonify({'status': 'error', 'message': 'lipsync not found'}), 404
+    return jsonify(utterance.lipsync)
+
+@app.route('/audio/<utterance_id>', methods=['GET'])
+def get_audio(utterance_id):
+    """
+    発話の音声をWAVで配信
+    合成中ならチャンクが届くたびに送り（合成の完了前に再生を始められる）、合成済みならRangeリクエストに対応する
+    """
+    utterance = get_utterance(utterance_id)
+    if utterance is None:
+        return jsonify({'status': 'error', 'message': 'unknown utterance'}), 404
+
+    range_header = request.headers.get('Range')
+    # ブラウザは最初の読み込みでも bytes=0- を付けてくるので、先頭からの要求は合成中なら流し込む
+    if range_header in (None, 'bytes=0-') and not utterance.complete:
+        return Response(
+            stream_with_context(_stream_audio(utterance)),
+            mimetype='audio/wav',
+            headers={'Cache-Control': 'no-store'},
+        )
+
+    # Rangeリクエストは長さが確定してから応答する
+    if not utterance.wait_complete(AUDIO_CHUNK_TIMEOUT):
+        return jsonify({'status': 'error', 'message': 'synthesis timed out'}), 504
+    total = utterance.wav_size
+    headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'no-store'}
+    match = RANGE_PATTERN.match(range_header or '')
+    if match is None or match.groups() == ('', ''):
+        return Response(utterance.read_range(0, total - 1), mimetype='audio/wav', headers=headers)
+
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), total - 1) if end_text else total - 1
+    else:
+        # bytes=-N は末尾のNバイト
+        start, end = max(0, total - int(end_text)), total - 1
+    if start > end:
+        return Response(status=416, headers={'Content-Range': f'bytes */{total}'})
+    headers['Content-Range'] = f'bytes {start}-{end}/{total}'
+    return Response(utterance.read_range(start, end), status=206, mimetype='audio/wav', headers=headers)
+
+def _stream_audio(utterance):
+    """合成中の発話を、長さ未確定のWAVとしてチャンクが届くたびに送る"""
+    yield utterance.header()
+    sent = 0
+    while True:
+        with utterance.condition:
+            utterance.condition.wait_for(
+                lambda: len(utterance.pcm) > sent or utterance.complete,
+                timeout=AUDIO_CHUNK_TIMEOUT,
+            )
+            chunk = bytes(utterance.pcm[sent:])
+        if chunk:
+            sent += len(chunk)
+            yield chunk
+        else:
+            # 送り終えた、または合成が止まった
+            break
+
 @app.route('/subtitle', methods=['GET'])
 def get_subtitle():
-    """字幕を取得"""
-    return jsonify(latest_subtitle)
+    """字幕を取得（ETag が一致すれば 304）"""
+    version, subtitle = event_log.state('subtitle')
+    return _conditional_json(version, lambda: subtitle)
 
 @app.route('/subtitle', methods=['POST'])
 def set_subtitle():
     """字幕を設定"""
-    global latest_subtitle
     data = request.get_json()
     japanese = data.get('japanese', '')
     english = data.get('english', '')
     
     if japanese is not None or english is not None:
-        import time
-        latest_subtitle = {
+        seq = publish_event('subtitle', {
             "japanese": japanese,
             "english": english,
             "timestamp": time.time()
-        }
+        })
         print(f"[VRM Flask] 字幕設定: {japanese}")
-        return jsonify({'status': 'ok'})
+        return jsonify({'status': 'ok', 'seq': seq})
     return jsonify({'status': 'error', 'message': 'japanese or english text not provided'}), 400
 
 @app.route('/mood', methods=['GET'])
 def get_mood_value():
-    """ご機嫌度を取得"""
-    return jsonify({'mood': mood_value})
+    """ご機嫌度を取得（ETag が一致すれば 304）"""
+    version, mood = event_log.state('mood')
+    return _conditional_json(version, lambda: mood)
 
 @app.route('/mood', methods=['POST'])
 def set_mood_value():
     """ご機嫌度を設定"""
-    global mood_value
     data = request.get_json()
     mood = data.get('mood_value') or data.get('mood')
     if isinstance(mood, (int, float)):
-        mood_value = max(0, min(100, mood))  # 0-100の範囲に制限
-        print(f"[VRM Flask] ご機嫌度設定: {mood_value}")
-        return jsonify({'status': 'ok', 'new_mood': mood_value})
+        mood = max(0, min(100, mood))  # 0-100の範囲に制限
+        seq = publish_event('mood', {'mood': mood})
+        print(f"[VRM Flask] ご機嫌度設定: {mood}")
+        return jsonify({'status': 'ok', 'new_mood': mood, 'seq': seq})
     return jsonify({'status': 'error', 'message': 'Valid numeric mood value not provided'}), 400
 
+@app.route('/events/stream', methods=['GET'])
+def stream_events():
+    """
+    状態の変更をServer-Sent Eventsでプッシュ配信（motion / expression / voice / mood / subtitle と、一括設定の state）
+    再接続時は Last-Event-ID（または ?after=N）の続きから送る。続きが残っていない場合と初回の接続では、
+    まず現在の状態を snapshot イベントで送る
+    """
+    return Response(
+        stream_with_context(_stream_events(_resume_cursor())),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'},
+    )
+
+def _resume_cursor():
+    """再接続したクライアントの続きの位置（この起動のイベントIDでなければNone）"""
+    event_id = request.headers.get('Last-Event-ID') or request.args.get('after')
+    if not event_id:
+        return None
+    epoch, _, seq = event_id.rpartition('-')
+    if epoch and epoch != EPOCH:
+        return None
+    try:
+        return int(seq)
+    except ValueError:
+        return None
+
+def _stream_events(cursor):
+    yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+    wait = 0.0
+    while True:
+        events, snapshot, cursor = _next_events(cursor, wait)
+        if snapshot is not None:
+            yield _sse('snapshot', snapshot, cursor)
+        for seq, kind, data in events:
+            yield _sse(kind, data, seq)
+        if snapshot is None and not events:
+            yield ": ping\n\n"
+        wait = HEARTBEAT_SECONDS
+
+@app.route('/events', methods=['GET'])
+def get_events():
+    """
+    イベントをロングポーリングで取得（プッシュ配信を使えないクライアント・フォールバック用）
+    クエリ: after（前回の応答の last_id）、wait（新しいイベントがなければ待つ秒数。上限 MAX_POLL_WAIT）
+    after を省略した場合と、続きが履歴から溢れていた場合は snapshot に現在の状態を入れて返す
+    """
+    wait = min(max(request.args.get('wait', 0.0, type=float), 0.0), MAX_POLL_WAIT)
+    events, snapshot, cursor = _next_events(_resume_cursor(), wait)
+    body = {
+        'epoch': EPOCH,
+        'events': [{'id': f"{EPOCH}-{seq}", 'kind': kind, 'data': data} for seq, kind, data in events],
+        'last_id': f"{EPOCH}-{cursor}",
+    }
+    if snapshot is not None:
+        body['snapshot'] = snapshot
+    return jsonify(body)
+
+@app.route('/vrm/state', methods=['POST'])
+def set_state():
+    """
+    表情・モーション・ご機嫌度・字幕・音声再生をまとめて設定（フロントエンドには1つの state イベントで同時に届く）
+    含まれていない項目は変更しない。不正な項目が1つでもあれば、どの項目も変更しない
+    {"expression": "happy", "motion": "happy", "mood": 70,
+     "subtitle": {"japanese": "...", "english": "..."}, "voice": {"utterance_id": "..."}}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'state frame not provided'}), 400
+
+    frame = {}
+    for key in ('expression', 'motion'):
+        if key in data:
+            if not isinstance(data[key], str) or not data[key]:
+                return jsonify({'status': 'error', 'message': f'invalid {key}'}), 400
+            frame[key] = data[key]
+    if 'mood' in data:
+        if isinstance(data['mood'], bool) or not isinstance(data['mood'], (int, float)):
+            return jsonify({'status': 'error', 'message': 'invalid mood'}), 400
+        frame['mood'] = max(0, min(100, data['mood']))  # 0-100の範囲に制限
+    if 'subtitle' in data:
+        subtitle = data['subtitle']
+        if not isinstance(subtitle, dict):
+            return jsonify({'status': 'error', 'message': 'invalid subtitle'}), 400
+        frame['subtitle'] = {
+            "japanese": subtitle.get('japanese') or '',
+            "english": subtitle.get('english') or '',
+            "timestamp": time.time(),
+        }
+    if data.get('voice') is not None:
+        voice = data['voice']
+        if not isinstance(voice, dict):
+            return jsonify({'status': 'error', 'message': 'invalid voice'}), 400
+        frame['voice'] = {'utterance_id': voice.get('utterance_id')}
+
+    seq = publish_event('state', frame)
+    print(f"[VRM Flask] 状態設定: {', '.join(frame) or '変更なし'}")
+    return jsonify({'status': 'ok', 'seq': seq})
+
 @app.route('/', methods=['GET'])
 def health_check():
     """ヘルスチェック"""
@@ -126,16 +597,42 @@ def health_check():
 
 @app.route('/api/vrm/status', methods=['GET'])
 def get_status():
-    """システム状態取得"""
-    return jsonify({
+    """システム状態取得（一度に読み出した状態から作る。ETag が一致すれば 304）"""
+    version, values = event_log.snapshot()
+    return _conditional_json(version, lambda: {
         'status': 'ok',
         'service': 'VRM Control Server',
-        'current_emotion': current_emotion,
-        'current_expression': current_expression,
-        'mood_value': mood_value,
-        'subtitle': latest_subtitle
+        'current_emotion': (values.get('motion') or {}).get('emotion'),
+        'current_expression': (values.get('expression') or {}).get('expression'),
+        'last_event_id': f"{EPOCH}-{version}",
+        'mood_value': values['mood']['mood'],
+        'subtitle': values['subtitle']
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheusテキスト形式のメトリクスを取得"""
+    lines = [
+        "# TYPE vrm_server_requests_total counter",
+    ]
+    with metrics_lock:
+        for (method, path), count in sorted(request_counts.items()):
+            lines.append(f'vrm_server_requests_total{{method="{method}",path="{path}"}} {count}')
+        lines.append("# TYPE vrm_server_request_seconds_sum counter")
+        for (method, path), seconds in sorted(request_seconds.items()):
+            lines.append(f'vrm_server_request_seconds_sum{{method="{method}",path="{path}"}} {seconds:.6f}')
+        text = "\n".join(lines) + "\n" + backend_metrics
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics', methods=['POST'])
+def set_metrics():
+    """バックエンドの集計値（Prometheusテキスト形式）を設定"""
+    global backend_metrics
+    text = request.get_data(as_text=True)
+    with metrics_lock:
+        backend_metrics = text if text.endswith("\n") or not text else text + "\n"
+    return jsonify({'status': 'ok'})
+
 # API v1 エンドポイント（互換性のため）
 @app.route('/api/vrm/expression', methods=['POST'])
 def api_set_expression():
@@ -168,10 +665,18 @@ if __name__ == '__main__':
     print("  GET  /expression - 表情取得")
     print("  POST /voice - 音声再生設定")
     print("  GET  /voice - 音声再生取得")
+    print("  POST /audio - 発話の音声登録（PCM）")
+    print("  POST /audio/<utterance_id> - 合成中の発話へのチャンク追記")
+    print("  GET  /audio/<utterance_id> - 発話の音声配信（WAV、Range対応）")
+    print("  POST /vrm/state - 表情・モーション・ご機嫌度・字幕・音声再生の一括設定")
     print("  POST /subtitle - 字幕設定")
     print("  GET  /subtitle - 字幕取得")
     print("  POST /mood - ご機嫌度設定")
     print("  GET  /mood - ご機嫌度取得")
+    print("  GET  /events/stream - 状態変更のプッシュ配信（Server-Sent Events）")
+    print("  GET  /events?after=<id>&wait=<秒> - 状態変更のロングポーリング")
+    print("  GET  /metrics - メトリクス取得（Prometheus形式）")
+    print("  POST /metrics - バックエンドの集計値設定")
     print("  POST /api/vrm/* - API v1エンドポイント")
     # 明示的に 127.0.0.1:5000 で起動（VRMControllerと整合）
 